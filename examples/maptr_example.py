@@ -210,6 +210,47 @@ def example5_custom_ratio():
     print(f"  输出目录: {output_dir}")
 
 
+def example6_batch():
+    """
+    示例6：一次加载原始info文件，批量生成以上全部配置
+    训练集和验证集info文件各只反序列化一次，适合消融实验
+    """
+    print("\n" + "=" * 80)
+    print("示例6：批量生成多组配置的MapTR数据")
+    print("=" * 80)
+    
+    redundancy_split = './redundancy_split/redundancy_split.pkl'
+    original_train = './data/nuscenes/nuscenes_infos_temporal_train.pkl'
+    original_val = './data/nuscenes/nuscenes_infos_temporal_val.pkl'
+    
+    if not os.path.exists(redundancy_split):
+        print(f"错误: 找不到文件 {redundancy_split}")
+        return
+    
+    if not os.path.exists(original_train) or not os.path.exists(original_val):
+        print("错误: 找不到原始MapTR数据文件")
+        return
+    
+    generator = MapTRPklGenerator(redundancy_split)
+    
+    configs = [
+        {'mode': 'low_only', 'output_dir': './maptr_low_redundancy'},
+        {'mode': 'custom', 'output_dir': './maptr_mixed',
+         'low_ratio': 0.7, 'medium_ratio': 0.3, 'high_ratio': 0.0},
+        {'mode': 'balanced', 'output_dir': './maptr_balanced'},
+        {'mode': 'low_only', 'output_dir': './maptr_low_medium',
+         'include_categories': ['low_redundancy', 'medium_redundancy']},
+        {'mode': 'custom', 'output_dir': './maptr_custom_ratio',
+         'low_ratio': 0.5, 'medium_ratio': 0.2, 'high_ratio': 0.1},
+    ]
+    results = generator.create_batch(original_train, original_val, configs)
+    
+    print(f"\n✓ 成功生成 {len(results)} 组MapTR数据")
+    for result in results:
+        print(f"  {result['output_dir']}: 训练集 {result['train_count']}, "
+              f"验证集 {result['val_count']} samples")
+
+
 def main():
     """
     运行所有示例
@@ -225,11 +266,12 @@ def main():
     print("  3. 平衡冗余度数据")
     print("  4. 低+中冗余度数据")
     print("  5. 自定义采样比例")
-    print("  0. 运行所有示例")
+    print("  6. 批量生成以上全部配置（原始数据只加载一次）")
+    print("  0. 运行所有示例（同6）")
     print()
     
     try:
-        choice = input("请选择示例 [0-5]: ").strip()
+        choice = input("请选择示例 [0-6]: ").strip()
         
         if choice == '1':
             example1_low_redundancy_only()
@@ -241,12 +283,8 @@ def main():
             example4_low_and_medium()
         elif choice == '5':
             example5_custom_ratio()
-        elif choice == '0':
-            example1_low_redundancy_only()
-            example2_mixed_redundancy()
-            example3_balanced_split()
-            example4_low_and_medium()
-            example5_custom_ratio()
+        elif choice in ('0', '6'):
+            example6_batch()
         else:
             print("无效选择")
             return
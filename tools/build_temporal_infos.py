@@ -0,0 +1,627 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MapTR时序info生成器
+直接读取（生成的）版本目录中的元数据表，生成与MapTR/BEVFormer的create_data.py格式兼容的
+{tag}_infos_temporal_{split}.pkl，不需要再对每个版本运行外部的预处理脚本：
+  - 所有外键连接、sweep链回溯和标注分组都在排序token数组上向量化完成
+  - 坐标变换（sensor→lidar、标注框global→lidar）按块批量计算，并在进程池中组装info记录
+CAN bus数据不在版本目录中，can_bus字段填充为零（MapTR数据集读取时会用ego位姿覆盖前7维）
+"""
+
+import argparse
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from nuscenes_tables import NuScenesTables, REQUIRED_TABLES
+from info_pickle import InfoPickleWriter
+
+try:
+    from nuscenes.utils import splits as nuscenes_splits
+except ImportError:  # 未安装nuscenes-devkit
+    nuscenes_splits = None
+
+
+LIDAR_CHANNEL = 'LIDAR_TOP'
+CAMERA_CHANNELS = ['CAM_FRONT', 'CAM_FRONT_RIGHT', 'CAM_FRONT_LEFT',
+                   'CAM_BACK', 'CAM_BACK_LEFT', 'CAM_BACK_RIGHT']
+KEY_CHANNELS = [LIDAR_CHANNEL] + CAMERA_CHANNELS
+
+# 与mmdet3d NuScenesDataset.NameMapping一致的类别名映射
+NAME_MAPPING = {
+    'movable_object.barrier': 'barrier',
+    'vehicle.bicycle': 'bicycle',
+    'vehicle.bus.bendy': 'bus',
+    'vehicle.bus.rigid': 'bus',
+    'vehicle.car': 'car',
+    'vehicle.construction': 'construction_vehicle',
+    'vehicle.motorcycle': 'motorcycle',
+    'human.pedestrian.adult': 'pedestrian',
+    'human.pedestrian.child': 'pedestrian',
+    'human.pedestrian.construction_worker': 'pedestrian',
+    'human.pedestrian.police_officer': 'pedestrian',
+    'movable_object.trafficcone': 'traffic_cone',
+    'vehicle.trailer': 'trailer',
+    'vehicle.truck': 'truck',
+}
+
+DEFAULT_MAX_SWEEPS = 10
+DEFAULT_CHUNK_SIZE = 256
+CAN_BUS_DIM = 18
+
+# 标注速度计算的最大时间间隔（秒），与nuscenes-devkit的box_velocity一致
+MAX_VELOCITY_TIME_DIFF = 1.5
+
+
+def quaternion_to_matrix(q: np.ndarray) -> np.ndarray:
+    """将(..., 4)的四元数（w, x, y, z）转换为(..., 3, 3)的旋转矩阵"""
+    q = q / np.linalg.norm(q, axis=-1, keepdims=True)
+    w, x, y, z = np.moveaxis(q, -1, 0)
+    return np.stack([
+        np.stack([1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y)], axis=-1),
+        np.stack([2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x)], axis=-1),
+        np.stack([2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)], axis=-1),
+    ], axis=-2)
+
+
+def quaternion_multiply(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """四元数乘积 a * b"""
+    aw, ax, ay, az = np.moveaxis(a, -1, 0)
+    bw, bx, by, bz = np.moveaxis(b, -1, 0)
+    return np.stack([
+        aw * bw - ax * bx - ay * by - az * bz,
+        aw * bx + ax * bw + ay * bz - az * by,
+        aw * by - ax * bz + ay * bw + az * bx,
+        aw * bz + ax * by - ay * bx + az * bw,
+    ], axis=-1)
+
+
+def quaternion_inverse(q: np.ndarray) -> np.ndarray:
+    """四元数的逆"""
+    conj = q * np.array([1.0, -1.0, -1.0, -1.0])
+    return conj / np.sum(q * q, axis=-1, keepdims=True)
+
+
+def quaternion_yaw(q: np.ndarray) -> np.ndarray:
+    """四元数的yaw角（与pyquaternion的yaw_pitch_roll[0]一致）"""
+    q = q / np.linalg.norm(q, axis=-1, keepdims=True)
+    w, x, y, z = np.moveaxis(q, -1, 0)
+    return np.arctan2(2 * (w * z - x * y), 1 - 2 * (y * y + z * z))
+
+
+def _float_column(rows: List[Dict], field: str, width: int) -> np.ndarray:
+    """将记录中的定长数值列表字段转换为(N, width)的float64数组"""
+    return np.array([row[field] for row in rows], dtype=np.float64).reshape(-1, width)
+
+
+def _gather(rows: np.ndarray, values: np.ndarray, fill=-1) -> np.ndarray:
+    """按行号取值，行号为-1时取fill"""
+    out = np.where(rows >= 0, values[np.maximum(rows, 0)], fill)
+    return out
+
+
+def load_scene_split(path: Optional[str] = None, version: str = '',
+                     single_split: Optional[str] = None) -> Optional[Dict[str, str]]:
+    """
+    获取scene名称到数据划分（train/val/...）的映射
+
+    Args:
+        path: JSON文件（{划分名: [scene名称, ...]}）
+        version: 版本名（未指定文件时，含mini的版本使用mini_train/mini_val官方划分）
+        single_split: 所有scene都归入这个划分（返回None，由调用方处理）
+
+    Returns:
+        scene名称 -> 划分名；single_split时为None
+    """
+    if single_split:
+        return None
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            lists = json.load(f)
+    else:
+        if nuscenes_splits is None:
+            raise RuntimeError("未安装nuscenes-devkit，无法使用官方train/val划分，"
+                               "请通过 --scene-split 指定划分文件或使用 --single-split")
+        if 'mini' in version:
+            lists = {'train': nuscenes_splits.mini_train, 'val': nuscenes_splits.mini_val}
+        elif 'test' in version:
+            lists = {'test': nuscenes_splits.test}
+        else:
+            lists = {'train': nuscenes_splits.train, 'val': nuscenes_splits.val}
+    return {name: split for split, names in lists.items() for name in names}
+
+
+def _build_chunk(task: Dict) -> List[Dict]:
+    """
+    组装一块样本的info记录（在工作进程中运行）
+    task中只包含这一块用到的紧凑数组，坐标变换全部批量计算
+    """
+    n = len(task['sample_tokens'])
+    sd = task['sd']
+
+    # 关键帧lidar的位姿：lidar→ego (R_l, t_l)，ego→global (R_e, t_e)
+    lidar = task['lidar']
+    R_l = quaternion_to_matrix(sd['cs_rotation'][lidar])
+    t_l = sd['cs_translation'][lidar]
+    R_e = quaternion_to_matrix(sd['ego_rotation'][lidar])
+    t_e = sd['ego_translation'][lidar]
+    # global→lidar的旋转：R_l^T R_e^T
+    R_gl = np.einsum('nji,nkj->nik', R_l, R_e)
+
+    def sensor_records(owner: np.ndarray, rows: np.ndarray, sensor_type=None) -> List[Dict]:
+        """计算一批传感器数据相对关键帧lidar的变换，并组装记录"""
+        R_s = quaternion_to_matrix(sd['cs_rotation'][rows])
+        R_es = quaternion_to_matrix(sd['ego_rotation'][rows])
+        rotation = np.einsum('nij,njk,nkl->nil', R_gl[owner], R_es, R_s)
+        global_t = (np.einsum('nij,nj->ni', R_es, sd['cs_translation'][rows])
+                    + sd['ego_translation'][rows] - t_e[owner])
+        translation = (np.einsum('nij,nj->ni', R_gl[owner], global_t)
+                       - np.einsum('nji,nj->ni', R_l[owner], t_l[owner]))
+
+        records = []
+        cs_t = sd['cs_translation'][rows].tolist()
+        cs_r = sd['cs_rotation'][rows].tolist()
+        ego_t = sd['ego_translation'][rows].tolist()
+        ego_r = sd['ego_rotation'][rows].tolist()
+        for i, row in enumerate(rows.tolist()):
+            records.append({
+                'data_path': sd['paths'][row],
+                'type': sensor_type or sd['channels'][row],
+                'sample_data_token': sd['tokens'][row],
+                'sensor2ego_translation': cs_t[i],
+                'sensor2ego_rotation': cs_r[i],
+                'ego2global_translation': ego_t[i],
+                'ego2global_rotation': ego_r[i],
+                'timestamp': int(sd['timestamps'][row]),
+                'sensor2lidar_rotation': rotation[i],
+                'sensor2lidar_translation': translation[i],
+            })
+        return records
+
+    # 相机（关键帧）
+    cams = task['cams']
+    cam_owner, cam_slot = np.nonzero(cams >= 0)
+    cam_rows = cams[cam_owner, cam_slot]
+    cam_records = sensor_records(cam_owner, cam_rows)
+    for record, row in zip(cam_records, cam_rows.tolist()):
+        record['cam_intrinsic'] = sd['intrinsics'][row]
+
+    # lidar sweeps（按时间倒序）
+    sweeps = task['sweeps']
+    sweep_owner, _ = np.nonzero(sweeps >= 0)
+    sweep_records = sensor_records(sweep_owner, sweeps[sweeps >= 0], sensor_type='lidar')
+
+    infos = []
+    lidar_t = t_l.tolist()
+    lidar_r = sd['cs_rotation'][lidar].tolist()
+    ego_t = t_e.tolist()
+    ego_r = sd['ego_rotation'][lidar].tolist()
+    cam_starts = np.searchsorted(cam_owner, np.arange(n + 1))
+    sweep_starts = np.searchsorted(sweep_owner, np.arange(n + 1))
+    for i in range(n):
+        cam_infos = {}
+        for j in range(cam_starts[i], cam_starts[i + 1]):
+            cam_infos[CAMERA_CHANNELS[cam_slot[j]]] = cam_records[j]
+        infos.append({
+            'lidar_path': sd['paths'][lidar[i]],
+            'token': task['sample_tokens'][i],
+            'prev': task['prev_tokens'][i],
+            'next': task['next_tokens'][i],
+            'can_bus': np.zeros(CAN_BUS_DIM),
+            'frame_idx': int(task['frame_idx'][i]),
+            'sweeps': sweep_records[sweep_starts[i]:sweep_starts[i + 1]],
+            'cams': cam_infos,
+            'map_location': task['map_locations'][i],
+            'scene_token': task['scene_tokens'][i],
+            'lidar2ego_translation': lidar_t[i],
+            'lidar2ego_rotation': lidar_r[i],
+            'ego2global_translation': ego_t[i],
+            'ego2global_rotation': ego_r[i],
+            'timestamp': int(task['timestamps'][i]),
+        })
+
+    annotations = task.get('annotations')
+    if annotations is None:
+        return infos
+
+    # 标注框：global → ego → lidar
+    owner = annotations['owner']
+    centers = (np.einsum('nij,nj->ni', R_gl[owner], annotations['translation'] - t_e[owner])
+               - np.einsum('nji,nj->ni', R_l[owner], t_l[owner]))
+    to_lidar = quaternion_multiply(
+        quaternion_inverse(sd['cs_rotation'][lidar][owner]),
+        quaternion_inverse(sd['ego_rotation'][lidar][owner])
+    )
+    yaw = quaternion_yaw(quaternion_multiply(to_lidar, annotations['rotation']))
+    velocity = np.concatenate([annotations['velocity'],
+                               np.zeros((len(owner), 1))], axis=1)
+    velocity = np.einsum('nij,nj->ni', R_gl[owner], velocity)[:, :2]
+    gt_boxes = np.concatenate([centers, annotations['size'], (-yaw - np.pi / 2)[:, None]], axis=1)
+
+    starts = np.searchsorted(owner, np.arange(n + 1))
+    names = np.array(annotations['names'])
+    for i, info in enumerate(infos):
+        s, e = starts[i], starts[i + 1]
+        info['gt_boxes'] = gt_boxes[s:e]
+        info['gt_names'] = names[s:e]
+        info['gt_velocity'] = velocity[s:e].reshape(-1, 2)
+        info['num_lidar_pts'] = annotations['num_lidar_pts'][s:e]
+        info['num_radar_pts'] = annotations['num_radar_pts'][s:e]
+        info['valid_flag'] = (annotations['num_lidar_pts'][s:e]
+                              + annotations['num_radar_pts'][s:e]) > 0
+    return infos
+
+
+class TemporalInfoBuilder:
+    """
+    从版本目录的元数据表生成MapTR时序info
+    """
+
+    def __init__(self, dataroot: str, version: str,
+                 max_sweeps: int = DEFAULT_MAX_SWEEPS,
+                 workers: Optional[int] = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """
+        初始化
+
+        Args:
+            dataroot: 数据根目录（其下有版本目录和samples/sweeps，info中的文件路径以此为前缀）
+            version: 版本名称（如 v1.0-low-redundancy）
+            max_sweeps: 每个样本最多回溯的lidar sweep数
+            workers: 组装info的进程数（默认为CPU核数，≤1时在当前进程中完成）
+            chunk_size: 每个任务包含的样本数
+        """
+        self.dataroot = dataroot
+        self.version = version
+        self.max_sweeps = max_sweeps
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.chunk_size = chunk_size
+
+        print(f"加载版本 {version} 的元数据表...")
+        self.tables = NuScenesTables(
+            os.path.join(dataroot, version),
+            table_names=REQUIRED_TABLES + ['instance', 'category', 'sample_annotation']
+        )
+        self._prepare()
+
+    def _prepare(self):
+        """向量化地解析所有外键，准备按样本切块所需的数组"""
+        tables = self.tables
+        samples = tables['sample']
+        sample_data = tables['sample_data']
+        num_samples = len(samples)
+
+        # sample_data → calibrated_sensor / ego_pose / sensor通道
+        cs_rows = tables.foreign_key('sample_data', 'calibrated_sensor_token', 'calibrated_sensor')
+        ego_rows = tables.foreign_key('sample_data', 'ego_pose_token', 'ego_pose')
+        sensor_rows = _gather(cs_rows, tables.foreign_key('calibrated_sensor', 'sensor_token', 'sensor'))
+        if np.any(cs_rows < 0) or np.any(ego_rows < 0) or np.any(sensor_rows < 0):
+            raise ValueError(f"{self.version} 中存在引用缺失的sample_data，请先用verify_nuscenes_version.py检查")
+        channel_names = [row['channel'] for row in tables['sensor']]
+        slot_of_sensor = np.array([KEY_CHANNELS.index(c) if c in KEY_CHANNELS else -1
+                                   for c in channel_names], dtype=np.int64)
+        slots = slot_of_sensor[sensor_rows]
+
+        calibrated = tables['calibrated_sensor']
+        poses = tables['ego_pose']
+        intrinsics = [np.array(row['camera_intrinsic'], dtype=np.float64)
+                      for row in calibrated]
+        self.sd = {
+            'cs_translation': _float_column(calibrated, 'translation', 3)[cs_rows],
+            'cs_rotation': _float_column(calibrated, 'rotation', 4)[cs_rows],
+            'ego_translation': _float_column(poses, 'translation', 3)[ego_rows],
+            'ego_rotation': _float_column(poses, 'rotation', 4)[ego_rows],
+            'timestamps': np.array([row['timestamp'] for row in sample_data], dtype=np.int64),
+        }
+        self._sd_cs_rows = cs_rows
+        self._intrinsics = intrinsics
+        self._channel_names = channel_names
+        self._sd_sensor_rows = sensor_rows
+
+        # 每个sample的关键帧sample_data（lidar + 6个相机）
+        sample_rows = tables.foreign_key('sample_data', 'sample_token', 'sample')
+        is_key = np.fromiter((bool(row.get('is_key_frame')) for row in sample_data),
+                             dtype=bool, count=len(sample_data))
+        key = np.full((num_samples, len(KEY_CHANNELS)), -1, dtype=np.int64)
+        selected = is_key & (sample_rows >= 0) & (slots >= 0)
+        key[sample_rows[selected], slots[selected]] = np.flatnonzero(selected)
+        missing_lidar = np.flatnonzero(key[:, 0] < 0)
+        if len(missing_lidar):
+            raise ValueError(f"{len(missing_lidar)} 个sample缺少{LIDAR_CHANNEL}关键帧，"
+                             f"如 {samples[missing_lidar[0]]['token']}")
+        self.key = key
+
+        # 沿lidar的prev链回溯sweeps
+        sd_prev = tables.foreign_key('sample_data', 'prev', 'sample_data')
+        sweeps = np.full((num_samples, self.max_sweeps), -1, dtype=np.int64)
+        current = key[:, 0]
+        for k in range(self.max_sweeps):
+            current = _gather(current, sd_prev)
+            sweeps[:, k] = current
+        self.sweeps = sweeps
+
+        # 样本按时间排序，frame_idx为样本在scene链表中的位置
+        timestamps = np.array([row['timestamp'] for row in samples], dtype=np.int64)
+        self.sample_timestamps = timestamps
+        self.order = np.argsort(timestamps, kind='stable')
+        _, self.frame_idx = tables.chain_order('sample')
+
+        scene_rows = tables.foreign_key('sample', 'scene_token', 'scene')
+        log_rows = _gather(scene_rows, tables.foreign_key('scene', 'log_token', 'log'))
+        locations = [row['location'] for row in tables['log']]
+        scene_names = [row['name'] for row in tables['scene']]
+        self.sample_scene_rows = scene_rows
+        self.map_locations = [locations[r] if r >= 0 else '' for r in log_rows.tolist()]
+        self.sample_scene_names = [scene_names[r] if r >= 0 else '' for r in scene_rows.tolist()]
+
+        self._prepare_annotations()
+
+    def _prepare_annotations(self):
+        """标注按sample分组，并向量化计算全局坐标系下的速度"""
+        tables = self.tables
+        annotations = tables['sample_annotation']
+        if not annotations:
+            self.annotations = None
+            return
+
+        owner = tables.foreign_key('sample_annotation', 'sample_token', 'sample')
+        instance_rows = tables.foreign_key('sample_annotation', 'instance_token', 'instance')
+        category_rows = _gather(instance_rows,
+                                tables.foreign_key('instance', 'category_token', 'category'))
+        category_names = [row['name'] for row in tables['category']]
+        names = np.array([NAME_MAPPING.get(category_names[r], category_names[r]) if r >= 0 else ''
+                          for r in category_rows.tolist()])
+
+        translation = _float_column(annotations, 'translation', 3)
+        ann_time = _gather(owner, self.sample_timestamps, 0) * 1e-6
+        prev_rows = tables.foreign_key('sample_annotation', 'prev', 'sample_annotation')
+        next_rows = tables.foreign_key('sample_annotation', 'next', 'sample_annotation')
+        has_prev = prev_rows >= 0
+        has_next = next_rows >= 0
+        first = np.where(has_prev, prev_rows, np.arange(len(annotations)))
+        last = np.where(has_next, next_rows, np.arange(len(annotations)))
+        time_diff = ann_time[last] - ann_time[first]
+        max_diff = np.where(has_prev & has_next, 2 * MAX_VELOCITY_TIME_DIFF, MAX_VELOCITY_TIME_DIFF)
+        valid = (has_prev | has_next) & (time_diff <= max_diff)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            velocity = (translation[last] - translation[first]) / time_diff[:, None]
+        velocity = np.where(valid[:, None], velocity, np.nan)[:, :2]
+
+        # 按sample分组（保持表内顺序，与devkit中sample['anns']的顺序一致）
+        kept = np.flatnonzero(owner >= 0)
+        grouped = kept[np.argsort(owner[kept], kind='stable')]
+        self.annotations = {
+            'rows': grouped,
+            'starts': np.searchsorted(owner[grouped], np.arange(len(tables['sample']) + 1)),
+            'translation': translation,
+            'size': _float_column(annotations, 'size', 3),
+            'rotation': _float_column(annotations, 'rotation', 4),
+            'velocity': velocity,
+            'names': names,
+            'num_lidar_pts': np.array([row['num_lidar_pts'] for row in annotations], dtype=np.int64),
+            'num_radar_pts': np.array([row['num_radar_pts'] for row in annotations], dtype=np.int64),
+        }
+
+    def _make_task(self, rows: np.ndarray) -> Dict:
+        """为一块样本收集组装info所需的紧凑数组（sample_data按块内局部行号重新编号）"""
+        tables = self.tables
+        samples = tables['sample']
+        sample_data = tables['sample_data']
+
+        key = self.key[rows]
+        sweeps = self.sweeps[rows]
+        used = np.unique(np.concatenate([key[key >= 0], sweeps[sweeps >= 0]]))
+        local = np.full(len(sample_data), -1, dtype=np.int64)
+        local[used] = np.arange(len(used))
+        used_list = used.tolist()
+
+        sd = {field: values[used] for field, values in self.sd.items()}
+        sd['tokens'] = [sample_data[r]['token'] for r in used_list]
+        sd['paths'] = [os.path.join(self.dataroot, sample_data[r]['filename']) for r in used_list]
+        sd['channels'] = [self._channel_names[s] for s in self._sd_sensor_rows[used].tolist()]
+        sd['intrinsics'] = [self._intrinsics[c] for c in self._sd_cs_rows[used].tolist()]
+
+        row_list = rows.tolist()
+        task = {
+            'sd': sd,
+            'lidar': local[key[:, 0]],
+            'cams': _gather(key[:, 1:], local),
+            'sweeps': _gather(sweeps, local),
+            'sample_tokens': [samples[r]['token'] for r in row_list],
+            'prev_tokens': [samples[r]['prev'] for r in row_list],
+            'next_tokens': [samples[r]['next'] for r in row_list],
+            'scene_tokens': [samples[r]['scene_token'] for r in row_list],
+            'map_locations': [self.map_locations[r] for r in row_list],
+            'frame_idx': self.frame_idx[rows],
+            'timestamps': self.sample_timestamps[rows],
+        }
+
+        if self.annotations is not None:
+            ann = self.annotations
+            starts, ends = ann['starts'][rows], ann['starts'][rows + 1]
+            counts = ends - starts
+            owner = np.repeat(np.arange(len(rows)), counts)
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            ann_rows = ann['rows'][np.repeat(starts, counts) + offsets]
+            task['annotations'] = {
+                'owner': owner,
+                'translation': ann['translation'][ann_rows],
+                'size': ann['size'][ann_rows],
+                'rotation': ann['rotation'][ann_rows],
+                'velocity': ann['velocity'][ann_rows],
+                'names': ann['names'][ann_rows].tolist(),
+                'num_lidar_pts': ann['num_lidar_pts'][ann_rows],
+                'num_radar_pts': ann['num_radar_pts'][ann_rows],
+            }
+        return task
+
+    def iter_infos(self, rows: Optional[np.ndarray] = None) -> Iterator[Tuple[int, Dict]]:
+        """
+        按时间顺序产生 (sample行号, info)
+        多进程时最多同时保留2×workers个未取走的任务结果，内存有界
+
+        Args:
+            rows: 只生成这些sample（默认全部，按时间排序）
+        """
+        rows = self.order if rows is None else rows
+        chunks = [rows[i:i + self.chunk_size] for i in range(0, len(rows), self.chunk_size)]
+
+        if self.workers <= 1:
+            for chunk in chunks:
+                yield from zip(chunk.tolist(), _build_chunk(self._make_task(chunk)))
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque()
+            for chunk in chunks:
+                pending.append((chunk, executor.submit(_build_chunk, self._make_task(chunk))))
+                if len(pending) >= 2 * self.workers:
+                    done_chunk, future = pending.popleft()
+                    yield from zip(done_chunk.tolist(), future.result())
+            while pending:
+                done_chunk, future = pending.popleft()
+                yield from zip(done_chunk.tolist(), future.result())
+
+    def build(self, output_paths: Dict[str, str],
+              scene_split: Optional[Dict[str, str]] = None,
+              chunked: bool = False) -> Dict[str, int]:
+        """
+        生成时序info并按数据划分流式写出
+
+        Args:
+            output_paths: 划分名 -> 输出路径
+            scene_split: scene名称 -> 划分名（None表示全部写入output_paths中唯一的划分）
+            chunked: 输出分块容器（否则为标准pkl）
+
+        Returns:
+            划分名 -> 样本数
+        """
+        if scene_split is None:
+            if len(output_paths) != 1:
+                raise ValueError("未指定scene划分时只能输出一个文件")
+            only = next(iter(output_paths))
+            sample_split = [only] * len(self.tables['sample'])
+        else:
+            sample_split = [scene_split.get(name) for name in self.sample_scene_names]
+        skipped = sum(1 for split in sample_split if split not in output_paths)
+        if skipped:
+            print(f"警告: {skipped} 个sample所属的scene不在任何输出划分中，已跳过")
+
+        rows = np.array([r for r in self.order.tolist() if sample_split[r] in output_paths],
+                        dtype=np.int64)
+        metadata = {'version': self.version}
+        writers = {split: InfoPickleWriter(path, metadata, chunked=chunked)
+                   for split, path in output_paths.items()}
+        try:
+            for row, info in self.iter_infos(rows):
+                writers[sample_split[row]].write(info)
+            for writer in writers.values():
+                writer.close()
+        except BaseException as e:
+            for writer in writers.values():
+                writer.abort(e)
+            raise
+        return {split: writer.count for split, writer in writers.items()}
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description='从版本目录直接生成MapTR时序info（无需运行外部create_data.py）'
+    )
+    parser.add_argument(
+        '--dataroot',
+        type=str,
+        required=True,
+        help='数据根目录（包含版本目录及samples/sweeps）'
+    )
+    parser.add_argument(
+        '--version',
+        type=str,
+        nargs='+',
+        required=True,
+        help='要处理的版本（可指定多个）'
+    )
+    parser.add_argument(
+        '--out-dir',
+        type=str,
+        default=None,
+        help='输出目录（默认写入各版本目录）'
+    )
+    parser.add_argument(
+        '--extra-tag',
+        type=str,
+        default='nuscenes',
+        help='输出文件名前缀（{tag}_infos_temporal_{split}.pkl）'
+    )
+    parser.add_argument(
+        '--scene-split',
+        type=str,
+        default=None,
+        help='scene划分文件（JSON：{"train": [scene名称...], "val": [...]}），默认使用nuscenes-devkit的官方划分'
+    )
+    parser.add_argument(
+        '--single-split',
+        type=str,
+        default=None,
+        help='所有scene写入同一个划分（如 train）'
+    )
+    parser.add_argument(
+        '--max-sweeps',
+        type=int,
+        default=DEFAULT_MAX_SWEEPS,
+        help=f'每个样本回溯的lidar sweep数（默认{DEFAULT_MAX_SWEEPS}）'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='组装info的进程数（默认为CPU核数）'
+    )
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help=f'每个任务的样本数（默认{DEFAULT_CHUNK_SIZE}）'
+    )
+    parser.add_argument(
+        '--chunked-output',
+        action='store_true',
+        help='输出分块容器（可由info_pickle.ChunkedInfoReader流式读取）'
+    )
+    args = parser.parse_args()
+
+    if args.scene_split and args.single_split:
+        parser.error("--scene-split 与 --single-split 不能同时使用")
+    if not args.scene_split and not args.single_split and nuscenes_splits is None:
+        parser.error("未安装nuscenes-devkit，请通过 --scene-split 指定划分文件或使用 --single-split")
+
+    for version in args.version:
+        start = time.time()
+        print("=" * 80)
+        print(f"生成时序info: {version}")
+        print("=" * 80)
+        scene_split = load_scene_split(args.scene_split, version, args.single_split)
+        splits = ([args.single_split] if scene_split is None
+                  else sorted(set(scene_split.values())))
+        if args.out_dir is None:
+            out_dir = os.path.join(args.dataroot, version)
+        else:
+            out_dir = os.path.join(args.out_dir, version) if len(args.version) > 1 else args.out_dir
+        output_paths = {split: os.path.join(out_dir, f'{args.extra_tag}_infos_temporal_{split}.pkl')
+                        for split in splits}
+
+        builder = TemporalInfoBuilder(args.dataroot, version, max_sweeps=args.max_sweeps,
+                                      workers=args.workers, chunk_size=args.chunk_size)
+        counts = builder.build(output_paths, scene_split, chunked=args.chunked_output)
+        for split, count in counts.items():
+            print(f"  {split}: {count} samples -> {output_paths[split]}")
+        print(f"完成 ({time.time() - start:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
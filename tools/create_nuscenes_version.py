@@ -5,13 +5,75 @@
 生成新的v1.0-xxx目录，包含所有元数据和数据文件
 """
 
-import json
+import hashlib
 import os
-import shutil
+import time
 import argparse
-from typing import Set, Dict, List
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Set, Dict, List, Optional, Tuple
 from collections import defaultdict
-from redundancy_utils import RedundancySplitLoader
+import numpy as np
+from redundancy_utils import RedundancySplitLoader, REDUNDANCY_CATEGORIES
+from nuscenes_tables import (NuScenesTables, OPTIONAL_TABLES,
+                             mask_from_references, gather_mask,
+                             relinked_rows, chain_summary)
+from token_utils import to_token_array, isin_sorted
+from io_utils import (iter_json_array, iter_batches, JsonArrayWriter, write_json_stream,
+                      list_dir_names, list_dir_symlinks)
+from file_materializer import FileMaterializer, LINK_MODES, merge_counts, format_counts
+from version_manifest import VersionManifest, LinkLedger, compute_fingerprint, file_sha256
+from verify_nuscenes_version import VersionVerifier, print_verification
+
+
+# 各元数据表在过滤结果中对应的键名
+TABLE_KEYS = [
+    ('sample', 'samples'),
+    ('scene', 'scenes'),
+    ('sample_data', 'sample_data'),
+    ('ego_pose', 'ego_poses'),
+    ('calibrated_sensor', 'calibrated_sensors'),
+    ('sensor', 'sensors'),
+    ('log', 'logs'),
+    ('category', 'categories'),
+    ('attribute', 'attributes'),
+    ('visibility', 'visibilities'),
+    ('instance', 'instances'),
+    ('sample_annotation', 'sample_annotations'),
+]
+
+# 流式流水线的处理顺序：(表名, 过滤字段, 过滤字段所属的token集合, 需要收集的(字段, token集合))
+# 过滤字段为None表示保留全部记录
+STREAMING_PIPELINE = [
+    ('sample', 'token', 'sample', [('scene_token', 'scene')]),
+    ('scene', 'token', 'scene', [('log_token', 'log')]),
+    ('log', 'token', 'log', []),
+    ('sample_data', 'sample_token', 'sample',
+     [('ego_pose_token', 'ego_pose'), ('calibrated_sensor_token', 'calibrated_sensor')]),
+    ('ego_pose', 'token', 'ego_pose', []),
+    ('calibrated_sensor', 'token', 'calibrated_sensor', [('sensor_token', 'sensor')]),
+    ('sensor', 'token', 'sensor', []),
+    ('sample_annotation', 'sample_token', 'sample', [('instance_token', 'instance')]),
+    ('instance', 'token', 'instance', []),
+    ('category', None, None, []),
+    ('attribute', None, None, []),
+    ('visibility', None, None, []),
+]
+
+# 帧抽稀后需要重写链表首尾信息的表：
+# 所属表 -> (成员表, 成员指向所属记录的外键, 首记录字段, 尾记录字段, 数量字段)
+CHAIN_SUMMARIES = {
+    'scene': ('sample', 'scene_token',
+              'first_sample_token', 'last_sample_token', 'nbr_samples'),
+    'instance': ('sample_annotation', 'instance_token',
+                 'first_annotation_token', 'last_annotation_token', 'nbr_annotations'),
+}
+
+# 流式流水线每批处理的记录数
+STREAM_BATCH_SIZE = 10000
+
+# 链接数据文件时每个线程任务处理的文件数，以及进度打印间隔
+LINK_BATCH_SIZE = 2000
+LINK_PROGRESS_INTERVAL = 100000
 
 
 class NuScenesVersionCreator:
@@ -22,7 +84,13 @@ class NuScenesVersionCreator:
     def __init__(self, 
                  original_dataroot: str,
                  original_version: str,
-                 redundancy_split_path: str):
+                 redundancy_split_path: str,
+                 link_workers: int = 16,
+                 max_sweeps: Optional[int] = None,
+                 channels: Optional[List[str]] = None,
+                 sample_stride: Optional[int] = None,
+                 min_ego_motion: Optional[float] = None,
+                 keep_samples: Optional[Set[str]] = None):
         """
         初始化
         
@@ -30,8 +98,32 @@ class NuScenesVersionCreator:
             original_dataroot: 原始NuScenes数据根目录
             original_version: 原始版本名称（如v1.0-trainval）
             redundancy_split_path: 冗余度划分结果路径
+            link_workers: 并发创建数据文件链接的线程数
+            max_sweeps: 每个关键帧保留的最近激光雷达sweep数；None保留全部sample_data，
+                        0只保留关键帧。其他传感器的sweep在指定时全部丢弃，sample_data链表重新连接
+            channels: 只保留这些传感器通道（如CAM_FRONT、LIDAR_TOP）的sample_data，None保留全部通道
+            sample_stride: 场景内每k个关键帧保留一个（从第一帧开始）
+            min_ego_motion: 场景内自车每行驶该距离（米）保留一个关键帧，静止时的帧被丢弃
+            keep_samples: 显式的sample保留集合（关键帧级别的保留掩码）
+                以上三项同时指定时取交集；抽稀后sample、sample_data、sample_annotation的prev/next
+                以及scene、instance的首尾token和数量都会重写
         """
+        if max_sweeps is not None and max_sweeps < 0:
+            raise ValueError(f"max_sweeps不能为负数: {max_sweeps}")
+        if sample_stride is not None and sample_stride < 1:
+            raise ValueError(f"sample_stride必须为正整数: {sample_stride}")
+        if min_ego_motion is not None and min_ego_motion <= 0:
+            raise ValueError(f"min_ego_motion必须为正数: {min_ego_motion}")
         self.original_dataroot = original_dataroot
+        self.redundancy_split_path = redundancy_split_path
+        self._split_sha256 = None
+        self.link_workers = max(1, link_workers)
+        self.max_sweeps = max_sweeps
+        self.channels = sorted(set(channels)) if channels else None
+        self.sample_stride = sample_stride
+        self.min_ego_motion = min_ego_motion
+        self.keep_samples = (np.unique(to_token_array(keep_samples))
+                             if keep_samples is not None else None)
         self.original_version = original_version
         self.original_version_path = os.path.join(original_dataroot, original_version)
         
@@ -40,24 +132,130 @@ class NuScenesVersionCreator:
         
         print(f"原始数据路径: {self.original_version_path}")
         
-    def _load_json(self, filename: str) -> List[Dict]:
-        """加载JSON文件"""
-        filepath = os.path.join(self.original_version_path, filename)
-        with open(filepath, 'r') as f:
-            return json.load(f)
-    
-    def _save_json(self, data: List[Dict], filepath: str):
-        """保存JSON文件"""
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        with open(filepath, 'w') as f:
-            json.dump(data, f)
+    def _save_json(self, data: List[Dict], filepath: str) -> str:
+        """保存JSON文件（原子写入），返回内容的SHA-256"""
+        sha256 = write_json_stream(data, filepath)
         print(f"  已保存: {os.path.basename(filepath)} ({len(data)} 条记录)")
+        return sha256
+    
+    def _open_manifest(self,
+                       output_version_path: str,
+                       categories: List[str],
+                       resume: bool,
+                       adopt: bool = False,
+                       link_mode: Optional[str] = None) -> VersionManifest:
+        """
+        打开输出版本目录的创建清单
+        指纹由原始版本路径、划分文件内容和类别决定，任何一项变化都会从头创建
+        （adopt=True时沿用旧清单，由增量更新负责切换指纹）；
+        落地方式不计入指纹，变化时只重新执行数据文件和maps阶段
+        """
+        if self._split_sha256 is None:
+            self._split_sha256 = file_sha256(self.redundancy_split_path)
+        inputs = {
+            'original_version_path': os.path.abspath(self.original_version_path),
+            'redundancy_split_sha256': self._split_sha256,
+            'categories': sorted(categories)
+        }
+        inputs.update(self._filter_options())
+        manifest = VersionManifest(output_version_path, compute_fingerprint(inputs),
+                                   inputs=inputs, resume=resume, adopt=adopt,
+                                   link_mode=link_mode)
+        if manifest.link_mode_changed:
+            print(f"  落地方式由 {manifest.previous_link_mode or '未记录'} 变为 {link_mode}，"
+                  f"重新检查数据文件和maps")
+        if manifest.resumed:
+            done = [stage for stage in manifest.data['stages']]
+            print(f"  发现创建清单，已完成阶段: {', '.join(done) if done else '无'}")
+        return manifest
+    
+    def _filter_options(self) -> Dict:
+        """非默认的sample_data过滤选项（记录在创建清单中，默认值不写入以保持指纹不变）"""
+        options = {}
+        if self.max_sweeps is not None:
+            options['max_sweeps'] = self.max_sweeps
+        if self.channels is not None:
+            options['channels'] = self.channels
+        if self.sample_stride is not None:
+            options['sample_stride'] = self.sample_stride
+        if self.min_ego_motion is not None:
+            options['min_ego_motion'] = self.min_ego_motion
+        if self.keep_samples is not None:
+            options['keep_samples_sha256'] = hashlib.sha256(self.keep_samples.tobytes()).hexdigest()
+        return options
+    
+    @property
+    def decimating(self) -> bool:
+        """是否在场景内抽稀关键帧"""
+        return (self.sample_stride is not None or self.min_ego_motion is not None
+                or self.keep_samples is not None)
+    
+    def _relinked_tables(self) -> Set[str]:
+        """过滤会删除链表中间记录、需要重新连接prev/next的表"""
+        relinked = set()
+        if self.max_sweeps is not None:
+            relinked.add('sample_data')
+        if self.decimating:
+            relinked.update(['sample', 'sample_data', 'sample_annotation'])
+        return relinked
+    
+    def _select_rows(self,
+                     tables: NuScenesTables,
+                     table: str,
+                     masks: Dict[str, np.ndarray]) -> List[Dict]:
+        """按掩码取出某张表的记录，必要时重新连接prev/next，或重写链表首尾信息"""
+        mask = masks[table]
+        if table in self._relinked_tables():
+            return relinked_rows(tables, table, mask)
+        if self.decimating and table in CHAIN_SUMMARIES:
+            return self._summarized_rows(tables, table, masks)
+        return tables.rows(table, np.flatnonzero(mask))
+    
+    def _summarized_rows(self,
+                         tables: NuScenesTables,
+                         table: str,
+                         masks: Dict[str, np.ndarray]) -> List[Dict]:
+        """按成员表重新连接后的链表，重写scene/instance的首尾token和数量"""
+        member, owner_field, first_field, last_field, count_field = CHAIN_SUMMARIES[table]
+        first, last, count = chain_summary(tables, member, masks[member], owner_field, table)
+        member_rows = tables[member]
+        
+        rows = tables[table]
+        result = []
+        for i in np.flatnonzero(masks[table]).tolist():
+            row = rows[i]
+            updates = {
+                first_field: member_rows[first[i]]['token'] if first[i] >= 0 else '',
+                last_field: member_rows[last[i]]['token'] if last[i] >= 0 else '',
+                count_field: int(count[i])
+            }
+            if any(row.get(field) != value for field, value in updates.items()):
+                row = dict(row, **updates)
+            result.append(row)
+        return result
+    
+    def _get_target_tokens(self, categories: List[str]) -> Set[str]:
+        """获取指定冗余度类别的全部sample tokens"""
+        target_tokens = set()
+        for category in categories:
+            tokens = self.redundancy_loader.get_samples_by_category(category)
+            target_tokens.update(tokens)
+        return target_tokens
+    
+    def load_tables(self) -> NuScenesTables:
+        """加载原始版本的全部元数据表"""
+        print("\n加载原始数据...")
+        tables = NuScenesTables(self.original_version_path)
+        print("原始数据加载完成")
+        return tables
     
     def create_version(self,
                       output_dataroot: str,
                       version_name: str,
                       categories: List[str],
-                      use_symlink: bool = True):
+                      use_symlink: bool = True,
+                      link_mode: Optional[str] = None,
+                      resume: bool = True):
         """
         创建新的NuScenes版本
         
@@ -65,8 +263,87 @@ class NuScenesVersionCreator:
             output_dataroot: 输出数据根目录
             version_name: 新版本名称（如v1.0-low-redundancy）
             categories: 包含的冗余度类别列表
-            use_symlink: 是否使用符号链接（节省空间）
+            use_symlink: 是否使用符号链接（节省空间），为False时使用硬链接
+            link_mode: 数据文件落地方式（symlink/hardlink/reflink/copy），指定时覆盖use_symlink
+            resume: 是否根据版本目录中的创建清单跳过已完成的工作
         """
+        return self.create_versions(output_dataroot,
+                                    {version_name: categories},
+                                    use_symlink=use_symlink,
+                                    link_mode=link_mode,
+                                    resume=resume)
+    
+    def create_versions(self,
+                        output_dataroot: str,
+                        versions: Dict[str, List[str]],
+                        use_symlink: bool = True,
+                        tables: Optional[NuScenesTables] = None,
+                        streaming: bool = False,
+                        link_mode: Optional[str] = None,
+                        resume: bool = True):
+        """
+        一次加载原始数据，批量创建多个NuScenes版本
+        所有版本共享同一份原始表和查找索引，每个版本只计算各自的过滤掩码
+        
+        Args:
+            output_dataroot: 输出数据根目录
+            versions: 版本名称到冗余度类别列表的映射，
+                      如 {'v1.0-low-medium': ['low_redundancy', 'medium_redundancy']}
+            use_symlink: 是否使用符号链接（节省空间），为False时使用硬链接
+            tables: 已加载的原始表（可选，不提供时自动加载）
+            streaming: 是否使用低内存的流式流水线（逐表读取、过滤、写出）
+            link_mode: 数据文件落地方式（symlink/hardlink/reflink/copy），指定时覆盖use_symlink；
+                       不可用时按回退链自动降级（如跨设备无法硬链接时改为复制）
+            resume: 是否根据版本目录中的创建清单（.version_manifest.json）跳过已完成的阶段、
+                    校验通过的表和台账中已落地的文件；为False时从头创建
+        """
+        materializer = FileMaterializer(link_mode or ('symlink' if use_symlink else 'hardlink'))
+        
+        # 已完整创建的版本直接跳过，全部完成时无需加载原始数据
+        manifests = {}
+        for version_name, categories in versions.items():
+            manifest = self._open_manifest(os.path.join(output_dataroot, version_name),
+                                           categories, resume, link_mode=materializer.mode)
+            if manifest.is_complete():
+                print(f"\n版本 {version_name} 已完整创建（创建清单校验通过），跳过")
+                manifest.close()
+            else:
+                manifests[version_name] = manifest
+        versions = {name: versions[name] for name in manifests}
+        if not versions:
+            return output_dataroot
+        
+        if streaming and self._filter_options():
+            raise ValueError("流式流水线不支持sweep/通道过滤和关键帧抽稀（需要完整的链表和传感器表），"
+                             "请去掉--low-memory")
+        
+        try:
+            if streaming:
+                return self._create_versions_streaming(output_dataroot, versions,
+                                                       materializer, manifests)
+            
+            if tables is None:
+                tables = self.load_tables()
+            
+            for version_name, categories in versions.items():
+                self._create_version_from_tables(
+                    tables, output_dataroot, version_name, categories, materializer,
+                    manifests[version_name]
+                )
+        finally:
+            for manifest in manifests.values():
+                manifest.close()
+        
+        return output_dataroot
+    
+    def _create_version_from_tables(self,
+                                    tables: NuScenesTables,
+                                    output_dataroot: str,
+                                    version_name: str,
+                                    categories: List[str],
+                                    materializer: FileMaterializer,
+                                    manifest: VersionManifest):
+        """基于已加载的原始表创建单个版本，已记录在创建清单中的工作会被跳过"""
         print("\n" + "=" * 80)
         print(f"创建NuScenes版本: {version_name}")
         print("=" * 80)
@@ -75,218 +352,655 @@ class NuScenesVersionCreator:
         os.makedirs(output_version_path, exist_ok=True)
         
         # 获取目标sample tokens
-        target_tokens = set()
-        for category in categories:
-            tokens = self.redundancy_loader.get_samples_by_category(category)
-            target_tokens.update(tokens)
+        target_tokens = self._get_target_tokens(categories)
         
         print(f"\n目标样本数: {len(target_tokens)}")
         print(f"类别: {', '.join(categories)}")
         
-        # 加载原始数据
-        print("\n加载原始数据...")
-        sample_list = self._load_json('sample.json')
-        scene_list = self._load_json('scene.json')
-        sample_data_list = self._load_json('sample_data.json')
-        ego_pose_list = self._load_json('ego_pose.json')
-        calibrated_sensor_list = self._load_json('calibrated_sensor.json')
-        sensor_list = self._load_json('sensor.json')
-        log_list = self._load_json('log.json')
-        
-        # 可选文件
-        try:
-            category_list = self._load_json('category.json')
-            attribute_list = self._load_json('attribute.json')
-            visibility_list = self._load_json('visibility.json')
-            instance_list = self._load_json('instance.json')
-            sample_annotation_list = self._load_json('sample_annotation.json')
-        except:
-            category_list = []
-            attribute_list = []
-            visibility_list = []
-            instance_list = []
-            sample_annotation_list = []
-        
-        print("原始数据加载完成")
-        
         # 过滤数据
         print("\n过滤数据...")
-        filtered_data = self._filter_data(
-            target_tokens,
-            sample_list,
-            scene_list,
-            sample_data_list,
-            ego_pose_list,
-            calibrated_sensor_list,
-            sensor_list,
-            log_list,
-            category_list,
-            attribute_list,
-            visibility_list,
-            instance_list,
-            sample_annotation_list
-        )
+        filtered_data = self._filter_data(tables, target_tokens)
         
         # 保存JSON文件
         print("\n保存元数据文件...")
-        self._save_json(filtered_data['samples'], 
-                       os.path.join(output_version_path, 'sample.json'))
-        self._save_json(filtered_data['scenes'], 
-                       os.path.join(output_version_path, 'scene.json'))
-        self._save_json(filtered_data['sample_data'], 
-                       os.path.join(output_version_path, 'sample_data.json'))
-        self._save_json(filtered_data['ego_poses'], 
-                       os.path.join(output_version_path, 'ego_pose.json'))
-        self._save_json(filtered_data['calibrated_sensors'], 
-                       os.path.join(output_version_path, 'calibrated_sensor.json'))
-        self._save_json(filtered_data['sensors'], 
-                       os.path.join(output_version_path, 'sensor.json'))
-        self._save_json(filtered_data['logs'], 
-                       os.path.join(output_version_path, 'log.json'))
-        
-        if filtered_data['categories']:
-            self._save_json(filtered_data['categories'], 
-                           os.path.join(output_version_path, 'category.json'))
-        if filtered_data['attributes']:
-            self._save_json(filtered_data['attributes'], 
-                           os.path.join(output_version_path, 'attribute.json'))
-        if filtered_data['visibilities']:
-            self._save_json(filtered_data['visibilities'], 
-                           os.path.join(output_version_path, 'visibility.json'))
-        if filtered_data['instances']:
-            self._save_json(filtered_data['instances'], 
-                           os.path.join(output_version_path, 'instance.json'))
-        if filtered_data['sample_annotations']:
-            self._save_json(filtered_data['sample_annotations'], 
-                           os.path.join(output_version_path, 'sample_annotation.json'))
+        for table, key in TABLE_KEYS:
+            # 可选表为空时不写出
+            if filtered_data[key] or table not in OPTIONAL_TABLES:
+                if manifest.table_done(table):
+                    print(f"  已完成: {table}.json (校验通过，跳过)")
+                    continue
+                sha256 = self._save_json(filtered_data[key],
+                                         os.path.join(output_version_path, f'{table}.json'))
+                manifest.record_table(table, len(filtered_data[key]), sha256)
+        manifest.mark_stage('tables')
         
         # 链接或复制数据文件
         print("\n处理数据文件...")
-        self._link_data_files(
-            output_dataroot,
-            filtered_data['sample_data'],
-            use_symlink
-        )
+        if manifest.stage_done('links'):
+            print("  数据文件已全部落地，跳过")
+        elif self._link_data_files(output_dataroot, filtered_data['sample_data'],
+                                   materializer, manifest.ledger) == 0:
+            manifest.mark_stage('links')
         
         # 链接maps
-        self._link_maps(output_dataroot, use_symlink)
+        if not manifest.stage_done('maps'):
+            self._link_maps(output_dataroot, materializer)
+            manifest.mark_stage('maps')
         
         # 生成统计报告
+        if not manifest.stage_done('report'):
+            self._generate_version_report(
+                output_dataroot,
+                version_name,
+                {key: len(rows) for key, rows in filtered_data.items()},
+                categories
+            )
+            manifest.mark_stage('report')
+        
+        print("\n" + "=" * 80)
+        print("版本创建完成！")
+        print("=" * 80)
+        print(f"\n新版本路径: {output_dataroot}/{version_name}")
+    
+    def update_version(self,
+                       output_dataroot: str,
+                       version_name: str,
+                       categories: List[str],
+                       use_symlink: bool = True,
+                       link_mode: Optional[str] = None):
+        """
+        增量更新已存在的版本（划分结果重新调整后使用）
+        
+        Args:
+            output_dataroot: 输出数据根目录
+            version_name: 版本名称
+            categories: 包含的冗余度类别列表
+            use_symlink: 是否使用符号链接（节省空间），为False时使用硬链接
+            link_mode: 数据文件落地方式，指定时覆盖use_symlink
+        """
+        return self.update_versions(output_dataroot,
+                                    {version_name: categories},
+                                    use_symlink=use_symlink,
+                                    link_mode=link_mode)
+    
+    def update_versions(self,
+                        output_dataroot: str,
+                        versions: Dict[str, List[str]],
+                        use_symlink: bool = True,
+                        tables: Optional[NuScenesTables] = None,
+                        link_mode: Optional[str] = None):
+        """
+        增量更新多个已存在的版本
+        以版本中现有的sample.json作为旧的目标集合，与新的目标集合比较：
+        只重写内容发生变化的表，只新增/删除受影响的数据文件，其余内容保持不动。
+        版本目录不存在时按正常流程创建
+        
+        Args:
+            output_dataroot: 输出数据根目录
+            versions: 版本名称到冗余度类别列表的映射
+            use_symlink: 是否使用符号链接（节省空间），为False时使用硬链接
+            tables: 已加载的原始表（可选，不提供时自动加载）
+            link_mode: 数据文件落地方式，指定时覆盖use_symlink
+        """
+        materializer = FileMaterializer(link_mode or ('symlink' if use_symlink else 'hardlink'))
+        
+        manifests = {}
+        for version_name, categories in versions.items():
+            manifest = self._open_manifest(os.path.join(output_dataroot, version_name),
+                                           categories, resume=True, adopt=True,
+                                           link_mode=materializer.mode)
+            if manifest.resumed and manifest.is_complete():
+                print(f"\n版本 {version_name} 已与当前划分一致（创建清单校验通过），跳过")
+                manifest.close()
+            else:
+                manifests[version_name] = manifest
+        if not manifests:
+            return output_dataroot
+        
+        if tables is None:
+            tables = self.load_tables()
+        
+        try:
+            for version_name, manifest in manifests.items():
+                sample_path = os.path.join(output_dataroot, version_name, 'sample.json')
+                rebuild = not manifest.resumed and (not os.path.exists(sample_path)
+                                                    or not self._same_source(manifest))
+                if rebuild:
+                    # 版本尚不存在，或由不同的原始版本/过滤选项生成：丢弃旧清单从头创建
+                    manifest.close()
+                    manifest = self._open_manifest(os.path.join(output_dataroot, version_name),
+                                                   versions[version_name], resume=False,
+                                                   link_mode=materializer.mode)
+                    manifests[version_name] = manifest
+                if manifest.resumed or rebuild:
+                    # 同一输入的中断续做，或从头创建：走正常的创建流程
+                    self._create_version_from_tables(
+                        tables, output_dataroot, version_name, versions[version_name],
+                        materializer, manifest
+                    )
+                else:
+                    self._update_version_from_tables(
+                        tables, output_dataroot, version_name, versions[version_name],
+                        materializer, manifest
+                    )
+        finally:
+            for manifest in manifests.values():
+                manifest.close()
+        
+        return output_dataroot
+    
+    def _same_source(self, manifest: VersionManifest) -> bool:
+        """已有清单记录的原始版本和过滤选项是否与本次一致（只有类别/划分可以增量更新）"""
+        recorded = manifest.data.get('inputs', {})
+        keys = (set(recorded) | set(manifest.inputs)) - {'categories', 'redundancy_split_sha256'}
+        return all(recorded.get(key) == manifest.inputs.get(key) for key in keys)
+    
+    def _update_version_from_tables(self,
+                                    tables: NuScenesTables,
+                                    output_dataroot: str,
+                                    version_name: str,
+                                    categories: List[str],
+                                    materializer: FileMaterializer,
+                                    manifest: VersionManifest):
+        """
+        基于已加载的原始表增量更新单个版本
+        新旧两个目标集合分别在原始表上计算行掩码，按掩码差异决定需要重写的表和增删的数据文件。
+        sample.json最后写出：中途中断时它仍是旧集合，重新运行会得到相同的差异并幂等地续做
+        """
+        print("\n" + "=" * 80)
+        print(f"增量更新NuScenes版本: {version_name}")
+        print("=" * 80)
+        
+        output_version_path = os.path.join(output_dataroot, version_name)
+        old_tokens = self._read_version_sample_tokens(output_version_path)
+        target_tokens = self._get_target_tokens(categories)
+        
+        print(f"\n旧样本数: {len(old_tokens)}, 新样本数: {len(target_tokens)}")
+        print(f"类别: {', '.join(categories)}")
+        
+        old_masks = self._compute_masks(tables, old_tokens)
+        new_masks = self._compute_masks(tables, target_tokens)
+        # 数据文件阶段未完成（落地方式变化或上次更新中断）时重新检查全部数据文件
+        relink = not manifest.stage_done('links')
+        manifest.begin_update()
+        
+        # 需要重写的表：掩码发生变化，或文件缺失
+        print("\n比较各表...")
+        changed = []
+        for table, key in TABLE_KEYS:
+            added = int(np.count_nonzero(new_masks[table] & ~old_masks[table]))
+            removed = int(np.count_nonzero(old_masks[table] & ~new_masks[table]))
+            exists = os.path.exists(os.path.join(output_version_path, f'{table}.json'))
+            expected = new_masks[table].any() or table not in OPTIONAL_TABLES
+            if added or removed or exists != expected:
+                changed.append(table)
+                print(f"  {table}: +{added} -{removed}")
+        if self.decimating:
+            # 抽稀时scene/instance记录的首尾token和数量随成员表变化
+            for owner, (member, *_) in CHAIN_SUMMARIES.items():
+                if member in changed and owner not in changed:
+                    changed.append(owner)
+        if not changed:
+            print("  所有表均无变化")
+        
+        sd_added = new_masks['sample_data'] & ~old_masks['sample_data']
+        sd_removed = old_masks['sample_data'] & ~new_masks['sample_data']
+        filenames = tables.column('sample_data', 'filename')
+        
+        # 1. 落地新增的数据文件
+        print("\n处理数据文件...")
+        sd_link = new_masks['sample_data'] if relink else sd_added
+        added_files = set(name.decode() for name in filenames[sd_link] if name)
+        failed = self._link_files(output_dataroot, added_files, materializer, manifest.ledger)
+        
+        # 2. 重写变化的表（sample.json除外）
+        for table, _ in TABLE_KEYS:
+            if table != 'sample' and table in changed:
+                self._rewrite_table(tables, output_version_path, table,
+                                    new_masks, manifest)
+        
+        # 3. 删除不再需要的数据文件（同一输出目录下其他版本仍在使用的文件保留）
+        if sd_removed.any():
+            unused_files = [name.decode() for name in filenames[sd_removed] if name]
+            sd_removed &= ~self._other_versions_sample_data_mask(tables, output_dataroot,
+                                                                 version_name)
+            self._remove_files(output_dataroot,
+                               [name.decode() for name in filenames[sd_removed] if name])
+            manifest.ledger.discard(unused_files)
+        
+        # 4. 最后写出sample.json
+        if 'sample' in changed:
+            self._rewrite_table(tables, output_version_path, 'sample',
+                                new_masks, manifest)
+        
+        manifest.mark_stage('tables')
+        if failed == 0:
+            manifest.mark_stage('links')
+        if not manifest.stage_done('maps'):
+            self._link_maps(output_dataroot, materializer)
+            manifest.mark_stage('maps')
+        
         self._generate_version_report(
             output_dataroot,
             version_name,
-            filtered_data,
+            {key: int(np.count_nonzero(new_masks[table])) for table, key in TABLE_KEYS},
             categories
         )
+        manifest.mark_stage('report')
+        manifest.commit_inputs()
+        
+        print("\n" + "=" * 80)
+        print(f"版本更新完成！重写了 {len(changed)} 张表")
+        print("=" * 80)
+    
+    def _rewrite_table(self,
+                       tables: NuScenesTables,
+                       output_version_path: str,
+                       table: str,
+                       masks: Dict[str, np.ndarray],
+                       manifest: VersionManifest):
+        """按掩码重写版本中的一张表（可选表为空时删除文件）"""
+        path = os.path.join(output_version_path, f'{table}.json')
+        rows = self._select_rows(tables, table, masks)
+        if not rows and table in OPTIONAL_TABLES:
+            if os.path.exists(path):
+                os.unlink(path)
+                print(f"  已删除: {table}.json")
+            manifest.data['tables'].pop(table, None)
+            return
+        sha256 = self._save_json(rows, path)
+        manifest.record_table(table, len(rows), sha256)
+    
+    def _read_version_sample_tokens(self, version_path: str) -> Set[str]:
+        """流式读取已存在版本的sample tokens"""
+        return set(row['token'] for row in
+                   iter_json_array(os.path.join(version_path, 'sample.json')))
+    
+    def _other_versions_sample_data_mask(self,
+                                         tables: NuScenesTables,
+                                         output_dataroot: str,
+                                         version_name: str) -> np.ndarray:
+        """
+        同一输出目录下其他版本使用的sample_data行掩码
+        数据文件在各版本之间共享，删除文件前需要排除这些行
+        """
+        mask = np.zeros(len(tables['sample_data']), dtype=bool)
+        for name in sorted(list_dir_names(output_dataroot)):
+            version_path = os.path.join(output_dataroot, name)
+            if name == version_name or not os.path.isfile(os.path.join(version_path,
+                                                                       'sample.json')):
+                continue
+            tokens = self._read_version_sample_tokens(version_path)
+            mask |= gather_mask(
+                isin_sorted(np.unique(to_token_array(tokens)),
+                            tables.column('sample', 'token')),
+                tables.foreign_key('sample_data', 'sample_token', 'sample')
+            )
+        return mask
+    
+    def _remove_files(self, output_dataroot: str, file_paths: List[str]):
+        """并发删除一组已落地的数据文件（不存在的文件忽略）"""
+        def remove_batch(batch):
+            removed = 0
+            for rel_path in batch:
+                try:
+                    os.unlink(os.path.join(output_dataroot, rel_path))
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+            return removed
+        
+        batches = [file_paths[i:i + LINK_BATCH_SIZE]
+                   for i in range(0, len(file_paths), LINK_BATCH_SIZE)]
+        with ThreadPoolExecutor(max_workers=self.link_workers) as executor:
+            removed = sum(executor.map(remove_batch, batches))
+        print(f"  ✓ 删除 {removed} 个不再需要的数据文件")
+    
+    def _create_versions_streaming(self,
+                                   output_dataroot: str,
+                                   versions: Dict[str, List[str]],
+                                   materializer: FileMaterializer,
+                                   manifests: Dict[str, VersionManifest]):
+        """
+        低内存的流式版本创建
+        按依赖顺序逐表处理：每张表从磁盘流式读取，按目前已收集的token集合分批过滤，
+        直接写出到各版本的JSON文件，处理完后即释放，不会同时持有完整的原始表和过滤结果
+        数据文件列表在过滤过程中收集，因此元数据表总是重新写出；数据文件、maps和报告按创建清单续做
+        """
+        states = {}
+        for version_name, categories in versions.items():
+            print("\n" + "=" * 80)
+            print(f"创建NuScenes版本(流式): {version_name}")
+            print("=" * 80)
+            
+            target_tokens = self._get_target_tokens(categories)
+            print(f"\n目标样本数: {len(target_tokens)}")
+            print(f"类别: {', '.join(categories)}")
+            
+            output_version_path = os.path.join(output_dataroot, version_name)
+            os.makedirs(output_version_path, exist_ok=True)
+            states[version_name] = {
+                'path': output_version_path,
+                'manifest': manifests[version_name],
+                'categories': categories,
+                'keys': {'sample': np.unique(to_token_array(target_tokens))},
+                'counts': {},
+                'files': set()
+            }
+        
+        print("\n流式过滤并保存元数据文件...")
+        for table, field, key_set, collects in STREAMING_PIPELINE:
+            self._stream_table(table, field, key_set, collects, states)
+        
+        for version_name, state in states.items():
+            manifest = state['manifest']
+            manifest.mark_stage('tables')
+            
+            print(f"\n处理数据文件: {version_name}")
+            if manifest.stage_done('links'):
+                print("  数据文件已全部落地，跳过")
+            elif self._link_files(output_dataroot, state['files'], materializer,
+                                  manifest.ledger) == 0:
+                manifest.mark_stage('links')
+            
+            if not manifest.stage_done('maps'):
+                self._link_maps(output_dataroot, materializer)
+                manifest.mark_stage('maps')
+            
+            if not manifest.stage_done('report'):
+                counts = {key: state['counts'].get(table, 0) for table, key in TABLE_KEYS}
+                self._generate_version_report(
+                    output_dataroot, version_name, counts, state['categories']
+                )
+                manifest.mark_stage('report')
+            print(f"\n新版本路径: {output_dataroot}/{version_name}")
         
         print("\n" + "=" * 80)
         print("版本创建完成！")
         print("=" * 80)
-        print(f"\n新版本路径: {output_dataroot}/{version_name}")
         
         return output_dataroot
     
+    def _stream_table(self,
+                      table: str,
+                      field: Optional[str],
+                      key_set: Optional[str],
+                      collects: List[Tuple[str, str]],
+                      states: Dict[str, Dict]):
+        """
+        流式过滤单张表并写出到所有版本
+        
+        Args:
+            table: 表名
+            field: 用于过滤的字段（None表示保留全部记录）
+            key_set: field需要属于的token集合名称
+            collects: 需要从保留的记录中收集的 (字段, token集合名称)
+            states: 各版本的状态（token集合、计数、数据文件）
+        """
+        src_path = os.path.join(self.original_version_path, f'{table}.json')
+        optional = table in OPTIONAL_TABLES
+        if not os.path.exists(src_path):
+            if not optional:
+                raise FileNotFoundError(f"文件不存在: {src_path}")
+            return
+        
+        writers = {
+            name: JsonArrayWriter(os.path.join(state['path'], f'{table}.json'),
+                                  write_empty=not optional)
+            for name, state in states.items()
+        }
+        collected = {name: {target: [] for _, target in collects} for name in states}
+        total = 0
+        
+        try:
+            for batch in iter_batches(iter_json_array(src_path), STREAM_BATCH_SIZE):
+                total += len(batch)
+                if field is not None:
+                    values = to_token_array([row.get(field) or '' for row in batch])
+                
+                for name, state in states.items():
+                    if field is None:
+                        kept = batch
+                    else:
+                        mask = isin_sorted(state['keys'][key_set], values)
+                        kept = [row for row, keep in zip(batch, mask) if keep]
+                    
+                    writers[name].write_many(kept)
+                    for collect_field, target in collects:
+                        collected[name][target].append(to_token_array(
+                            [row.get(collect_field) or '' for row in kept]
+                        ))
+                    if table == 'sample_data':
+                        state['files'].update(row['filename'] for row in kept
+                                              if 'filename' in row)
+        except BaseException as e:
+            for writer in writers.values():
+                writer.abort(e)
+            raise
+        
+        for name, state in states.items():
+            writers[name].close()
+            state['counts'][table] = writers[name].count
+            if writers[name].sha256 is not None:
+                state['manifest'].record_table(table, writers[name].count,
+                                               writers[name].sha256)
+            for target, arrays in collected[name].items():
+                tokens = np.unique(np.concatenate(arrays)) if arrays else to_token_array([])
+                state['keys'][target] = tokens[tokens != b'']
+            if writers[name].count or not optional:
+                print(f"  [{name}] {table}: {writers[name].count}/{total}")
+    
+    def _compute_masks(self,
+                       tables: NuScenesTables,
+                       target_tokens: Set[str]) -> Dict[str, np.ndarray]:
+        """
+        计算各表需要保留的行掩码
+        外键行号数组在NuScenesTables中缓存，多个版本之间只有掩码不同
+        
+        Returns:
+            表名到bool掩码的映射
+        """
+        target_sorted = np.unique(to_token_array(target_tokens))
+        masks = {}
+        
+        # samples（可选地在场景内抽稀关键帧）
+        masks['sample'] = isin_sorted(target_sorted, tables.column('sample', 'token'))
+        if self.decimating:
+            masks['sample'] &= self._sample_keep_mask(tables)
+        
+        # 被保留的sample引用的scenes，以及这些scenes引用的logs
+        masks['scene'] = mask_from_references(
+            len(tables['scene']),
+            tables.foreign_key('sample', 'scene_token', 'scene'),
+            masks['sample']
+        )
+        masks['log'] = mask_from_references(
+            len(tables['log']),
+            tables.foreign_key('scene', 'log_token', 'log'),
+            masks['scene']
+        )
+        
+        # sample_data（通过sample_token关联）及其引用的ego_pose/calibrated_sensor
+        masks['sample_data'] = gather_mask(
+            masks['sample'],
+            tables.foreign_key('sample_data', 'sample_token', 'sample')
+        )
+        if self.max_sweeps is not None:
+            masks['sample_data'] &= self._sweep_mask(tables)
+        if self.channels is not None:
+            masks['sample_data'] &= self._channel_mask(tables)
+        masks['ego_pose'] = mask_from_references(
+            len(tables['ego_pose']),
+            tables.foreign_key('sample_data', 'ego_pose_token', 'ego_pose'),
+            masks['sample_data']
+        )
+        masks['calibrated_sensor'] = mask_from_references(
+            len(tables['calibrated_sensor']),
+            tables.foreign_key('sample_data', 'calibrated_sensor_token', 'calibrated_sensor'),
+            masks['sample_data']
+        )
+        masks['sensor'] = mask_from_references(
+            len(tables['sensor']),
+            tables.foreign_key('calibrated_sensor', 'sensor_token', 'sensor'),
+            masks['calibrated_sensor']
+        )
+        
+        # annotations及其引用的instances（如果有）
+        masks['sample_annotation'] = gather_mask(
+            masks['sample'],
+            tables.foreign_key('sample_annotation', 'sample_token', 'sample')
+        )
+        masks['instance'] = mask_from_references(
+            len(tables['instance']),
+            tables.foreign_key('sample_annotation', 'instance_token', 'instance'),
+            masks['sample_annotation']
+        )
+        
+        # 保留所有categories/attributes/visibilities
+        for table in ['category', 'attribute', 'visibility']:
+            masks[table] = np.ones(len(tables[table]), dtype=bool)
+        
+        return masks
+    
+    def _sample_data_sensor_mask(self,
+                                 tables: NuScenesTables,
+                                 sensor_mask: np.ndarray) -> np.ndarray:
+        """沿 sample_data -> calibrated_sensor -> sensor 取出传感器掩码"""
+        return gather_mask(
+            gather_mask(sensor_mask,
+                        tables.foreign_key('calibrated_sensor', 'sensor_token', 'sensor')),
+            tables.foreign_key('sample_data', 'calibrated_sensor_token', 'calibrated_sensor')
+        )
+    
+    def _channel_mask(self, tables: NuScenesTables) -> np.ndarray:
+        """
+        按channels计算sample_data的保留掩码
+        每条链表只属于一个通道，整条保留或整条丢弃，因此prev/next无需重新连接
+        """
+        sensor_channels = tables.column('sensor', 'channel')
+        wanted = to_token_array(self.channels)
+        unknown = sorted(set(self.channels) - set(c.decode() for c in sensor_channels))
+        if unknown:
+            available = ', '.join(sorted(c.decode() for c in sensor_channels))
+            raise ValueError(f"未知的传感器通道: {', '.join(unknown)}，可选: {available}")
+        return self._sample_data_sensor_mask(tables, np.isin(sensor_channels, wanted))
+    
+    def _key_frame_mask(self, tables: NuScenesTables) -> np.ndarray:
+        """sample_data的关键帧掩码"""
+        rows = tables['sample_data']
+        return np.fromiter((bool(row.get('is_key_frame')) for row in rows),
+                           dtype=bool, count=len(rows))
+    
+    def _sample_keep_mask(self, tables: NuScenesTables) -> np.ndarray:
+        """
+        场景内关键帧抽稀的保留掩码（sample_stride、min_ego_motion、keep_samples取交集）
+        位置和行驶距离都按原始sample链表计算，因此对同一原始数据的结果是确定的
+        """
+        keep = np.ones(len(tables['sample']), dtype=bool)
+        if self.keep_samples is not None:
+            keep &= isin_sorted(self.keep_samples, tables.column('sample', 'token'))
+        
+        if self.sample_stride is None and self.min_ego_motion is None:
+            return keep
+        
+        head, position = tables.chain_order('sample')
+        if self.sample_stride is not None:
+            keep &= position % self.sample_stride == 0
+        
+        if self.min_ego_motion is not None:
+            # 沿链表累计自车行驶距离，每跨过一个min_ego_motion的区间保留一帧
+            order = np.lexsort((position, head))
+            xy = self._sample_ego_xy(tables)[order]
+            starts = position[order] == 0
+            step = np.zeros(len(order))
+            step[1:] = np.linalg.norm(xy[1:] - xy[:-1], axis=1)
+            step[starts | np.isnan(step)] = 0.0
+            travelled = np.cumsum(step)
+            chain_start = np.maximum.accumulate(np.where(starts, np.arange(len(order)), 0))
+            bucket = np.floor((travelled - travelled[chain_start]) / self.min_ego_motion)
+            moved = starts.copy()
+            moved[1:] |= bucket[1:] != bucket[:-1]
+            keep[order] &= moved
+        
+        return keep
+    
+    def _sample_ego_xy(self, tables: NuScenesTables) -> np.ndarray:
+        """
+        每个sample的自车平面位置（取关键帧sample_data的ego_pose，优先激光雷达）
+        
+        Returns:
+            (样本数, 2) 数组，没有关键帧sample_data的sample为NaN
+        """
+        sample = tables.foreign_key('sample_data', 'sample_token', 'sample')
+        pose = tables.foreign_key('sample_data', 'ego_pose_token', 'ego_pose')
+        is_lidar = self._sample_data_sensor_mask(
+            tables, tables.column('sensor', 'modality') == b'lidar'
+        )
+        candidates = np.flatnonzero(self._key_frame_mask(tables) & (sample >= 0) & (pose >= 0))
+        candidates = candidates[np.lexsort((~is_lidar[candidates], sample[candidates]))]
+        samples, first = np.unique(sample[candidates], return_index=True)
+        
+        poses = tables['ego_pose']
+        xy = np.full((len(tables['sample']), 2), np.nan)
+        if len(samples):
+            xy[samples] = [poses[p]['translation'][:2] for p in pose[candidates[first]]]
+        return xy
+    
+    def _sweep_mask(self, tables: NuScenesTables) -> np.ndarray:
+        """
+        按max_sweeps计算sample_data的保留掩码：保留全部关键帧，以及每个关键帧之前
+        同一链表（同一场景同一通道）中最近的max_sweeps个激光雷达sweep
+        """
+        is_key = self._key_frame_mask(tables)
+        if self.max_sweeps == 0:
+            return is_key
+        
+        is_lidar = self._sample_data_sensor_mask(
+            tables, tables.column('sensor', 'modality') == b'lidar'
+        )
+        
+        # 按 (链头, 链内位置) 排序后，找到每条记录之后（含自身）最近的关键帧
+        head, position = tables.chain_order('sample_data')
+        order = np.lexsort((position, head))
+        n = len(order)
+        candidates = np.where(is_key[order], np.arange(n), n)
+        next_key = np.minimum.accumulate(candidates[::-1])[::-1]
+        found = next_key < n
+        next_key = order[np.minimum(next_key, n - 1)]
+        same_chain = found & (head[next_key] == head[order])
+        distance = position[next_key] - position[order]
+        
+        keep = np.empty(n, dtype=bool)
+        keep[order] = is_key[order] | (is_lidar[order] & same_chain
+                                       & (distance <= self.max_sweeps))
+        return keep
+    
     def _filter_data(self,
-                     target_tokens: Set[str],
-                     sample_list: List[Dict],
-                     scene_list: List[Dict],
-                     sample_data_list: List[Dict],
-                     ego_pose_list: List[Dict],
-                     calibrated_sensor_list: List[Dict],
-                     sensor_list: List[Dict],
-                     log_list: List[Dict],
-                     category_list: List[Dict],
-                     attribute_list: List[Dict],
-                     visibility_list: List[Dict],
-                     instance_list: List[Dict],
-                     sample_annotation_list: List[Dict]) -> Dict:
+                     tables: NuScenesTables,
+                     target_tokens: Set[str]) -> Dict:
         """
         过滤数据，只保留目标samples相关的所有数据
         """
-        # 过滤samples
-        filtered_samples = [s for s in sample_list if s['token'] in target_tokens]
-        sample_tokens = {s['token'] for s in filtered_samples}
-        
-        print(f"  samples: {len(filtered_samples)}/{len(sample_list)}")
-        
-        # 获取相关的scene tokens
-        scene_tokens = {s['scene_token'] for s in filtered_samples}
-        filtered_scenes = [s for s in scene_list if s['token'] in scene_tokens]
-        print(f"  scenes: {len(filtered_scenes)}/{len(scene_list)}")
-        
-        # 过滤sample_data（通过sample_token关联）
-        filtered_sample_data = [
-            sd for sd in sample_data_list 
-            if sd.get('sample_token') in sample_tokens
-        ]
-        sample_data_tokens = {sd['token'] for sd in filtered_sample_data}
-        print(f"  sample_data: {len(filtered_sample_data)}/{len(sample_data_list)}")
-        
-        # 获取相关的ego_pose tokens
-        ego_pose_tokens = {sd['ego_pose_token'] for sd in filtered_sample_data 
-                          if 'ego_pose_token' in sd}
-        filtered_ego_poses = [ep for ep in ego_pose_list if ep['token'] in ego_pose_tokens]
-        print(f"  ego_poses: {len(filtered_ego_poses)}/{len(ego_pose_list)}")
-        
-        # 获取相关的calibrated_sensor tokens
-        calibrated_sensor_tokens = {
-            sd['calibrated_sensor_token'] for sd in filtered_sample_data 
-            if 'calibrated_sensor_token' in sd
-        }
-        filtered_calibrated_sensors = [
-            cs for cs in calibrated_sensor_list 
-            if cs['token'] in calibrated_sensor_tokens
-        ]
-        print(f"  calibrated_sensors: {len(filtered_calibrated_sensors)}/{len(calibrated_sensor_list)}")
-        
-        # 获取相关的sensor tokens
-        sensor_tokens = {cs['sensor_token'] for cs in filtered_calibrated_sensors}
-        filtered_sensors = [s for s in sensor_list if s['token'] in sensor_tokens]
-        print(f"  sensors: {len(filtered_sensors)}/{len(sensor_list)}")
-        
-        # 获取相关的log tokens
-        log_tokens = {scene['log_token'] for scene in filtered_scenes}
-        filtered_logs = [log for log in log_list if log['token'] in log_tokens]
-        print(f"  logs: {len(filtered_logs)}/{len(log_list)}")
-        
-        # 过滤annotations（如果有）
-        filtered_annotations = []
-        filtered_instances = []
-        if sample_annotation_list:
-            filtered_annotations = [
-                ann for ann in sample_annotation_list 
-                if ann.get('sample_token') in sample_tokens
-            ]
-            print(f"  annotations: {len(filtered_annotations)}/{len(sample_annotation_list)}")
-            
-            instance_tokens = {ann['instance_token'] for ann in filtered_annotations}
-            filtered_instances = [
-                inst for inst in instance_list 
-                if inst['token'] in instance_tokens
-            ]
-            print(f"  instances: {len(filtered_instances)}/{len(instance_list)}")
-        
-        return {
-            'samples': filtered_samples,
-            'scenes': filtered_scenes,
-            'sample_data': filtered_sample_data,
-            'ego_poses': filtered_ego_poses,
-            'calibrated_sensors': filtered_calibrated_sensors,
-            'sensors': filtered_sensors,
-            'logs': filtered_logs,
-            'categories': category_list,  # 保留所有categories
-            'attributes': attribute_list,  # 保留所有attributes
-            'visibilities': visibility_list,  # 保留所有visibilities
-            'instances': filtered_instances,
-            'sample_annotations': filtered_annotations
-        }
+        masks = self._compute_masks(tables, target_tokens)
+        
+        filtered_data = {}
+        for table, key in TABLE_KEYS:
+            filtered_data[key] = self._select_rows(tables, table, masks)
+            if table not in ('category', 'attribute', 'visibility') and tables[table]:
+                print(f"  {key}: {len(filtered_data[key])}/{len(tables[table])}")
+        
+        return filtered_data
     
     def _link_data_files(self,
                         output_dataroot: str,
                         sample_data_list: List[Dict],
-                        use_symlink: bool):
+                        materializer: FileMaterializer,
+                        ledger: Optional[LinkLedger] = None) -> int:
         """
         链接或复制数据文件
+        
+        Returns:
+            未能落地的文件数
         """
         # 收集所有需要的文件路径
         file_paths = set()
@@ -294,71 +1008,206 @@ class NuScenesVersionCreator:
             if 'filename' in sd:
                 file_paths.add(sd['filename'])
         
+        return self._link_files(output_dataroot, file_paths, materializer, ledger)
+    
+    def _link_files(self,
+                    output_dataroot: str,
+                    file_paths: Set[str],
+                    materializer: FileMaterializer,
+                    ledger: Optional[LinkLedger] = None) -> int:
+        """
+        链接或复制一组数据文件（路径相对于数据根目录）
+        提供台账时，台账中已记录的文件不再扫描，新落地（或扫描时发现已存在）的文件追加到台账
+        非符号链接方式下，输出中已存在的符号链接（如之前以symlink方式创建）视为缺失，原子替换为实际文件
+        
+        Returns:
+            未能落地的文件数
+        """
         print(f"  需要处理 {len(file_paths)} 个数据文件")
+        start_time = time.time()
+        
+        recorded_count = 0
+        if ledger is not None:
+            recorded = ledger.load()
+            if recorded:
+                pending = file_paths - recorded
+                recorded_count = len(file_paths) - len(pending)
+                file_paths = pending
+                print(f"  台账中已记录 {recorded_count} 个, 剩余 {len(file_paths)} 个 "
+                      f"({time.time() - start_time:.1f}s)")
         
-        # 创建必要的目录
-        dirs_to_create = set()
+        # 按目录分组，每个源/目标目录只用os.scandir列出一次
+        files_by_dir = defaultdict(list)
         for filepath in file_paths:
-            dir_path = os.path.dirname(filepath)
-            dirs_to_create.add(dir_path)
+            dir_path, name = os.path.split(filepath)
+            files_by_dir[dir_path].append(name)
         
-        for dir_path in dirs_to_create:
+        for dir_path in files_by_dir:
             os.makedirs(os.path.join(output_dataroot, dir_path), exist_ok=True)
         
-        # 链接或复制文件
-        linked_count = 0
+        replace_symlinks = not materializer.links_directories
+        
+        def plan_directory(dir_path):
+            existing, symlinks = list_dir_symlinks(os.path.join(output_dataroot, dir_path))
+            available = list_dir_names(os.path.join(self.original_dataroot, dir_path))
+            wanted = set(files_by_dir[dir_path])
+            stale = wanted & symlinks if replace_symlinks else set()
+            missing = (wanted - existing) | stale
+            return ([os.path.join(dir_path, n) for n in wanted - missing],
+                    [os.path.join(dir_path, n) for n in missing & available],
+                    [os.path.join(dir_path, n) for n in missing - available],
+                    [os.path.join(dir_path, n) for n in stale & available])
+        
+        linked_count = recorded_count
         failed_files = []
+        to_link = []
+        to_replace = set()
+        with ThreadPoolExecutor(max_workers=self.link_workers) as executor:
+            for existing, pending, unavailable, stale in executor.map(plan_directory,
+                                                                      files_by_dir):
+                linked_count += len(existing)
+                to_link.extend(pending)
+                failed_files.extend(unavailable)
+                to_replace.update(stale)
+                if ledger is not None:
+                    ledger.record(existing)
         
-        for filepath in file_paths:
-            src = os.path.join(self.original_dataroot, filepath)
-            dst = os.path.join(output_dataroot, filepath)
-            
-            if os.path.exists(dst):
-                linked_count += 1
-                continue
-            
-            if not os.path.exists(src):
-                failed_files.append(filepath)
-                continue
-            
-            try:
-                if use_symlink:
-                    os.symlink(src, dst)
-                else:
-                    # 使用硬链接节省空间
-                    os.link(src, dst)
-                linked_count += 1
-                
-                if linked_count % 1000 == 0:
-                    print(f"    已处理 {linked_count}/{len(file_paths)} 个文件")
-            except Exception as e:
-                failed_files.append(filepath)
+        print(f"  已存在 {linked_count} 个, 待链接 {len(to_link)} 个"
+              f"{f'（其中替换符号链接 {len(to_replace)} 个）' if to_replace else ''}, "
+              f"源文件缺失 {len(failed_files)} 个 "
+              f"(目录扫描 {time.time() - start_time:.1f}s)")
+        
+        mode_counts, failed = self._materialize_files(
+            self.original_dataroot, output_dataroot, to_link, materializer, ledger,
+            replace=to_replace
+        )
+        linked_count += sum(mode_counts.values())
+        failed_files.extend(failed)
         
-        print(f"  ✓ 成功链接 {linked_count} 个文件")
+        elapsed = time.time() - start_time
+        print(f"  ✓ 成功链接 {linked_count} 个文件 "
+              f"(耗时 {elapsed:.1f}s, {len(to_link) / max(elapsed, 1e-6):.0f} 文件/秒)")
+        if mode_counts:
+            print(f"    落地方式: {format_counts(mode_counts)}")
         if failed_files:
             print(f"  ✗ 失败 {len(failed_files)} 个文件")
+        return len(failed_files)
+    
+    def _materialize_files(self,
+                           src_root: str,
+                           dst_root: str,
+                           rel_paths: List[str],
+                           materializer: FileMaterializer,
+                           ledger: Optional[LinkLedger] = None,
+                           replace: Optional[Set[str]] = None) -> Tuple[Dict[str, int], List[str]]:
+        """
+        在线程池中分批落地一组文件（目标目录需已存在）
+        每批完成后把成功的文件追加到台账（如果提供）
+        replace中的相对路径在目标处已有条目（如符号链接），落地后原子替换
+        
+        Returns:
+            (各落地方式的文件数, 失败的相对路径列表)
+        """
+        replace = replace or set()
+        
+        def materialize_batch(batch):
+            counts = {}
+            done = []
+            failed = []
+            for rel_path in batch:
+                try:
+                    mode = materializer.materialize(os.path.join(src_root, rel_path),
+                                                    os.path.join(dst_root, rel_path),
+                                                    replace=rel_path in replace)
+                    counts[mode] = counts.get(mode, 0) + 1
+                    done.append(rel_path)
+                except OSError:
+                    failed.append(rel_path)
+            return counts, done, failed
+        
+        mode_counts = {}
+        failed_files = []
+        start_time = time.time()
+        processed = 0
+        next_report = LINK_PROGRESS_INTERVAL
+        batches = [rel_paths[i:i + LINK_BATCH_SIZE]
+                   for i in range(0, len(rel_paths), LINK_BATCH_SIZE)]
+        with ThreadPoolExecutor(max_workers=self.link_workers) as executor:
+            futures = [executor.submit(materialize_batch, batch) for batch in batches]
+            for future in as_completed(futures):
+                counts, done, failed = future.result()
+                merge_counts(mode_counts, counts)
+                failed_files.extend(failed)
+                if ledger is not None:
+                    ledger.record(done)
+                processed += sum(counts.values()) + len(failed)
+                if processed >= next_report:
+                    rate = processed / max(time.time() - start_time, 1e-6)
+                    print(f"    已处理 {processed}/{len(rel_paths)} 个文件 ({rate:.0f} 文件/秒)")
+                    next_report += LINK_PROGRESS_INTERVAL
+        
+        return mode_counts, failed_files
     
-    def _link_maps(self, output_dataroot: str, use_symlink: bool):
-        """链接maps目录"""
+    def _link_maps(self, output_dataroot: str, materializer: FileMaterializer):
+        """
+        链接maps目录
+        符号链接方式直接链接整个目录；其他方式逐文件并发落地（已存在的文件跳过，
+        已存在的符号链接——包括整个maps目录的符号链接——替换为实际文件）
+        """
         src_maps = os.path.join(self.original_dataroot, 'maps')
         dst_maps = os.path.join(output_dataroot, 'maps')
         
-        if os.path.exists(src_maps) and not os.path.exists(dst_maps):
+        if not os.path.exists(src_maps):
+            return
+        
+        if materializer.links_directories:
+            if os.path.lexists(dst_maps):
+                return
             try:
-                if use_symlink:
-                    os.symlink(src_maps, dst_maps)
-                else:
-                    shutil.copytree(src_maps, dst_maps)
+                os.symlink(src_maps, dst_maps)
                 print(f"  ✓ 已链接 maps 目录")
-            except Exception as e:
-                print(f"  ✗ 链接 maps 失败: {e}")
+                return
+            except OSError as e:
+                print(f"  ✗ 符号链接 maps 失败，改为逐文件落地: {e}")
+        elif os.path.islink(dst_maps):
+            # 之前以symlink方式创建的目录链接，改为逐文件落地
+            os.unlink(dst_maps)
+            print(f"  已移除 maps 目录的符号链接，改为逐文件落地")
+        
+        replace_symlinks = not materializer.links_directories
+        rel_paths = []
+        to_replace = set()
+        for dir_path, _, filenames in os.walk(src_maps):
+            rel_dir = os.path.relpath(dir_path, self.original_dataroot)
+            os.makedirs(os.path.join(output_dataroot, rel_dir), exist_ok=True)
+            existing, symlinks = list_dir_symlinks(os.path.join(output_dataroot, rel_dir))
+            for name in filenames:
+                if replace_symlinks and name in symlinks:
+                    to_replace.add(os.path.join(rel_dir, name))
+                elif name in existing:
+                    continue
+                rel_paths.append(os.path.join(rel_dir, name))
+        
+        mode_counts, failed = self._materialize_files(
+            self.original_dataroot, output_dataroot, rel_paths, materializer,
+            replace=to_replace
+        )
+        if failed:
+            print(f"  ✗ maps 中 {len(failed)} 个文件落地失败")
+        else:
+            print(f"  ✓ 已落地 maps 目录 ({format_counts(mode_counts) or '无新文件'})")
     
     def _generate_version_report(self,
                                  output_dataroot: str,
                                  version_name: str,
-                                 filtered_data: Dict,
+                                 counts: Dict[str, int],
                                  categories: List[str]):
-        """生成版本报告"""
+        """
+        生成版本报告
+        
+        Args:
+            counts: 过滤结果中各键（如'samples'）对应的记录数
+        """
         report_path = os.path.join(output_dataroot, f'{version_name}_report.txt')
         
         with open(report_path, 'w', encoding='utf-8') as f:
@@ -369,16 +1218,16 @@ class NuScenesVersionCreator:
             f.write(f"包含的冗余度类别: {', '.join(categories)}\n\n")
             
             f.write("数据统计:\n")
-            f.write(f"  Samples: {len(filtered_data['samples'])}\n")
-            f.write(f"  Scenes: {len(filtered_data['scenes'])}\n")
-            f.write(f"  Sample Data: {len(filtered_data['sample_data'])}\n")
-            f.write(f"  Ego Poses: {len(filtered_data['ego_poses'])}\n")
-            f.write(f"  Sensors: {len(filtered_data['sensors'])}\n")
-            f.write(f"  Logs: {len(filtered_data['logs'])}\n")
+            f.write(f"  Samples: {counts['samples']}\n")
+            f.write(f"  Scenes: {counts['scenes']}\n")
+            f.write(f"  Sample Data: {counts['sample_data']}\n")
+            f.write(f"  Ego Poses: {counts['ego_poses']}\n")
+            f.write(f"  Sensors: {counts['sensors']}\n")
+            f.write(f"  Logs: {counts['logs']}\n")
             
-            if filtered_data['sample_annotations']:
-                f.write(f"  Annotations: {len(filtered_data['sample_annotations'])}\n")
-                f.write(f"  Instances: {len(filtered_data['instances'])}\n")
+            if counts['sample_annotations']:
+                f.write(f"  Annotations: {counts['sample_annotations']}\n")
+                f.write(f"  Instances: {counts['instances']}\n")
         
         print(f"\n  已生成报告: {report_path}")
 
@@ -435,15 +1284,129 @@ def main():
         help='同时创建高冗余度和低冗余度版本'
     )
     
+    parser.add_argument(
+        '--version-spec',
+        type=str,
+        action='append',
+        default=[],
+        metavar='NAME=CATEGORY[+CATEGORY...]',
+        help='创建自定义类别组合的版本，可重复指定，'
+             '如 v1.0-low-medium=low_redundancy+medium_redundancy'
+    )
+    
+    parser.add_argument(
+        '--link-workers',
+        type=int,
+        default=16,
+        help='并发创建数据文件链接的线程数（默认16）'
+    )
+    
+    parser.add_argument(
+        '--low-memory',
+        action='store_true',
+        help='使用流式流水线逐表处理，降低内存峰值（适合内存较小的节点）'
+    )
+    
     parser.add_argument(
         '--use-symlink',
+        dest='use_symlink',
         action='store_true',
         default=True,
         help='使用符号链接（节省空间，默认启用）'
     )
     
+    parser.add_argument(
+        '--no-symlink',
+        dest='use_symlink',
+        action='store_false',
+        help='不使用符号链接，改为硬链接（跨设备时自动回退为复制）'
+    )
+    
+    parser.add_argument(
+        '--link-mode',
+        type=str,
+        default=None,
+        choices=LINK_MODES,
+        help='数据文件落地方式，指定时覆盖--use-symlink/--no-symlink：'
+             'symlink(符号链接), hardlink(硬链接), reflink(写时复制), copy(完整复制)；'
+             '不可用时按回退链自动降级'
+    )
+    
+    sweep_group = parser.add_mutually_exclusive_group()
+    sweep_group.add_argument(
+        '--key-frames-only',
+        action='store_true',
+        help='只保留关键帧的sample_data（丢弃全部sweep及其ego_pose和数据文件）'
+    )
+    sweep_group.add_argument(
+        '--max-lidar-sweeps',
+        type=int,
+        default=None,
+        metavar='N',
+        help='每个关键帧只保留最近的N个激光雷达sweep，其他传感器的sweep全部丢弃'
+    )
+    
+    parser.add_argument(
+        '--channels',
+        type=str,
+        nargs='+',
+        default=None,
+        metavar='CHANNEL',
+        help='只保留指定传感器通道的sample_data、ego_pose、calibrated_sensor和数据文件，'
+             '如 --channels CAM_FRONT CAM_BACK LIDAR_TOP'
+    )
+    
+    parser.add_argument(
+        '--sample-stride',
+        type=int,
+        default=None,
+        metavar='K',
+        help='场景内每K个关键帧保留一个（适合高冗余度场景抽稀）'
+    )
+    
+    parser.add_argument(
+        '--min-ego-motion',
+        type=float,
+        default=None,
+        metavar='METERS',
+        help='场景内自车每行驶METERS米保留一个关键帧，丢弃静止时的帧'
+    )
+    
+    parser.add_argument(
+        '--keep-samples',
+        type=str,
+        default=None,
+        metavar='FILE',
+        help='关键帧保留列表（每行一个sample token，如划分结果中的*_sample_tokens.txt），'
+             '不在列表中的sample被丢弃'
+    )
+    
+    parser.add_argument(
+        '--update',
+        action='store_true',
+        help='增量更新已存在的版本：只重写变化的表、只增删受影响的数据文件'
+    )
+    
+    parser.add_argument(
+        '--verify',
+        action='store_true',
+        help='创建完成后校验每个版本的引用完整性和数据文件'
+    )
+    
+    parser.add_argument(
+        '--no-resume',
+        dest='resume',
+        action='store_false',
+        help='忽略版本目录中的创建清单，从头创建（默认跳过清单中已完成的工作）'
+    )
+    
     args = parser.parse_args()
     
+    keep_samples = None
+    if args.keep_samples:
+        with open(args.keep_samples, 'r', encoding='utf-8') as f:
+            keep_samples = set(line.strip() for line in f if line.strip())
+    
     print("=" * 80)
     print("NuScenes版本创建工具")
     print("=" * 80)
@@ -452,38 +1415,70 @@ def main():
     creator = NuScenesVersionCreator(
         original_dataroot=args.original_dataroot,
         original_version=args.original_version,
-        redundancy_split_path=args.redundancy_split
+        redundancy_split_path=args.redundancy_split,
+        link_workers=args.link_workers,
+        max_sweeps=0 if args.key_frames_only else args.max_lidar_sweeps,
+        channels=args.channels,
+        sample_stride=args.sample_stride,
+        min_ego_motion=args.min_ego_motion,
+        keep_samples=keep_samples
     )
     
     # 决定创建哪些版本
-    create_high = args.create_high or args.create_both
-    create_low = args.create_low or args.create_both
+    versions = {}
+    if args.create_high or args.create_both:
+        versions['v1.0-high-redundancy'] = ['high_redundancy']
+    if args.create_low or args.create_both:
+        versions['v1.0-low-redundancy'] = ['low_redundancy']
+    
+    for spec in args.version_spec:
+        name, _, categories = spec.partition('=')
+        categories = [c for c in categories.split('+') if c]
+        unknown = [c for c in categories if c not in REDUNDANCY_CATEGORIES]
+        if not name or not categories or unknown:
+            parser.error(f"无效的版本定义: {spec}，"
+                         f"类别必须是 {', '.join(REDUNDANCY_CATEGORIES)} 之一")
+        versions[name] = categories
     
-    if not create_high and not create_low:
+    if not versions:
         print("\n请指定要创建的版本：")
         print("  --create-high  创建高冗余度版本")
         print("  --create-low   创建低冗余度版本")
         print("  --create-both  创建两个版本")
+        print("  --version-spec NAME=CATEGORY[+CATEGORY...]  创建自定义类别组合的版本")
         return
     
-    # 创建高冗余度版本
-    if create_high:
-        creator.create_version(
+    # 原始数据只加载一次，所有版本在同一次运行中创建
+    if args.update:
+        if args.low_memory:
+            parser.error("--update 需要在内存中比较新旧掩码，不能与 --low-memory 同时使用")
+        creator.update_versions(
             output_dataroot=args.output_dataroot,
-            version_name='v1.0-high-redundancy',
-            categories=['high_redundancy'],
-            use_symlink=args.use_symlink
+            versions=versions,
+            use_symlink=args.use_symlink,
+            link_mode=args.link_mode
         )
-    
-    # 创建低冗余度版本
-    if create_low:
-        creator.create_version(
+    else:
+        creator.create_versions(
             output_dataroot=args.output_dataroot,
-            version_name='v1.0-low-redundancy',
-            categories=['low_redundancy'],
-            use_symlink=args.use_symlink
+            versions=versions,
+            use_symlink=args.use_symlink,
+            streaming=args.low_memory,
+            link_mode=args.link_mode,
+            resume=args.resume
         )
     
+    if args.verify:
+        all_ok = True
+        for version_name in versions:
+            verifier = VersionVerifier(args.output_dataroot, version_name,
+                                       workers=args.link_workers)
+            result = verifier.verify()
+            print_verification(result)
+            all_ok = all_ok and result['ok']
+        if not all_ok:
+            raise SystemExit("版本校验未通过")
+    
     print("\n" + "=" * 80)
     print("全部完成！")
     print("=" * 80)
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按epoch的冗余度课程表
+训练从低冗余度数据开始，逐步混入中、高冗余度样本：每个epoch的类别构成由混合函数给出，
+各epoch的样本下标序列在完整info文件上按需生成（确定性、可复现），也可导出为一个紧凑的.npz文件
+"""
+
+import argparse
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+import numpy as np
+from redundancy_utils import RedundancySplitLoader, REDUNDANCY_CATEGORIES
+from redundancy_sampler import align_to_dataset
+from info_pickle import load_infos
+from io_utils import atomic_open
+
+
+# 混合函数：epoch -> {类别: 比例}，比例为该类别样本在本epoch中使用的份数
+# （0.5表示随机取一半，1.0表示全部，2.0表示每个样本出现两次）
+MixFn = Callable[[int], Dict[str, float]]
+
+SCHEDULE_FORMAT = 1
+
+# 命令行中类别的简写
+CATEGORY_ALIASES = {
+    'high': 'high_redundancy',
+    'medium': 'medium_redundancy',
+    'low': 'low_redundancy',
+}
+
+
+def linear_mix(start: Dict[str, float], end: Dict[str, float],
+               ramp_epochs: int, warmup_epochs: int = 0) -> MixFn:
+    """
+    线性课程：前warmup_epochs个epoch保持start，之后ramp_epochs个epoch内线性过渡，
+    从第warmup_epochs + ramp_epochs个epoch起保持end
+
+    Args:
+        start: 初始混合比例
+        end: 最终混合比例
+        ramp_epochs: 过渡的epoch数
+        warmup_epochs: 过渡开始前保持start的epoch数
+    """
+    categories = set(start) | set(end)
+
+    def mix(epoch: int) -> Dict[str, float]:
+        if ramp_epochs > 0:
+            t = min(max((epoch - warmup_epochs) / ramp_epochs, 0.0), 1.0)
+        else:
+            t = 1.0 if epoch >= warmup_epochs else 0.0
+        return {c: (1 - t) * start.get(c, 0.0) + t * end.get(c, 0.0) for c in categories}
+    return mix
+
+
+def stepwise_mix(stages: List[Tuple[int, Dict[str, float]]]) -> MixFn:
+    """
+    分阶段课程：stages为 [(起始epoch, 混合比例), ...]，每个阶段持续到下一阶段开始
+
+    Args:
+        stages: 阶段列表（第一个阶段的起始epoch应为0）
+    """
+    stages = sorted(stages, key=lambda stage: stage[0])
+    if not stages or stages[0][0] > 0:
+        raise ValueError("分阶段课程必须包含从epoch 0开始的阶段")
+
+    def mix(epoch: int) -> Dict[str, float]:
+        current = stages[0][1]
+        for start_epoch, stage_mix in stages:
+            if epoch < start_epoch:
+                break
+            current = stage_mix
+        return current
+    return mix
+
+
+def shard(indices: np.ndarray, rank: int, num_replicas: int) -> np.ndarray:
+    """
+    按rank分片：先循环补齐为num_replicas的整数倍，保证各rank样本数相同
+
+    Args:
+        indices: 一个epoch所有rank合计的下标序列
+        rank: 当前进程的rank
+        num_replicas: 总进程数
+    """
+    if not 0 <= rank < num_replicas:
+        raise ValueError(f"rank必须在[0, {num_replicas})内: {rank}")
+    if len(indices) == 0:
+        return indices
+    total = -(-len(indices) // num_replicas) * num_replicas
+    return np.resize(indices, total)[rank::num_replicas]
+
+
+class CurriculumSchedule:
+    """
+    按epoch的冗余度课程表
+    各类别的数据集下标只计算一次并缓存；每个(epoch, 类别)使用独立的随机流，
+    某个类别比例的变化不会改变其他类别被选中的样本
+    """
+
+    def __init__(self, loader: RedundancySplitLoader, tokens: Iterable[str],
+                 mix_fn: MixFn, seed: int = 0):
+        """
+        初始化课程表
+
+        Args:
+            loader: 冗余度划分结果加载器
+            tokens: 数据集中每个样本的sample token（按数据集下标顺序）
+            mix_fn: 混合函数（epoch -> {类别: 比例}）
+            seed: 随机种子
+        """
+        self.category, _ = align_to_dataset(loader, tokens)
+        self.category_indices = [np.flatnonzero(self.category == code)
+                                 for code in range(len(REDUNDANCY_CATEGORIES))]
+        self.mix_fn = mix_fn
+        self.seed = seed
+        self._cached = None
+
+    @classmethod
+    def from_infos(cls, loader: RedundancySplitLoader, infos: Iterable[Dict],
+                   mix_fn: MixFn, seed: int = 0) -> 'CurriculumSchedule':
+        """由info列表创建课程表"""
+        return cls(loader, [info.get('token') or '' for info in infos], mix_fn, seed)
+
+    def mix(self, epoch: int) -> np.ndarray:
+        """某个epoch各类别的比例（按REDUNDANCY_CATEGORIES顺序）"""
+        mix = self.mix_fn(epoch)
+        unknown = set(mix) - set(REDUNDANCY_CATEGORIES)
+        if unknown:
+            raise ValueError(f"未知的冗余度类别: {', '.join(sorted(unknown))}")
+        ratios = np.array([mix.get(c, 0.0) for c in REDUNDANCY_CATEGORIES], dtype=np.float64)
+        if np.any(ratios < 0) or not np.all(np.isfinite(ratios)):
+            raise ValueError(f"epoch {epoch} 的混合比例必须为非负有限值: {mix}")
+        return ratios
+
+    def counts(self, epoch: int) -> np.ndarray:
+        """某个epoch各类别的样本数"""
+        sizes = np.array([len(pool) for pool in self.category_indices])
+        return np.round(self.mix(epoch) * sizes).astype(np.int64)
+
+    def _draw(self, epoch: int, code: int, count: int) -> np.ndarray:
+        """从某个类别中无放回地抽取count个下标（超过类别大小时整轮重复）"""
+        pool = self.category_indices[code]
+        if count == 0 or len(pool) == 0:
+            return np.empty(0, dtype=np.int64)
+        rng = np.random.default_rng([self.seed, epoch, code])
+        rounds = -(-count // len(pool))
+        picks = np.concatenate([rng.permutation(len(pool)) for _ in range(rounds)])
+        return pool[picks[:count]]
+
+    def epoch_indices(self, epoch: int) -> np.ndarray:
+        """
+        生成某个epoch的下标序列（所有rank合计，结果只缓存最近一个epoch）
+
+        Returns:
+            打乱后的数据集下标数组
+        """
+        if self._cached is not None and self._cached[0] == epoch:
+            return self._cached[1]
+        counts = self.counts(epoch)
+        parts = [self._draw(epoch, code, int(count)) for code, count in enumerate(counts)]
+        indices = np.concatenate(parts)
+        shuffle = np.random.default_rng([self.seed, epoch, len(REDUNDANCY_CATEGORIES)])
+        indices = indices[shuffle.permutation(len(indices))]
+        self._cached = (epoch, indices)
+        return indices
+
+    def shard_indices(self, epoch: int, rank: int = 0, num_replicas: int = 1) -> np.ndarray:
+        """当前rank在某个epoch的下标序列"""
+        return shard(self.epoch_indices(epoch), rank, num_replicas)
+
+    def iter_epochs(self, num_epochs: int, start_epoch: int = 0) -> Iterator[Tuple[int, np.ndarray]]:
+        """依次惰性地产生 (epoch, 下标序列)"""
+        for epoch in range(start_epoch, start_epoch + num_epochs):
+            yield epoch, self.epoch_indices(epoch)
+
+    def save(self, path: str, num_epochs: int):
+        """
+        导出前num_epochs个epoch的课程表为.npz
+        所有epoch的下标拼接为一个int32数组，epoch i的序列为 [offsets[i], offsets[i+1])
+        """
+        mixes = np.stack([self.mix(epoch) for epoch in range(num_epochs)]) \
+            if num_epochs else np.empty((0, len(REDUNDANCY_CATEGORIES)))
+        counts = np.stack([self.counts(epoch) for epoch in range(num_epochs)]) \
+            if num_epochs else np.empty((0, len(REDUNDANCY_CATEGORIES)), dtype=np.int64)
+        offsets = np.zeros(num_epochs + 1, dtype=np.int64)
+        np.cumsum(counts.sum(axis=1), out=offsets[1:])
+
+        indices = np.empty(int(offsets[-1]), dtype=np.int32)
+        for epoch, epoch_indices in self.iter_epochs(num_epochs):
+            indices[offsets[epoch]:offsets[epoch + 1]] = epoch_indices
+
+        with atomic_open(path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                format=np.int64(SCHEDULE_FORMAT),
+                seed=np.int64(self.seed),
+                categories=np.array(REDUNDANCY_CATEGORIES, dtype='S'),
+                dataset_size=np.int64(len(self.category)),
+                indices=indices,
+                offsets=offsets,
+                mixes=mixes,
+                counts=counts
+            )
+
+
+class ScheduleFile:
+    """
+    读取导出的课程表（.npz）
+    """
+
+    def __init__(self, path: str):
+        with np.load(path) as data:
+            if int(data['format']) != SCHEDULE_FORMAT:
+                raise ValueError(f"不支持的课程表格式: {path}")
+            self.seed = int(data['seed'])
+            self.dataset_size = int(data['dataset_size'])
+            self.indices = data['indices']
+            self.offsets = data['offsets']
+            self.mixes = data['mixes']
+            self.counts = data['counts']
+        self.path = path
+
+    @property
+    def num_epochs(self) -> int:
+        return len(self.offsets) - 1
+
+    def epoch_indices(self, epoch: int) -> np.ndarray:
+        """某个epoch的下标序列（所有rank合计）"""
+        if not 0 <= epoch < self.num_epochs:
+            raise IndexError(f"课程表只包含 {self.num_epochs} 个epoch: {epoch}")
+        return self.indices[self.offsets[epoch]:self.offsets[epoch + 1]]
+
+    def shard_indices(self, epoch: int, rank: int = 0, num_replicas: int = 1) -> np.ndarray:
+        """当前rank在某个epoch的下标序列"""
+        return shard(self.epoch_indices(epoch), rank, num_replicas)
+
+
+def parse_mix(items: List[str]) -> Dict[str, float]:
+    """解析命令行中的混合比例（如 low=1.0 medium=0.3）"""
+    mix = {}
+    for item in items:
+        name, sep, value = item.partition('=')
+        if not sep:
+            raise ValueError(f"混合比例格式应为 类别=比例: {item}")
+        mix[CATEGORY_ALIASES.get(name, name)] = float(value)
+    return mix
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description='生成按epoch的冗余度课程表（.npz）'
+    )
+    parser.add_argument(
+        '--redundancy-split',
+        type=str,
+        required=True,
+        help='冗余度划分结果文件路径'
+    )
+    parser.add_argument(
+        '--infos',
+        type=str,
+        required=True,
+        help='训练使用的原始info文件（标准pkl或分块容器），课程表中的下标指向其中的infos'
+    )
+    parser.add_argument(
+        '--output',
+        type=str,
+        required=True,
+        help='输出课程表路径（.npz）'
+    )
+    parser.add_argument(
+        '--epochs',
+        type=int,
+        required=True,
+        help='导出的epoch数'
+    )
+    parser.add_argument(
+        '--start',
+        type=str,
+        nargs='+',
+        default=['low=1.0'],
+        help='初始混合比例，如 low=1.0 medium=0.1（默认只用低冗余度）'
+    )
+    parser.add_argument(
+        '--end',
+        type=str,
+        nargs='+',
+        default=['low=1.0', 'medium=1.0', 'high=1.0'],
+        help='最终混合比例（默认全部数据）'
+    )
+    parser.add_argument(
+        '--warmup-epochs',
+        type=int,
+        default=0,
+        help='开始过渡前保持初始比例的epoch数'
+    )
+    parser.add_argument(
+        '--ramp-epochs',
+        type=int,
+        default=None,
+        help='从初始比例线性过渡到最终比例的epoch数（默认为导出epoch数的一半）'
+    )
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help='随机种子'
+    )
+    args = parser.parse_args()
+
+    start = time.time()
+    ramp_epochs = args.ramp_epochs if args.ramp_epochs is not None else args.epochs // 2
+    mix_fn = linear_mix(parse_mix(args.start), parse_mix(args.end),
+                        ramp_epochs, args.warmup_epochs)
+
+    loader = RedundancySplitLoader(args.redundancy_split)
+    print(f"加载info文件: {args.infos}")
+    infos = load_infos(args.infos)['infos']
+    schedule = CurriculumSchedule.from_infos(loader, infos, mix_fn, seed=args.seed)
+    del infos
+
+    print(f"\n{'epoch':>6} " + ' '.join(f"{c:>18}" for c in REDUNDANCY_CATEGORIES) + f" {'总计':>8}")
+    for epoch in range(args.epochs):
+        counts = schedule.counts(epoch)
+        print(f"{epoch:>6} " + ' '.join(f"{int(n):>18}" for n in counts) + f" {int(counts.sum()):>8}")
+
+    schedule.save(args.output, args.epochs)
+    print(f"\n已保存课程表到: {args.output} ({time.time() - start:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
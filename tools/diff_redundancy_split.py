@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+比较两个冗余度划分结果
+统计scene和sample在各冗余度类别之间的迁移情况（如高冗余度→低冗余度）
+"""
+
+import json
+import os
+import argparse
+from typing import Dict, Union
+import numpy as np
+from redundancy_utils import RedundancySplitLoader, REDUNDANCY_CATEGORIES
+
+
+# 迁移矩阵的行/列标签，最后一项表示token在该划分中不存在
+TRANSITION_LABELS = REDUNDANCY_CATEGORIES + ['absent']
+ABSENT = len(REDUNDANCY_CATEGORIES)
+
+
+def _as_loader(split: Union[str, RedundancySplitLoader]) -> RedundancySplitLoader:
+    """将路径或加载器统一为RedundancySplitLoader"""
+    if isinstance(split, RedundancySplitLoader):
+        return split
+    return RedundancySplitLoader(split)
+
+
+def _codes_on(union_tokens: np.ndarray,
+              tokens: np.ndarray,
+              codes: np.ndarray) -> np.ndarray:
+    """
+    将某个划分的类别编码对齐到合并后的token数组上
+
+    tokens与union_tokens均已排序且tokens是union_tokens的子集，
+    因此一次searchsorted即可定位
+    """
+    aligned = np.full(len(union_tokens), ABSENT, dtype=np.int8)
+    if len(tokens):
+        aligned[np.searchsorted(union_tokens, tokens)] = codes
+    return aligned
+
+
+def diff_token_level(old_tokens: np.ndarray, old_codes: np.ndarray,
+                     new_tokens: np.ndarray, new_codes: np.ndarray) -> Dict:
+    """
+    比较同一层级（scene或sample）的两组排序token及其类别编码
+
+    Args:
+        old_tokens: 旧划分的排序token数组
+        old_codes: 旧划分的类别编码
+        new_tokens: 新划分的排序token数组
+        new_codes: 新划分的类别编码
+
+    Returns:
+        包含迁移矩阵和迁移token列表的字典
+    """
+    width = max(old_tokens.dtype.itemsize, new_tokens.dtype.itemsize, 1)
+    old_tokens = old_tokens.astype(f'S{width}', copy=False)
+    new_tokens = new_tokens.astype(f'S{width}', copy=False)
+
+    union_tokens = np.union1d(old_tokens, new_tokens)
+    old_aligned = _codes_on(union_tokens, old_tokens, old_codes)
+    new_aligned = _codes_on(union_tokens, new_tokens, new_codes)
+
+    n_labels = len(TRANSITION_LABELS)
+    pair_codes = old_aligned.astype(np.int64) * n_labels + new_aligned
+    matrix = np.bincount(pair_codes, minlength=n_labels * n_labels)
+    matrix = matrix.reshape(n_labels, n_labels)
+
+    # 只保留发生变化的token
+    changed = old_aligned != new_aligned
+    changed_pairs = pair_codes[changed]
+    changed_tokens = union_tokens[changed]
+
+    moved = {}
+    for pair in np.unique(changed_pairs):
+        src, dst = divmod(int(pair), n_labels)
+        key = f"{TRANSITION_LABELS[src]}->{TRANSITION_LABELS[dst]}"
+        moved[key] = [t.decode() for t in changed_tokens[changed_pairs == pair]]
+
+    return {
+        'transition_matrix': matrix.tolist(),
+        'num_changed': int(changed.sum()),
+        'num_unchanged': int(len(union_tokens) - changed.sum()),
+        'moved': moved
+    }
+
+
+def diff_redundancy_splits(old_split: Union[str, RedundancySplitLoader],
+                           new_split: Union[str, RedundancySplitLoader]) -> Dict:
+    """
+    比较两个冗余度划分结果
+
+    Args:
+        old_split: 旧划分（文件路径或RedundancySplitLoader）
+        new_split: 新划分（文件路径或RedundancySplitLoader）
+
+    Returns:
+        包含scene/sample两个层级迁移情况以及各类别sample数变化的字典
+    """
+    old_loader = _as_loader(old_split)
+    new_loader = _as_loader(new_split)
+
+    result = {
+        'old_path': old_loader.split_path,
+        'new_path': new_loader.split_path,
+        'labels': TRANSITION_LABELS
+    }
+
+    for level in ['scene', 'sample']:
+        old_tokens, old_codes = old_loader.get_token_arrays(level)
+        new_tokens, new_codes = new_loader.get_token_arrays(level)
+        result[level] = diff_token_level(old_tokens, old_codes, new_tokens, new_codes)
+
+    _, old_codes = old_loader.get_token_arrays('sample')
+    _, new_codes = new_loader.get_token_arrays('sample')
+    n_categories = len(REDUNDANCY_CATEGORIES)
+    old_counts = np.bincount(old_codes, minlength=n_categories)
+    new_counts = np.bincount(new_codes, minlength=n_categories)
+    result['sample_count_delta'] = {
+        category: int(new_counts[i] - old_counts[i])
+        for i, category in enumerate(REDUNDANCY_CATEGORIES)
+    }
+
+    return result
+
+
+def print_diff(diff: Dict, max_tokens: int = 0):
+    """
+    打印比较结果
+
+    Args:
+        diff: diff_redundancy_splits的返回值
+        max_tokens: 每种迁移最多打印的token数（0表示不打印token）
+    """
+    print("\n" + "=" * 80)
+    print(f"旧划分: {diff['old_path']}")
+    print(f"新划分: {diff['new_path']}")
+    print("=" * 80)
+
+    labels = diff['labels']
+    short = {label: label.replace('_redundancy', '') for label in labels}
+
+    for level, name in [('scene', 'Scenes'), ('sample', 'Samples')]:
+        level_diff = diff[level]
+        print(f"\n{name}: {level_diff['num_changed']} 个发生变化, "
+              f"{level_diff['num_unchanged']} 个未变化")
+        print("  迁移矩阵 (行: 旧类别, 列: 新类别):")
+        print("  " + " " * 10 + "".join(f"{short[l]:>10}" for l in labels))
+        for label, row in zip(labels, level_diff['transition_matrix']):
+            print("  " + f"{short[label]:>10}" + "".join(f"{v:>10}" for v in row))
+
+        for key, tokens in level_diff['moved'].items():
+            print(f"  {key}: {len(tokens)}")
+            for token in tokens[:max_tokens]:
+                print(f"    {token}")
+
+    print("\n各类别sample数变化:")
+    for category, delta in diff['sample_count_delta'].items():
+        print(f"  {category}: {delta:+d}")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description='比较冗余度划分结果，统计scene/sample的类别迁移'
+    )
+    parser.add_argument(
+        'base',
+        type=str,
+        help='基准划分结果文件路径（.pkl或.json）'
+    )
+    parser.add_argument(
+        'candidates',
+        type=str,
+        nargs='+',
+        help='一个或多个待比较的划分结果文件路径'
+    )
+    parser.add_argument(
+        '--output-json',
+        type=str,
+        default=None,
+        help='将全部比较结果保存为JSON文件（可选）'
+    )
+    parser.add_argument(
+        '--show-tokens',
+        type=int,
+        default=0,
+        help='每种迁移最多打印的token数（默认不打印）'
+    )
+
+    args = parser.parse_args()
+
+    # 基准划分只加载一次，其排序token数组会在多次比较间复用
+    base_loader = RedundancySplitLoader(args.base)
+
+    diffs = []
+    for candidate in args.candidates:
+        diff = diff_redundancy_splits(base_loader, candidate)
+        print_diff(diff, max_tokens=args.show_tokens)
+        diffs.append(diff)
+
+    if args.output_json:
+        output_dir = os.path.dirname(args.output_json)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        with open(args.output_json, 'w') as f:
+            json.dump(diffs, f, indent=2)
+        print(f"\n已保存比较结果: {args.output_json}")
+
+
+if __name__ == '__main__':
+    main()
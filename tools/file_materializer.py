@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据文件落地策略
+支持符号链接、硬链接、reflink（写时复制）和完整复制，并按回退链自动降级：
+  - 策略本身不受支持（EOPNOTSUPP等）时，后续文件直接使用下一个策略
+  - 跨设备（EXDEV）只对同一对（源设备, 目标目录设备）停用该策略，其他挂载点不受影响
+  - 单个文件的限制（链接数上限、权限等）只对该文件回退，策略保持可用
+"""
+
+import errno
+import os
+import shutil
+from typing import Dict, Tuple
+
+try:
+    import fcntl
+except ImportError:  # 非Linux/Unix平台
+    fcntl = None
+
+
+# 可选的落地方式
+LINK_MODES = ['symlink', 'hardlink', 'reflink', 'copy']
+
+# 各方式的回退链
+FALLBACK_CHAINS = {
+    'symlink': ['symlink', 'hardlink', 'copy'],
+    'hardlink': ['hardlink', 'reflink', 'copy'],
+    'reflink': ['reflink', 'copy'],
+    'copy': ['copy'],
+}
+
+# Linux FICLONE ioctl（_IOW(0x94, 9, int)）
+FICLONE = 0x40049409
+
+# 用户态复制时的缓冲区大小（每个线程一个，保证内存有界）
+COPY_BUFFER_SIZE = 1 << 20
+
+# 这些错误说明策略本身不受支持，对所有后续文件停用
+_CAPABILITY_ERRNOS = {errno.EOPNOTSUPP, errno.ENOTTY, errno.ENOSYS}
+if hasattr(errno, 'ENOTSUP'):
+    _CAPABILITY_ERRNOS.add(errno.ENOTSUP)
+
+# 这些错误只与单个文件有关（硬链接数上限、protected_hardlinks或不属于自己的文件、
+# 个别文件系统拒绝clone等），只对该文件回退到下一个策略
+_PER_FILE_ERRNOS = {errno.EMLINK, errno.EPERM, errno.EINVAL}
+
+# 应回退到下一个策略的全部错误
+_UNSUPPORTED_ERRNOS = _CAPABILITY_ERRNOS | _PER_FILE_ERRNOS | {errno.EXDEV}
+
+
+def _symlink(src: str, dst: str, buffer_size: int):
+    os.symlink(src, dst)
+
+
+def _hardlink(src: str, dst: str, buffer_size: int):
+    os.link(src, dst)
+
+
+def _reflink(src: str, dst: str, buffer_size: int):
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "当前平台不支持reflink")
+    with open(src, 'rb') as fsrc, open(dst, 'xb') as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.unlink(dst)
+            raise
+    shutil.copymode(src, dst)
+
+
+def _copy(src: str, dst: str, buffer_size: int):
+    """完整复制：优先使用内核态的copy_file_range，否则使用有界缓冲区复制"""
+    with open(src, 'rb') as fsrc, open(dst, 'xb') as fdst:
+        try:
+            copied = False
+            if hasattr(os, 'copy_file_range'):
+                try:
+                    remaining = os.fstat(fsrc.fileno()).st_size
+                    while remaining > 0:
+                        n = os.copy_file_range(fsrc.fileno(), fdst.fileno(),
+                                               min(remaining, 1 << 30))
+                        if n == 0:
+                            break
+                        remaining -= n
+                    copied = remaining == 0
+                except OSError as e:
+                    if e.errno not in _UNSUPPORTED_ERRNOS:
+                        raise
+                    fsrc.seek(0)
+                    fdst.seek(0)
+                    fdst.truncate()
+            if not copied:
+                shutil.copyfileobj(fsrc, fdst, buffer_size)
+        except BaseException:
+            fdst.close()
+            os.unlink(dst)
+            raise
+    shutil.copymode(src, dst)
+
+
+_STRATEGIES = {
+    'symlink': _symlink,
+    'hardlink': _hardlink,
+    'reflink': _reflink,
+    'copy': _copy,
+}
+
+
+class FileMaterializer:
+    """
+    按指定方式（及其回退链）在目标位置落地源文件
+    实例可在多个线程间共享
+    """
+
+    def __init__(self, mode: str = 'symlink', fallback: bool = True,
+                 buffer_size: int = COPY_BUFFER_SIZE):
+        """
+        初始化
+
+        Args:
+            mode: 首选方式（symlink/hardlink/reflink/copy）
+            fallback: 首选方式不可用时是否按回退链降级
+            buffer_size: 用户态复制时的缓冲区大小
+        """
+        if mode not in FALLBACK_CHAINS:
+            raise ValueError(f"不支持的落地方式: {mode}，可选: {', '.join(LINK_MODES)}")
+        self.mode = mode
+        self.chain = FALLBACK_CHAINS[mode] if fallback else [mode]
+        self.buffer_size = buffer_size
+        self._disabled = set()
+        # 跨设备失败的(策略, 源设备, 目标目录设备)
+        self._cross_device = set()
+        self._dir_devices = {}
+
+    def _device_pair(self, src: str, dst: str) -> Tuple[int, int]:
+        """(源文件所在设备, 目标目录所在设备)，目标目录的结果按目录缓存"""
+        dst_dir = os.path.dirname(os.path.abspath(dst))
+        dst_dev = self._dir_devices.get(dst_dir)
+        if dst_dev is None:
+            dst_dev = self._dir_devices[dst_dir] = os.stat(dst_dir).st_dev
+        return os.stat(src).st_dev, dst_dev
+
+    def materialize(self, src: str, dst: str, replace: bool = False) -> str:
+        """
+        在dst处落地src
+
+        Args:
+            src: 源文件
+            dst: 目标路径
+            replace: dst已存在时（如旧版本留下的符号链接）先落地到同目录的临时文件，
+                     再用os.replace原子替换
+
+        Returns:
+            实际使用的方式
+
+        Raises:
+            OSError: 所有可用方式均失败，或遇到与策略无关的错误（如源文件不存在）
+        """
+        if replace:
+            tmp = os.path.join(os.path.dirname(dst), f'.{os.path.basename(dst)}.materialize.tmp')
+            if os.path.lexists(tmp):
+                os.unlink(tmp)
+            mode = self.materialize(src, tmp)
+            try:
+                os.replace(tmp, dst)
+            except OSError:
+                os.unlink(tmp)
+                raise
+            return mode
+
+        last_error = None
+        # 出现过跨设备失败时才需要比较设备号
+        pair = self._device_pair(src, dst) if self._cross_device else None
+        for strategy in self.chain:
+            if strategy in self._disabled:
+                continue
+            if pair is not None and (strategy, *pair) in self._cross_device:
+                continue
+            try:
+                _STRATEGIES[strategy](src, dst, self.buffer_size)
+                return strategy
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED_ERRNOS:
+                    raise
+                last_error = e
+                if strategy == self.chain[-1]:
+                    continue
+                if e.errno in _CAPABILITY_ERRNOS:
+                    # 该策略不受支持，后续文件不再尝试
+                    self._disabled.add(strategy)
+                elif e.errno == errno.EXDEV:
+                    # 只对这一对设备停用
+                    self._cross_device.add((strategy, *self._device_pair(src, dst)))
+        raise last_error or OSError(errno.EOPNOTSUPP, f"没有可用的落地方式: {self.chain}")
+
+    @property
+    def links_directories(self) -> bool:
+        """目录是否可以整体用符号链接代替（仅symlink方式）"""
+        return self.chain[0] == 'symlink' and 'symlink' not in self._disabled
+
+
+def merge_counts(total: Dict[str, int], counts: Dict[str, int]):
+    """累加各方式的文件计数"""
+    for mode, count in counts.items():
+        total[mode] = total.get(mode, 0) + count
+
+
+def format_counts(counts: Dict[str, int]) -> str:
+    """将各方式的文件计数格式化为可读字符串"""
+    return ', '.join(f"{mode}×{count}" for mode, count in counts.items() if count)
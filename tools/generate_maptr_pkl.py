@@ -5,12 +5,125 @@ MapTR pkl索引生成器
 根据冗余度划分结果生成MapTR训练所需的pkl索引文件
 """
 
-import pickle
+import json
 import os
 import argparse
-from typing import List, Dict, Optional, Set
+from typing import List, Dict, Optional, Set, Tuple
 import numpy as np
 from redundancy_utils import RedundancySplitLoader
+from token_utils import to_token_array, sort_tokens, lookup_sorted, isin_sorted
+from io_utils import atomic_open
+from maptr_subset import source_signature, write_index_subset, index_paths
+from info_pickle import InfoPickleWriter, ChunkedInfoReader, is_chunked_info, load_infos
+from maptr_cache import OutputCache, DEFAULT_CACHE_DIR, DEFAULT_MAX_ENTRIES, DEFAULT_MAX_BYTES
+
+
+# 可选的划分模式
+MAPTR_MODES = ['low_only', 'custom', 'balanced']
+
+# 各模式支持的参数及默认值
+MODE_DEFAULTS = {
+    'low_only': {'include_categories': ['low_redundancy']},
+    'custom': {'low_ratio': 1.0, 'medium_ratio': 0.0, 'high_ratio': 0.0, 'random_state': 42},
+    'balanced': {'random_state': 42},
+}
+
+TRAIN_INFO_FILENAME = 'nuscenes_infos_temporal_train.pkl'
+VAL_INFO_FILENAME = 'nuscenes_infos_temporal_val.pkl'
+REPORT_FILENAME = 'maptr_split_report.txt'
+
+
+def normalize_config(config: Dict) -> Tuple[str, Dict]:
+    """
+    校验单个配置，补全该模式的默认参数
+
+    Returns:
+        (模式, 参数字典)
+    """
+    mode = config.get('mode')
+    if mode not in MODE_DEFAULTS:
+        raise ValueError(f"不支持的划分模式: {mode}，可选: {', '.join(MAPTR_MODES)}")
+    if not config.get('output_dir'):
+        raise ValueError(f"{mode}配置缺少output_dir")
+    params = dict(MODE_DEFAULTS[mode])
+    unknown = set(config) - set(params) - {'mode', 'output_dir'}
+    if unknown:
+        raise ValueError(f"{mode}模式不支持参数: {', '.join(sorted(unknown))}")
+    params.update((key, config[key]) for key in params if key in config)
+    return mode, params
+
+
+class InfoIndex:
+    """
+    已加载的原始info文件及其token→行号索引
+    同一份infos可以按任意多个token集合取子集，不需要重复反序列化
+    """
+
+    def __init__(self, info_path: str):
+        """
+        加载原始info文件并建立索引
+
+        Args:
+            info_path: 原始的MapTR info pkl文件路径（标准格式或分块容器）
+        """
+        print(f"加载原始info文件: {info_path}")
+        original_data = load_infos(info_path)
+
+        self.path = info_path
+        self._signature = None
+        self.metadata = original_data.get('metadata', {})
+        self.infos = original_data['infos']
+        # MapTR的info格式中，sample token存储在'token'字段
+        tokens = to_token_array([info.get('token') or '' for info in self.infos])
+        self.sorted_tokens, self.order = sort_tokens(tokens, np.arange(len(self.infos)))
+
+        print(f"原始样本数: {len(self.infos)}")
+
+    def __len__(self) -> int:
+        return len(self.infos)
+
+    def select_rows(self, target_tokens) -> np.ndarray:
+        """
+        查找目标token在infos中的行号
+
+        Args:
+            target_tokens: 目标sample token序列（或定长token数组）
+
+        Returns:
+            按原始顺序排列的行号数组
+        """
+        pos = lookup_sorted(self.sorted_tokens, target_tokens)
+        return np.unique(self.order[pos[pos >= 0]])
+
+    def write_subset(self, rows: np.ndarray, output_path: str, chunked: bool = False) -> int:
+        """
+        按行号取出infos并流式、原子地写出（metadata保持不变）
+
+        Args:
+            rows: 行号数组
+            output_path: 输出路径
+            chunked: 写出分块容器（否则为标准pkl格式）
+
+        Returns:
+            写出的样本数
+        """
+        infos = self.infos
+        with InfoPickleWriter(output_path, self.metadata, chunked=chunked) as writer:
+            writer.write_many(infos[i] for i in rows.tolist())
+
+        print(f"已保存到: {output_path}")
+        return writer.count
+
+    def write_index(self, rows: np.ndarray, output_path: str) -> str:
+        """
+        只写出行号和原始文件签名（仅索引子集，见maptr_subset）
+
+        Returns:
+            索引文件路径
+        """
+        if self._signature is None:
+            self._signature = source_signature(self.path)
+        return write_index_subset(rows, output_path, self._signature, len(self.infos))
 
 
 class MapTRPklGenerator:
@@ -28,8 +141,16 @@ class MapTRPklGenerator:
             redundancy_split_path: 冗余度划分结果路径
             maptr_data_root: MapTR数据根目录（可选）
         """
-        self.loader = RedundancySplitLoader(redundancy_split_path)
+        self.redundancy_split_path = redundancy_split_path
         self.maptr_data_root = maptr_data_root
+        self._loader = None
+
+    @property
+    def loader(self) -> RedundancySplitLoader:
+        """冗余度划分结果（第一次使用时加载，全部命中缓存时不需要加载）"""
+        if self._loader is None:
+            self._loader = RedundancySplitLoader(self.redundancy_split_path)
+        return self._loader
         
     def filter_info_by_tokens(self, 
                               original_info_path: str,
@@ -43,118 +164,265 @@ class MapTRPklGenerator:
             target_tokens: 目标sample token集合
             output_path: 输出路径
         """
-        print(f"加载原始info文件: {original_info_path}")
-        with open(original_info_path, 'rb') as f:
-            original_data = pickle.load(f)
-        
-        # 提取metadata
-        metadata = original_data.get('metadata', {})
-        original_infos = original_data['infos']
-        
-        print(f"原始样本数: {len(original_infos)}")
-        
-        # 过滤样本
-        filtered_infos = []
-        for info in original_infos:
-            # MapTR的info格式中，sample token存储在'token'字段
-            if info.get('token') in target_tokens:
-                filtered_infos.append(info)
-        
-        print(f"过滤后样本数: {len(filtered_infos)}")
-        
-        # 构造输出数据
-        output_data = {
-            'infos': filtered_infos,
-            'metadata': metadata
-        }
-        
-        # 保存
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        with open(output_path, 'wb') as f:
-            pickle.dump(output_data, f)
-        
-        print(f"已保存到: {output_path}")
-        
-        return len(filtered_infos)
-    
-    def create_low_redundancy_split(self,
-                                   original_train_path: str,
-                                   original_val_path: str,
-                                   output_dir: str,
-                                   include_categories: List[str] = ['low_redundancy']):
+        index = InfoIndex(original_info_path)
+        count, _ = self._write_filtered(index, to_token_array(list(target_tokens)), output_path)
+        return count
+
+    def _write_filtered(self, index: InfoIndex, target_tokens: np.ndarray,
+                        output_path: str, index_only: bool = False,
+                        chunked: bool = False) -> Tuple[int, str]:
         """
-        创建低冗余度划分的MapTR数据
-        
+        从已加载的infos中取出目标样本并写出
+
+        Returns:
+            (样本数, 实际写出的文件路径)
+        """
+        rows = index.select_rows(target_tokens)
+        print(f"过滤后样本数: {len(rows)}")
+        if index_only:
+            return len(rows), index.write_index(rows, output_path)
+        return index.write_subset(rows, output_path, chunked), output_path
+
+    def _filter_chunked_source(self, info_path: str, plans: List[Dict], split: str,
+                               filename: str, index_only: bool, chunked: bool):
+        """
+        原始info文件为分块容器时，逐块流式过滤，内存中只保留当前块
+        每个配置各有一个输出写出器，所有配置共享同一遍读取
+        """
+        print(f"流式读取原始info文件: {info_path}")
+        with ChunkedInfoReader(info_path) as reader:
+            print(f"原始样本数: {len(reader)}")
+            targets = [np.unique(plan['tokens']) for plan in plans]
+            outputs = [os.path.join(plan['output_dir'], filename) for plan in plans]
+            selected = [[] for _ in plans]
+            writers = []
+            try:
+                if not index_only:
+                    for output_path in outputs:
+                        writers.append(InfoPickleWriter(output_path, reader.metadata,
+                                                        chunked=chunked))
+                offset = 0
+                for chunk in reader.iter_chunks():
+                    tokens = to_token_array([info.get('token') or '' for info in chunk])
+                    for i, target in enumerate(targets):
+                        keep = np.flatnonzero(isin_sorted(target, tokens))
+                        if index_only:
+                            selected[i].append(keep + offset)
+                        else:
+                            writers[i].write_many(chunk[j] for j in keep.tolist())
+                    offset += len(chunk)
+                for writer in writers:
+                    writer.close()
+            except BaseException as e:
+                for writer in writers:
+                    writer.abort(e)
+                raise
+
+            signature = source_signature(info_path) if index_only else None
+            for i, plan in enumerate(plans):
+                if len(plans) > 1:
+                    print(f"\n[{plan['mode']}] {plan['output_dir']}")
+                if index_only:
+                    rows = np.concatenate(selected[i]) if selected[i] else np.empty(0, np.int64)
+                    print(f"过滤后样本数: {len(rows)}")
+                    plan[f'{split}_count'] = len(rows)
+                    plan[f'{split}_path'] = write_index_subset(rows, outputs[i], signature,
+                                                               len(reader))
+                else:
+                    print(f"过滤后样本数: {writers[i].count}")
+                    print(f"已保存到: {outputs[i]}")
+                    plan[f'{split}_count'] = writers[i].count
+                    plan[f'{split}_path'] = outputs[i]
+
+    def create_batch(self,
+                     original_train_path: str,
+                     original_val_path: str,
+                     configs: List[Dict],
+                     index_only: bool = False,
+                     chunked: bool = False,
+                     cache: Optional[OutputCache] = None) -> List[Dict]:
+        """
+        一次加载原始info文件，生成任意多组配置的MapTR数据
+        先为所有配置选定目标样本，再依次加载训练集、验证集info文件（同一时刻只保留一份），
+        通过token→行号索引为每个配置取子集写出
+
         Args:
             original_train_path: 原始训练集info文件
             original_val_path: 原始验证集info文件
-            output_dir: 输出目录
-            include_categories: 包含的冗余度类别
+            configs: 配置列表，每项包含mode（low_only/custom/balanced）、output_dir
+                     以及该模式的参数（见MODE_DEFAULTS）
+            index_only: 只写出行号索引（.index.npy）和原始文件签名（.index.json），
+                        不复制info；读取时使用maptr_subset.IndexedInfos
+            chunked: 输出分块容器（info_pickle.ChunkedInfoReader可流式读取），否则为标准pkl格式
+            cache: 输出缓存；划分文件、原始info文件内容和模式参数都相同的配置直接从缓存落地，
+                   其余配置生成后存入缓存
+        
+        原始info文件本身为分块容器时，按块流式过滤，不需要一次加载全部infos
+
+        Returns:
+            与configs对齐的结果列表，每项包含train_path/val_path/train_count/val_count
         """
+        if index_only and chunked:
+            raise ValueError("index_only与chunked不能同时使用")
+        normalized = [normalize_config(config) for config in configs]
+        output_dirs = [os.path.abspath(config['output_dir']) for config in configs]
+        if len(set(output_dirs)) != len(output_dirs):
+            raise ValueError("批量配置中存在重复的output_dir")
+
+        results = [None] * len(configs)
+        keys = [None] * len(configs)
+        if cache is not None:
+            digests = {
+                'redundancy_split': cache.file_digest(self.redundancy_split_path),
+                'original_train': cache.file_digest(original_train_path),
+                'original_val': cache.file_digest(original_val_path),
+            }
+            for i, (mode, params) in enumerate(normalized):
+                inputs = dict(digests, mode=mode, params=params,
+                              index_only=index_only, chunked=chunked)
+                if index_only:
+                    # 索引文件记录原始文件的路径，路径不同的输出不能共用
+                    inputs['sources'] = [os.path.abspath(original_train_path),
+                                         os.path.abspath(original_val_path)]
+                keys[i] = cache.make_key(inputs)
+                cached = cache.restore(keys[i], configs[i]['output_dir'])
+                if cached is not None:
+                    results[i] = self._result_from_cache(cached, configs[i]['output_dir'])
+                    print(f"\n[{mode}] 命中缓存 {keys[i][:12]}，已落地到: {configs[i]['output_dir']}")
+
+        pending = [i for i, result in enumerate(results) if result is None]
+        if pending:
+            generated = self._generate(original_train_path, original_val_path,
+                                       [configs[i] for i in pending], index_only, chunked)
+            for i, result in zip(pending, generated):
+                results[i] = result
+                if cache is not None:
+                    cache.store(keys[i], result['output_dir'],
+                                self._output_files(result, index_only),
+                                self._result_to_cache(result), protect=keys)
+        else:
+            print("\n全部配置命中缓存，跳过生成")
+        return results
+
+    @staticmethod
+    def _output_files(result: Dict, index_only: bool) -> List[str]:
+        """一组配置在输出目录中生成的文件名"""
+        files = []
+        for path in (result['train_path'], result['val_path']):
+            files.extend(index_paths(path) if index_only else [path])
+        files.append(os.path.join(result['output_dir'], REPORT_FILENAME))
+        return [os.path.relpath(path, result['output_dir']) for path in files]
+
+    @staticmethod
+    def _result_to_cache(result: Dict) -> Dict:
+        """缓存中保存与输出目录无关的结果"""
+        return {
+            'mode': result['mode'],
+            'train_file': os.path.relpath(result['train_path'], result['output_dir']),
+            'val_file': os.path.relpath(result['val_path'], result['output_dir']),
+            'train_count': result['train_count'],
+            'val_count': result['val_count']
+        }
+
+    @staticmethod
+    def _result_from_cache(cached: Dict, output_dir: str) -> Dict:
+        return {
+            'mode': cached['mode'],
+            'output_dir': output_dir,
+            'train_path': os.path.join(output_dir, cached['train_file']),
+            'val_path': os.path.join(output_dir, cached['val_file']),
+            'train_count': cached['train_count'],
+            'val_count': cached['val_count']
+        }
+
+    def _generate(self, original_train_path: str, original_val_path: str,
+                  configs: List[Dict], index_only: bool, chunked: bool) -> List[Dict]:
+        """选定目标样本并写出各配置的子集（create_batch的实际生成部分）"""
+        plans = [self._plan(config) for config in configs]
+
+        splits = [
+            ('train', '训练集', original_train_path, TRAIN_INFO_FILENAME),
+            ('val', '验证集', original_val_path, VAL_INFO_FILENAME),
+        ]
+        for split, label, info_path, filename in splits:
+            print(f"\n处理{label}...")
+            if is_chunked_info(info_path):
+                self._filter_chunked_source(info_path, plans, split, filename,
+                                            index_only, chunked)
+                continue
+            index = InfoIndex(info_path)
+            for plan in plans:
+                output_path = os.path.join(plan['output_dir'], filename)
+                if len(plans) > 1:
+                    print(f"\n[{plan['mode']}] {plan['output_dir']}")
+                plan[f'{split}_count'], plan[f'{split}_path'] = self._write_filtered(
+                    index, plan['tokens'], output_path, index_only, chunked
+                )
+            del index
+
+        results = []
+        for plan in plans:
+            self._write_report(
+                os.path.join(plan['output_dir'], REPORT_FILENAME), plan['title'],
+                plan['report_lines'], plan['train_count'], plan['val_count']
+            )
+            results.append({
+                'mode': plan['mode'],
+                'output_dir': plan['output_dir'],
+                'train_path': plan['train_path'],
+                'val_path': plan['val_path'],
+                'train_count': plan['train_count'],
+                'val_count': plan['val_count']
+            })
+
+        print("\n" + "=" * 80)
+        print("完成！")
+        print("=" * 80)
+
+        return results
+
+    def _plan(self, config: Dict) -> Dict:
+        """选定单个配置的目标样本"""
+        mode, params = normalize_config(config)
+        if mode == 'low_only':
+            tokens, title, lines = self._select_categories(params['include_categories'])
+        elif mode == 'custom':
+            tokens, title, lines = self._select_ratios(
+                params['low_ratio'], params['medium_ratio'], params['high_ratio'],
+                params['random_state']
+            )
+        else:
+            tokens, title, lines = self._select_balanced(params['random_state'])
+
+        return {
+            'mode': mode,
+            'output_dir': config['output_dir'],
+            'tokens': to_token_array(list(tokens)),
+            'title': title,
+            'report_lines': lines
+        }
+
+    def _select_categories(self, include_categories: List[str]) -> Tuple[Set[str], str, List[str]]:
+        """选取指定类别的全部样本"""
         print("\n" + "=" * 80)
         print("创建低冗余度MapTR数据划分")
         print("=" * 80)
         
         # 获取目标tokens
         target_tokens = set()
+        lines = ["包含的冗余度类别:"]
         for category in include_categories:
             tokens = self.loader.get_samples_by_category(category)
             target_tokens.update(tokens)
             print(f"\n{category}: {len(tokens)} samples")
+            lines.append(f"  - {category}: {len(tokens)} samples")
         
         print(f"\n总计目标样本数: {len(target_tokens)}")
-        
-        # 过滤训练集
-        print("\n处理训练集...")
-        train_output_path = os.path.join(output_dir, 'nuscenes_infos_temporal_train.pkl')
-        train_count = self.filter_info_by_tokens(
-            original_train_path, target_tokens, train_output_path
-        )
-        
-        # 过滤验证集
-        print("\n处理验证集...")
-        val_output_path = os.path.join(output_dir, 'nuscenes_infos_temporal_val.pkl')
-        val_count = self.filter_info_by_tokens(
-            original_val_path, target_tokens, val_output_path
-        )
-        
-        # 生成统计报告
-        report_path = os.path.join(output_dir, 'maptr_split_report.txt')
-        self._generate_report(
-            report_path, include_categories, train_count, val_count
-        )
-        
-        print("\n" + "=" * 80)
-        print("完成！")
-        print("=" * 80)
-        
-        return {
-            'train_path': train_output_path,
-            'val_path': val_output_path,
-            'train_count': train_count,
-            'val_count': val_count
-        }
-    
-    def create_custom_split(self,
-                           original_train_path: str,
-                           original_val_path: str,
-                           output_dir: str,
-                           low_ratio: float = 1.0,
-                           medium_ratio: float = 0.0,
-                           high_ratio: float = 0.0,
-                           random_state: int = 42):
-        """
-        创建自定义比例的数据划分
-        
-        Args:
-            original_train_path: 原始训练集info文件
-            original_val_path: 原始验证集info文件
-            output_dir: 输出目录
-            low_ratio: 低冗余度样本采样比例
-            medium_ratio: 中冗余度样本采样比例
-            high_ratio: 高冗余度样本采样比例
-            random_state: 随机种子
-        """
+        return target_tokens, "MapTR数据划分报告", lines
+
+    def _select_ratios(self, low_ratio: float, medium_ratio: float, high_ratio: float,
+                       random_state: int) -> Tuple[Set[str], str, List[str]]:
+        """按比例从各类别随机采样"""
         print("\n" + "=" * 80)
         print("创建自定义比例MapTR数据划分")
         print("=" * 80)
@@ -192,59 +460,15 @@ class MapTRPklGenerator:
             print(f"  选择: {len(selected_tokens)}")
         
         print(f"\n总计目标样本数: {len(target_tokens)}")
-        
-        # 过滤训练集和验证集
-        print("\n处理训练集...")
-        train_output_path = os.path.join(output_dir, 'nuscenes_infos_temporal_train.pkl')
-        train_count = self.filter_info_by_tokens(
-            original_train_path, target_tokens, train_output_path
-        )
-        
-        print("\n处理验证集...")
-        val_output_path = os.path.join(output_dir, 'nuscenes_infos_temporal_val.pkl')
-        val_count = self.filter_info_by_tokens(
-            original_val_path, target_tokens, val_output_path
-        )
-        
-        # 生成报告
-        report_path = os.path.join(output_dir, 'maptr_split_report.txt')
-        with open(report_path, 'w', encoding='utf-8') as f:
-            f.write("=" * 80 + "\n")
-            f.write("MapTR自定义划分报告\n")
-            f.write("=" * 80 + "\n\n")
-            f.write(f"低冗余度比例: {low_ratio:.1%}\n")
-            f.write(f"中冗余度比例: {medium_ratio:.1%}\n")
-            f.write(f"高冗余度比例: {high_ratio:.1%}\n\n")
-            f.write(f"训练集样本数: {train_count}\n")
-            f.write(f"验证集样本数: {val_count}\n")
-            f.write(f"总计: {train_count + val_count}\n")
-        
-        print(f"\n已生成报告: {report_path}")
-        
-        print("\n" + "=" * 80)
-        print("完成！")
-        print("=" * 80)
-        
-        return {
-            'train_path': train_output_path,
-            'val_path': val_output_path,
-            'train_count': train_count,
-            'val_count': val_count
-        }
-    
-    def create_balanced_redundancy_split(self,
-                                        original_train_path: str,
-                                        original_val_path: str,
-                                        output_dir: str):
-        """
-        创建各冗余度类别平衡的划分
-        从每个类别取相同数量的样本
-        
-        Args:
-            original_train_path: 原始训练集info文件
-            original_val_path: 原始验证集info文件
-            output_dir: 输出目录
-        """
+        lines = [
+            f"低冗余度比例: {low_ratio:.1%}",
+            f"中冗余度比例: {medium_ratio:.1%}",
+            f"高冗余度比例: {high_ratio:.1%}"
+        ]
+        return target_tokens, "MapTR自定义划分报告", lines
+
+    def _select_balanced(self, random_state: int) -> Tuple[Set[str], str, List[str]]:
+        """从每个类别采样相同数量的样本"""
         print("\n" + "=" * 80)
         print("创建平衡冗余度MapTR数据划分")
         print("=" * 80)
@@ -266,62 +490,83 @@ class MapTRPklGenerator:
         target_tokens = set()
         for category in categories:
             tokens = self.loader.sample_from_category(
-                category, n=min_count, random_state=42
+                category, n=min_count, random_state=random_state
             )
             target_tokens.update(tokens)
             print(f"从{category}采样: {len(tokens)}")
         
         print(f"\n总计样本数: {len(target_tokens)}")
+        return target_tokens, "MapTR平衡冗余度划分报告", [f"每个类别采样数: {min_count}"]
+    
+    def create_low_redundancy_split(self,
+                                   original_train_path: str,
+                                   original_val_path: str,
+                                   output_dir: str,
+                                   include_categories: List[str] = ['low_redundancy']):
+        """
+        创建低冗余度划分的MapTR数据
         
-        # 过滤数据
-        print("\n处理训练集...")
-        train_output_path = os.path.join(output_dir, 'nuscenes_infos_temporal_train.pkl')
-        train_count = self.filter_info_by_tokens(
-            original_train_path, target_tokens, train_output_path
-        )
-        
-        print("\n处理验证集...")
-        val_output_path = os.path.join(output_dir, 'nuscenes_infos_temporal_val.pkl')
-        val_count = self.filter_info_by_tokens(
-            original_val_path, target_tokens, val_output_path
-        )
-        
-        # 生成报告
-        report_path = os.path.join(output_dir, 'maptr_split_report.txt')
-        with open(report_path, 'w', encoding='utf-8') as f:
-            f.write("=" * 80 + "\n")
-            f.write("MapTR平衡冗余度划分报告\n")
-            f.write("=" * 80 + "\n\n")
-            f.write(f"每个类别采样数: {min_count}\n\n")
-            f.write(f"训练集样本数: {train_count}\n")
-            f.write(f"验证集样本数: {val_count}\n")
-            f.write(f"总计: {train_count + val_count}\n")
-        
-        print(f"\n已生成报告: {report_path}")
+        Args:
+            original_train_path: 原始训练集info文件
+            original_val_path: 原始验证集info文件
+            output_dir: 输出目录
+            include_categories: 包含的冗余度类别
+        """
+        config = {'mode': 'low_only', 'output_dir': output_dir,
+                  'include_categories': include_categories}
+        return self.create_batch(original_train_path, original_val_path, [config])[0]
+    
+    def create_custom_split(self,
+                           original_train_path: str,
+                           original_val_path: str,
+                           output_dir: str,
+                           low_ratio: float = 1.0,
+                           medium_ratio: float = 0.0,
+                           high_ratio: float = 0.0,
+                           random_state: int = 42):
+        """
+        创建自定义比例的数据划分
         
-        print("\n" + "=" * 80)
-        print("完成！")
-        print("=" * 80)
+        Args:
+            original_train_path: 原始训练集info文件
+            original_val_path: 原始验证集info文件
+            output_dir: 输出目录
+            low_ratio: 低冗余度样本采样比例
+            medium_ratio: 中冗余度样本采样比例
+            high_ratio: 高冗余度样本采样比例
+            random_state: 随机种子
+        """
+        config = {'mode': 'custom', 'output_dir': output_dir, 'low_ratio': low_ratio,
+                  'medium_ratio': medium_ratio, 'high_ratio': high_ratio,
+                  'random_state': random_state}
+        return self.create_batch(original_train_path, original_val_path, [config])[0]
+    
+    def create_balanced_redundancy_split(self,
+                                        original_train_path: str,
+                                        original_val_path: str,
+                                        output_dir: str):
+        """
+        创建各冗余度类别平衡的划分
+        从每个类别取相同数量的样本
         
-        return {
-            'train_path': train_output_path,
-            'val_path': val_output_path,
-            'train_count': train_count,
-            'val_count': val_count
-        }
+        Args:
+            original_train_path: 原始训练集info文件
+            original_val_path: 原始验证集info文件
+            output_dir: 输出目录
+        """
+        config = {'mode': 'balanced', 'output_dir': output_dir}
+        return self.create_batch(original_train_path, original_val_path, [config])[0]
     
-    def _generate_report(self, report_path: str, categories: List[str],
-                        train_count: int, val_count: int):
+    def _write_report(self, report_path: str, title: str, lines: List[str],
+                      train_count: int, val_count: int):
         """生成报告"""
-        with open(report_path, 'w', encoding='utf-8') as f:
+        with atomic_open(report_path, 'w', encoding='utf-8') as f:
             f.write("=" * 80 + "\n")
-            f.write("MapTR数据划分报告\n")
+            f.write(f"{title}\n")
             f.write("=" * 80 + "\n\n")
             
-            f.write("包含的冗余度类别:\n")
-            for category in categories:
-                tokens = self.loader.get_samples_by_category(category)
-                f.write(f"  - {category}: {len(tokens)} samples\n")
+            for line in lines:
+                f.write(f"{line}\n")
             
             f.write(f"\n训练集样本数: {train_count}\n")
             f.write(f"验证集样本数: {val_count}\n")
@@ -330,6 +575,22 @@ class MapTRPklGenerator:
         print(f"\n已生成报告: {report_path}")
 
 
+def load_batch_config(path: str) -> List[Dict]:
+    """
+    读取批量配置文件（JSON数组，或包含configs字段的对象）
+
+    Args:
+        path: 配置文件路径
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get('configs')
+    if not isinstance(data, list) or not data:
+        raise ValueError(f"批量配置应为非空的配置数组: {path}")
+    return data
+
+
 def main():
     """主函数"""
     parser = argparse.ArgumentParser(
@@ -393,8 +654,58 @@ def main():
         help='自定义模式：高冗余度比例'
     )
     
+    parser.add_argument(
+        '--index-only',
+        action='store_true',
+        help='只输出子集在原始info文件中的行号（.index.npy）及原始文件校验信息，不复制info'
+    )
+    
+    parser.add_argument(
+        '--chunked-output',
+        action='store_true',
+        help='输出分块容器（可由info_pickle.ChunkedInfoReader流式读取），而不是标准pkl'
+    )
+    
+    parser.add_argument(
+        '--batch-config',
+        type=str,
+        default=None,
+        help='批量配置文件（JSON数组，每项包含mode、output_dir及该模式的参数）；'
+             '指定后原始info文件只加载一次，忽略--mode/--output-dir及比例参数'
+    )
+    
+    parser.add_argument(
+        '--cache',
+        action='store_true',
+        help='启用输出缓存：划分文件、原始info文件内容和模式参数都未变化时直接复用上次的输出'
+    )
+    
+    parser.add_argument(
+        '--cache-dir',
+        type=str,
+        default=DEFAULT_CACHE_DIR,
+        help=f'缓存目录（默认{DEFAULT_CACHE_DIR}）'
+    )
+    
+    parser.add_argument(
+        '--cache-max-entries',
+        type=int,
+        default=DEFAULT_MAX_ENTRIES,
+        help=f'缓存最多保留的条目数，超出时按最近使用时间淘汰（默认{DEFAULT_MAX_ENTRIES}）'
+    )
+    
+    parser.add_argument(
+        '--cache-max-size-gb',
+        type=float,
+        default=DEFAULT_MAX_BYTES / 2**30,
+        help=f'缓存总大小上限（GB，默认{DEFAULT_MAX_BYTES / 2**30:.0f}）'
+    )
+    
     args = parser.parse_args()
     
+    if args.index_only and args.chunked_output:
+        parser.error("--index-only 与 --chunked-output 不能同时使用")
+    
     print("=" * 80)
     print("MapTR pkl索引生成器")
     print("=" * 80)
@@ -417,36 +728,45 @@ def main():
     
     # 创建生成器
     generator = MapTRPklGenerator(args.redundancy_split)
+    cache = None
+    if args.cache:
+        cache = OutputCache(args.cache_dir, max_entries=args.cache_max_entries,
+                            max_bytes=int(args.cache_max_size_gb * 2**30))
+    
+    if args.batch_config:
+        configs = load_batch_config(args.batch_config)
+        results = generator.create_batch(args.original_train, args.original_val, configs,
+                                         index_only=args.index_only,
+                                         chunked=args.chunked_output,
+                                         cache=cache)
+        print(f"\n生成的文件（{len(results)} 组配置）:")
+        for result in results:
+            print(f"  [{result['mode']}] {result['output_dir']}: "
+                  f"训练集 {result['train_count']} samples, 验证集 {result['val_count']} samples")
+        return
     
     # 根据模式执行
+    config = {'mode': args.mode, 'output_dir': args.output_dir}
     if args.mode == 'low_only':
-        result = generator.create_low_redundancy_split(
-            args.original_train,
-            args.original_val,
-            args.output_dir,
-            include_categories=['low_redundancy']
-        )
+        config['include_categories'] = ['low_redundancy']
     elif args.mode == 'custom':
-        result = generator.create_custom_split(
-            args.original_train,
-            args.original_val,
-            args.output_dir,
-            low_ratio=args.low_ratio,
-            medium_ratio=args.medium_ratio,
-            high_ratio=args.high_ratio
-        )
-    elif args.mode == 'balanced':
-        result = generator.create_balanced_redundancy_split(
-            args.original_train,
-            args.original_val,
-            args.output_dir
-        )
+        config.update(low_ratio=args.low_ratio,
+                      medium_ratio=args.medium_ratio,
+                      high_ratio=args.high_ratio)
+    result = generator.create_batch(args.original_train, args.original_val, [config],
+                                    index_only=args.index_only,
+                                    chunked=args.chunked_output,
+                                    cache=cache)[0]
     
     print(f"\n生成的文件:")
     print(f"  训练集: {result['train_path']} ({result['train_count']} samples)")
     print(f"  验证集: {result['val_path']} ({result['val_count']} samples)")
     print(f"\n使用方法:")
-    print(f"  在MapTR配置文件中，将数据路径指向: {args.output_dir}")
+    if args.index_only:
+        print(f"  在MapTR数据集的load_annotations中用 maptr_subset.IndexedInfos(ann_file).to_data() "
+              f"替代mmcv.load(ann_file)")
+    else:
+        print(f"  在MapTR配置文件中，将数据路径指向: {args.output_dir}")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+难例挖掘
+读取训练过程中记录的逐样本loss（或指标）日志，按sample token与冗余度划分结果向量化连接，
+计算综合优先级（loss越高、冗余度越低越优先），并输出下一轮训练用的子集或采样权重：
+  - 日志支持CSV（含表头）、结构化.npy和.npz，同一token的多条记录按mean/max/last聚合
+  - 连接在排序定长token数组上完成，数百万行日志可在数秒内处理
+"""
+
+import argparse
+import os
+import time
+from typing import Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from redundancy_utils import RedundancySplitLoader, REDUNDANCY_CATEGORIES
+from token_utils import to_token_array, lookup_sorted, isin_sorted
+from io_utils import atomic_open
+from info_pickle import ChunkedInfoReader, is_chunked_info, load_infos
+
+
+# 同一token多条记录的聚合方式
+REDUCE_MODES = ['mean', 'max', 'last']
+
+# 读取CSV时token列的最大宽度（NuScenes token为32个字符）
+MAX_TOKEN_WIDTH = 64
+
+
+def read_loss_log(path: str, token_column: str = 'token',
+                  value_column: str = 'loss') -> Tuple[np.ndarray, np.ndarray]:
+    """
+    读取逐样本日志
+
+    Args:
+        path: .csv（第一行为表头）/ .npy（结构化数组）/ .npz（按列名保存的数组）
+        token_column: token列名
+        value_column: 数值列名
+
+    Returns:
+        (定长字节token数组, float64数值数组)，按文件中的顺序
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        with open(path, 'r', encoding='utf-8') as f:
+            header = [name.strip() for name in f.readline().strip().split(',')]
+        for column in (token_column, value_column):
+            if column not in header:
+                raise ValueError(f"{path} 中没有列 {column}，表头: {', '.join(header)}")
+        data = np.loadtxt(
+            path, delimiter=',', skiprows=1, ndmin=1,
+            usecols=(header.index(token_column), header.index(value_column)),
+            dtype=[('token', f'S{MAX_TOKEN_WIDTH}'), ('value', 'f8')]
+        )
+        return data['token'], data['value']
+    if ext == '.npy':
+        data = np.load(path)
+        if data.dtype.names is None:
+            raise ValueError(f"{path} 不是结构化数组，无法按列名读取")
+        return to_token_array(data[token_column]), np.asarray(data[value_column], dtype=np.float64)
+    if ext == '.npz':
+        with np.load(path) as data:
+            return (to_token_array(data[token_column]),
+                    np.asarray(data[value_column], dtype=np.float64))
+    raise ValueError(f"不支持的日志格式: {path}（支持 .csv/.npy/.npz）")
+
+
+def reduce_by_token(tokens: np.ndarray, values: np.ndarray,
+                    reduce: str = 'mean') -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    按token聚合日志记录（忽略NaN）
+
+    Args:
+        tokens: token数组
+        values: 数值数组
+        reduce: mean（均值）/ max（最大值）/ last（日志中最后一条）
+
+    Returns:
+        (排序后的唯一token数组, 聚合值数组, 记录数数组)
+    """
+    if reduce not in REDUCE_MODES:
+        raise ValueError(f"不支持的聚合方式: {reduce}，可选: {', '.join(REDUCE_MODES)}")
+    valid = ~np.isnan(values)
+    tokens, values = to_token_array(tokens)[valid], values[valid]
+    if len(tokens) == 0:
+        return np.empty(0, dtype='S32'), np.empty(0), np.empty(0, dtype=np.int64)
+
+    # 先收窄到实际宽度（排序耗时与宽度成正比），再用稳定排序保持同一token内记录的原始顺序，last即为每组最后一条
+    tokens = tokens.astype(f'S{max(int(np.char.str_len(tokens).max()), 1)}')
+    order = np.argsort(tokens, kind='stable')
+    tokens, values = tokens[order], values[order]
+    starts = np.flatnonzero(np.r_[True, tokens[1:] != tokens[:-1]])
+    counts = np.diff(np.r_[starts, len(tokens)])
+    if reduce == 'mean':
+        reduced = np.add.reduceat(values, starts) / counts
+    elif reduce == 'max':
+        reduced = np.maximum.reduceat(values, starts)
+    else:
+        reduced = values[starts + counts - 1]
+
+    return tokens[starts], reduced, counts
+
+
+def percentile_rank(values: np.ndarray) -> np.ndarray:
+    """
+    每个值在所有非NaN值中的百分位（0~1，相同值取平均名次），NaN保持为NaN
+    """
+    out = np.full(len(values), np.nan)
+    valid = ~np.isnan(values)
+    n = int(valid.sum())
+    if n == 0:
+        return out
+    if n == 1:
+        out[valid] = 0.5
+        return out
+    ordered = np.sort(values[valid])
+    left = np.searchsorted(ordered, values[valid], side='left')
+    right = np.searchsorted(ordered, values[valid], side='right')
+    out[valid] = (left + right - 1) / 2 / (n - 1)
+    return out
+
+
+def read_info_tokens(path: str) -> List[str]:
+    """
+    按infos中的顺序读取sample token
+    支持标准pkl和分块容器（分块容器逐块流式读取，不在内存中保留完整的infos）
+    """
+    if is_chunked_info(path):
+        with ChunkedInfoReader(path) as reader:
+            return [info.get('token') or '' for info in reader]
+    return [info.get('token') or '' for info in load_infos(path)['infos']]
+
+
+class LossLog:
+    """
+    按token聚合后的逐样本日志
+    """
+
+    def __init__(self, tokens: Iterable, values: np.ndarray, reduce: str = 'mean',
+                 higher_is_harder: bool = True):
+        """
+        初始化
+
+        Args:
+            tokens: 每条记录的sample token
+            values: 每条记录的数值（loss或指标）
+            reduce: 同一token多条记录的聚合方式
+            higher_is_harder: 数值越大表示越难（loss为True；IoU、mAP等指标为False）
+        """
+        self.tokens, self.values, self.counts = reduce_by_token(
+            to_token_array(tokens), np.asarray(values, dtype=np.float64), reduce
+        )
+        self.reduce = reduce
+        self.higher_is_harder = higher_is_harder
+        self.num_records = int(self.counts.sum())
+
+    @classmethod
+    def from_files(cls, paths: Sequence[str], token_column: str = 'token',
+                   value_column: str = 'loss', **kwargs) -> 'LossLog':
+        """读取一个或多个日志文件（按给定顺序拼接，last聚合取最后一个文件中的记录）"""
+        parts = [read_loss_log(path, token_column, value_column) for path in paths]
+        tokens = np.concatenate([to_token_array(t).astype(f'S{MAX_TOKEN_WIDTH}') for t, _ in parts])
+        values = np.concatenate([v for _, v in parts])
+        return cls(tokens, values, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def lookup(self, tokens: Iterable) -> np.ndarray:
+        """按token取聚合值，日志中没有的token为NaN"""
+        pos = lookup_sorted(self.tokens, tokens)
+        return np.where(pos >= 0, self.values[np.maximum(pos, 0)], np.nan)
+
+
+class HardExampleMiner:
+    """
+    结合loss日志与冗余度的难例挖掘
+    优先级 = (loss_weight × 难度百分位 + redundancy_weight × (1 - 冗余度百分位)) / (两者权重之和)，
+    范围0~1；百分位在划分结果中的全部sample上计算，日志中没有的sample难度百分位取missing_rank
+    """
+
+    def __init__(self, loader: RedundancySplitLoader, loss_log: LossLog,
+                 loss_weight: float = 0.7, redundancy_weight: float = 0.3,
+                 missing_rank: float = 0.5):
+        """
+        初始化
+
+        Args:
+            loader: 冗余度划分结果加载器
+            loss_log: 聚合后的逐样本日志
+            loss_weight: 难度的权重
+            redundancy_weight: 低冗余度的权重
+            missing_rank: 日志中没有的sample的难度百分位（0.5为中等难度，1.0表示优先保留未见过的样本）
+        """
+        if loss_weight < 0 or redundancy_weight < 0 or loss_weight + redundancy_weight <= 0:
+            raise ValueError("loss_weight与redundancy_weight必须非负且不全为0")
+        if not 0.0 <= missing_rank <= 1.0:
+            raise ValueError(f"missing_rank必须在[0, 1]内: {missing_rank}")
+
+        self.tokens, self.category = loader.get_token_arrays('sample')
+        self.redundancy = loader.get_sample_redundancy()
+
+        # 日志与划分结果的连接：每个划分sample在日志中的聚合值
+        self.loss = loss_log.lookup(self.tokens)
+        self.matched = ~np.isnan(self.loss)
+        difficulty = self.loss if loss_log.higher_is_harder else -self.loss
+        self.difficulty_rank = np.nan_to_num(percentile_rank(difficulty), nan=missing_rank)
+        self.redundancy_rank = np.nan_to_num(percentile_rank(self.redundancy), nan=0.5)
+        self.priority = (loss_weight * self.difficulty_rank
+                         + redundancy_weight * (1.0 - self.redundancy_rank)) / (loss_weight + redundancy_weight)
+        self.num_unmatched_log = len(loss_log) - int(self.matched.sum())
+
+    def align(self, tokens: Iterable) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        将优先级对齐到数据集下标
+
+        Returns:
+            (优先级数组（不在划分结果中为NaN）, int8类别编码数组（不在划分结果中为-1）)
+        """
+        pos = lookup_sorted(self.tokens, tokens)
+        found = pos >= 0
+        priority = np.where(found, self.priority[np.maximum(pos, 0)], np.nan)
+        category = np.where(found, self.category[np.maximum(pos, 0)], -1).astype(np.int8)
+        return priority, category
+
+    def select(self, keep_ratio: float) -> np.ndarray:
+        """
+        按优先级保留前keep_ratio的sample
+
+        Returns:
+            保留的sample token数组（排序）
+        """
+        if not 0.0 < keep_ratio <= 1.0:
+            raise ValueError(f"keep_ratio必须在(0, 1]内: {keep_ratio}")
+        k = int(round(len(self.tokens) * keep_ratio))
+        if k == 0:
+            return self.tokens[:0]
+        keep = np.argpartition(-self.priority, k - 1)[:k]
+        return self.tokens[np.sort(keep)]
+
+    def sample_weights(self, tokens: Iterable, power: float = 2.0,
+                       floor: float = 0.05) -> np.ndarray:
+        """
+        按数据集下标顺序计算采样权重：floor + (1 - floor) × 优先级^power，不在划分结果中的样本为0
+        可作为 RedundancyWeightedSampler(sample_weights=...) 或其他加权采样器的输入
+        """
+        priority, _ = self.align(tokens)
+        weights = floor + (1.0 - floor) * np.nan_to_num(priority, nan=0.0) ** power
+        return np.where(np.isnan(priority), 0.0, weights)
+
+    def category_summary(self, mask: Optional[np.ndarray] = None) -> List[Tuple[str, int, float, float]]:
+        """
+        各冗余度类别的统计
+
+        Args:
+            mask: 只统计这些划分sample（与划分结果的排序token数组对齐的bool数组）
+
+        Returns:
+            [(类别, sample数, 日志覆盖率, 平均优先级), ...]
+        """
+        rows = []
+        for code, category in enumerate(REDUNDANCY_CATEGORIES):
+            selected = self.category == code
+            if mask is not None:
+                selected &= mask
+            n = int(selected.sum())
+            coverage = float(self.matched[selected].mean()) if n else 0.0
+            priority = float(self.priority[selected].mean()) if n else 0.0
+            rows.append((category, n, coverage, priority))
+        return rows
+
+    def save(self, path: str):
+        """保存划分结果中每个sample的loss、百分位和优先级（npz）"""
+        with atomic_open(path, 'wb') as f:
+            np.savez(f, tokens=self.tokens, category=self.category,
+                     redundancy=self.redundancy, loss=self.loss,
+                     difficulty_rank=self.difficulty_rank,
+                     redundancy_rank=self.redundancy_rank, priority=self.priority)
+        print(f"已保存优先级到: {path}")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description='结合逐样本loss日志与冗余度挖掘难例，输出下一轮训练的子集或采样权重'
+    )
+    parser.add_argument(
+        '--redundancy-split',
+        type=str,
+        required=True,
+        help='冗余度划分结果文件路径'
+    )
+    parser.add_argument(
+        '--loss-log',
+        type=str,
+        nargs='+',
+        required=True,
+        help='逐样本日志（.csv/.npy/.npz，可指定多个，按顺序拼接）'
+    )
+    parser.add_argument(
+        '--token-column',
+        type=str,
+        default='token',
+        help='token列名（默认token）'
+    )
+    parser.add_argument(
+        '--value-column',
+        type=str,
+        default='loss',
+        help='数值列名（默认loss）'
+    )
+    parser.add_argument(
+        '--reduce',
+        type=str,
+        default='mean',
+        choices=REDUCE_MODES,
+        help='同一token多条记录的聚合方式（默认mean）'
+    )
+    parser.add_argument(
+        '--lower-is-harder',
+        action='store_true',
+        help='数值越小越难（数值列为IoU、mAP等指标时使用）'
+    )
+    parser.add_argument(
+        '--loss-weight',
+        type=float,
+        default=0.7,
+        help='优先级中难度的权重（默认0.7）'
+    )
+    parser.add_argument(
+        '--redundancy-weight',
+        type=float,
+        default=0.3,
+        help='优先级中低冗余度的权重（默认0.3）'
+    )
+    parser.add_argument(
+        '--missing-rank',
+        type=float,
+        default=0.5,
+        help='日志中没有的sample的难度百分位（默认0.5）'
+    )
+    parser.add_argument(
+        '--output',
+        type=str,
+        required=True,
+        help='优先级输出文件（.npz）'
+    )
+    parser.add_argument(
+        '--infos',
+        type=str,
+        default=None,
+        help='MapTR info文件；指定后可输出子集（--output-dir）或采样权重（--weights-output）'
+    )
+    parser.add_argument(
+        '--output-dir',
+        type=str,
+        default=None,
+        help='子集输出目录（与--infos同名的info文件）'
+    )
+    parser.add_argument(
+        '--keep-ratio',
+        type=float,
+        default=0.5,
+        help='子集保留的sample比例（按优先级从高到低，默认0.5）'
+    )
+    parser.add_argument(
+        '--index-only',
+        action='store_true',
+        help='子集只输出行号索引（见maptr_subset.py）'
+    )
+    parser.add_argument(
+        '--weights-output',
+        type=str,
+        default=None,
+        help='采样权重输出文件（.npy，与--infos中的样本顺序对齐）'
+    )
+    parser.add_argument(
+        '--weight-power',
+        type=float,
+        default=2.0,
+        help='采样权重 = floor + (1 - floor) × 优先级^power（默认2.0）'
+    )
+    parser.add_argument(
+        '--weight-floor',
+        type=float,
+        default=0.05,
+        help='采样权重下限（默认0.05）'
+    )
+    args = parser.parse_args()
+
+    if (args.output_dir or args.weights_output) and not args.infos:
+        parser.error("--output-dir/--weights-output 需要同时指定 --infos")
+
+    start = time.time()
+    loader = RedundancySplitLoader(args.redundancy_split)
+    loss_log = LossLog.from_files(args.loss_log, args.token_column, args.value_column,
+                                  reduce=args.reduce, higher_is_harder=not args.lower_is_harder)
+    print(f"日志记录数: {loss_log.num_records}，涉及sample数: {len(loss_log)} "
+          f"({time.time() - start:.1f}s)")
+
+    miner = HardExampleMiner(loader, loss_log, loss_weight=args.loss_weight,
+                             redundancy_weight=args.redundancy_weight,
+                             missing_rank=args.missing_rank)
+    if miner.num_unmatched_log:
+        print(f"警告: {miner.num_unmatched_log} 个日志sample不在冗余度划分结果中，已忽略")
+    print(f"\n{'类别':<20}{'sample数':>10}{'日志覆盖率':>12}{'平均优先级':>12}")
+    for category, n, coverage, priority in miner.category_summary():
+        print(f"{category:<20}{n:>10}{coverage:>12.1%}{priority:>12.3f}")
+    miner.save(args.output)
+
+    if args.infos:
+        index = None
+        if args.output_dir:
+            # 延迟导入，避免只计算优先级或权重时引入生成器的依赖
+            from generate_maptr_pkl import InfoIndex
+            index = InfoIndex(args.infos)
+
+            keep = miner.select(args.keep_ratio)
+            mask = isin_sorted(keep, miner.tokens)
+            print(f"\n保留 {len(keep)} / {len(miner.tokens)} 个sample（keep_ratio={args.keep_ratio}）:")
+            for category, n, _, priority in miner.category_summary(mask):
+                print(f"  {category}: {n} samples，平均优先级 {priority:.3f}")
+            rows = index.select_rows(keep)
+            output_path = os.path.join(args.output_dir, os.path.basename(args.infos))
+            print(f"子集样本数: {len(rows)}")
+            if args.index_only:
+                index.write_index(rows, output_path)
+            else:
+                index.write_subset(rows, output_path)
+
+        if args.weights_output:
+            tokens = ([info.get('token') or '' for info in index.infos] if index is not None
+                      else read_info_tokens(args.infos))
+            weights = miner.sample_weights(tokens, power=args.weight_power, floor=args.weight_floor)
+            with atomic_open(args.weights_output, 'wb') as f:
+                np.save(f, weights)
+            print(f"已保存采样权重到: {args.weights_output}（{int((weights > 0).sum())} 个样本权重为正）")
+
+    print(f"\n完成 ({time.time() - start:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
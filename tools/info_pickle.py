@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+info pkl流式读写
+  - 标准格式：与pickle.dump({'infos': [...], 'metadata': ...})等价、可直接用pickle.load/mmcv.load读取，
+    但按块增量编码写出（protocol 5，NumPy数组带内零拷贝编码），内存中最多保留一块
+  - 分块容器：每块infos单独用protocol 5编码，NumPy数组作为带外缓冲区原样写在块后（64字节对齐），
+    配套的ChunkedInfoReader可逐块流式读取，或以mmap方式零拷贝地还原数组
+"""
+
+import argparse
+import io
+import mmap
+import os
+import pickle
+import struct
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from io_utils import atomic_open
+
+
+PROTOCOL = 5
+
+# 每块的info数
+DEFAULT_CHUNK_SIZE = 1000
+
+# 分块容器的魔数（文件头和文件尾各一份）
+CHUNKED_MAGIC = b'NSINFCK\x01'
+CHUNKED_FORMAT = 1
+
+# 带外缓冲区在文件中的对齐字节数
+BUFFER_ALIGNMENT = 64
+
+_CHUNK_HEADER = struct.Struct('<QI')   # 块pickle长度、带外缓冲区个数
+_LENGTH = struct.Struct('<Q')
+_TRAILER = struct.Struct('<Q8s')       # 文件尾：footer偏移、魔数
+
+# 手工拼装标准格式用到的pickle操作码
+_PROTO = pickle.PROTO + bytes([PROTOCOL])
+_FRAME = pickle.FRAME[0]
+_SHORT_BINUNICODE = pickle.SHORT_BINUNICODE
+
+
+def _short_unicode(text: str) -> bytes:
+    data = text.encode('utf-8')
+    return _SHORT_BINUNICODE + bytes([len(data)]) + data
+
+
+class _BodyPickler:
+    """
+    将单个对象编码为不含PROTO/STOP的pickle操作码片段，以便拼接进外层容器
+    使用fast模式（不写memo），各片段之间不会出现跨片段的memo引用
+    """
+
+    def __init__(self):
+        self._buffer = io.BytesIO()
+        self._pickler = pickle.Pickler(self._buffer, protocol=PROTOCOL)
+        self._pickler.fast = True
+
+    def encode(self, obj: Any) -> bytes:
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._pickler.dump(obj)
+        data = self._buffer.getbuffer()
+        start = len(_PROTO)
+        if data[start] == _FRAME:
+            start += 1 + _LENGTH.size
+        body = bytes(data[start:-1])
+        data.release()
+        return body
+
+
+def is_chunked_info(path: str) -> bool:
+    """判断文件是否为分块容器"""
+    with open(path, 'rb') as f:
+        return f.read(len(CHUNKED_MAGIC)) == CHUNKED_MAGIC
+
+
+class InfoPickleWriter:
+    """
+    流式、原子地写出info文件（标准格式或分块容器）
+    """
+
+    def __init__(self, path: str, metadata: Optional[Dict] = None,
+                 chunked: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """
+        初始化
+
+        Args:
+            path: 输出路径
+            metadata: 写入文件的metadata
+            chunked: 是否写出分块容器（否则为标准pkl格式）
+            chunk_size: 每块的info数（决定写出时的内存上限）
+        """
+        if chunk_size <= 0:
+            raise ValueError(f"chunk_size必须为正数: {chunk_size}")
+        self.path = path
+        self.metadata = metadata if metadata is not None else {}
+        self.chunked = chunked
+        self.chunk_size = chunk_size
+        self.count = 0
+        self._pending = []
+        self._chunks = []
+        self._offset = 0
+        self._body = None if chunked else _BodyPickler()
+        self._context = atomic_open(path, 'wb')
+        self._file = self._context.__enter__()
+        if chunked:
+            self._write(CHUNKED_MAGIC)
+        else:
+            self._write(_PROTO + pickle.EMPTY_DICT + _short_unicode('infos') + pickle.EMPTY_LIST)
+
+    def _write(self, data):
+        self._file.write(data)
+        self._offset += len(data)
+
+    def write_many(self, infos: Iterable[Dict]):
+        """写出一批info"""
+        for info in infos:
+            self._pending.append(info)
+            if len(self._pending) >= self.chunk_size:
+                self._flush()
+
+    def write(self, info: Dict):
+        """写出单个info"""
+        self.write_many([info])
+
+    def _flush(self):
+        if not self._pending:
+            return
+        infos, self._pending = self._pending, []
+        if self.chunked:
+            self._write_chunk(infos)
+        else:
+            self._write(pickle.MARK)
+            for info in infos:
+                self._write(self._body.encode(info))
+            self._write(pickle.APPENDS)
+        self.count += len(infos)
+
+    def _write_chunk(self, infos: List[Dict]):
+        buffers = []
+        data = pickle.dumps(infos, protocol=PROTOCOL, buffer_callback=buffers.append)
+        raws = [buffer.raw() for buffer in buffers]
+
+        self._chunks.append((self._offset, len(infos)))
+        self._write(_CHUNK_HEADER.pack(len(data), len(raws)))
+        for raw in raws:
+            self._write(_LENGTH.pack(raw.nbytes))
+        self._write(data)
+        for raw in raws:
+            self._write(b'\0' * (-self._offset % BUFFER_ALIGNMENT))
+            self._write(raw)
+            raw.release()
+
+    def close(self):
+        """写出剩余的info和文件尾，并原子地替换目标文件"""
+        self._flush()
+        if self.chunked:
+            footer = {
+                'format': CHUNKED_FORMAT,
+                'count': self.count,
+                'chunks': self._chunks,
+                'metadata': self.metadata
+            }
+            footer_offset = self._offset
+            self._write(pickle.dumps(footer, protocol=PROTOCOL))
+            self._write(_TRAILER.pack(footer_offset, CHUNKED_MAGIC))
+        else:
+            self._write(pickle.SETITEM + _short_unicode('metadata'))
+            self._write(self._body.encode(self.metadata))
+            self._write(pickle.SETITEM + pickle.STOP)
+        context, self._context, self._file = self._context, None, None
+        context.__exit__(None, None, None)
+
+    def abort(self, exc: BaseException):
+        """放弃写出，删除临时文件"""
+        if self._context is not None:
+            context, self._context, self._file = self._context, None, None
+            context.__exit__(type(exc), exc, exc.__traceback__)
+
+    def __enter__(self) -> 'InfoPickleWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is None:
+            self.close()
+        else:
+            self.abort(exc)
+        return False
+
+
+class ChunkedInfoReader:
+    """
+    分块容器的流式读取器
+    """
+
+    def __init__(self, path: str, use_mmap: bool = False):
+        """
+        打开分块容器
+
+        Args:
+            path: 容器路径
+            use_mmap: 以mmap方式读取；NumPy数组直接引用映射的内存（只读、零拷贝），
+                      此时读取器需在这些数组使用完之前保持打开
+        """
+        self.path = path
+        self.use_mmap = use_mmap
+        self._file = open(path, 'rb')
+        self._map = None
+        try:
+            if self._file.read(len(CHUNKED_MAGIC)) != CHUNKED_MAGIC:
+                raise ValueError(f"不是分块info容器: {path}")
+            self._file.seek(-_TRAILER.size, os.SEEK_END)
+            footer_offset, magic = _TRAILER.unpack(self._file.read(_TRAILER.size))
+            if magic != CHUNKED_MAGIC:
+                raise ValueError(f"分块info容器不完整: {path}")
+            self._file.seek(footer_offset)
+            footer = pickle.load(self._file)
+            if footer.get('format') != CHUNKED_FORMAT:
+                raise ValueError(f"不支持的分块容器格式: {path}")
+            if use_mmap:
+                self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            self._file.close()
+            raise
+
+        self.metadata = footer['metadata']
+        self.chunks = footer['chunks']
+        self.count = footer['count']
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _read(self, offset: int, size: int, writable: bool = False):
+        if self._map is not None:
+            return memoryview(self._map)[offset:offset + size]
+        self._file.seek(offset)
+        if writable:
+            data = bytearray(size)
+            self._file.readinto(data)
+            return data
+        return self._file.read(size)
+
+    def read_chunk(self, index: int) -> List[Dict]:
+        """读取第index块的infos"""
+        offset, _ = self.chunks[index]
+        data_size, num_buffers = _CHUNK_HEADER.unpack(self._read(offset, _CHUNK_HEADER.size))
+        offset += _CHUNK_HEADER.size
+        lengths = [_LENGTH.unpack(self._read(offset + i * _LENGTH.size, _LENGTH.size))[0]
+                   for i in range(num_buffers)]
+        offset += num_buffers * _LENGTH.size
+        data = self._read(offset, data_size)
+        offset += data_size
+
+        buffers = []
+        for length in lengths:
+            offset += -offset % BUFFER_ALIGNMENT
+            buffers.append(self._read(offset, length, writable=True))
+            offset += length
+        return pickle.loads(data, buffers=buffers)
+
+    def iter_chunks(self) -> Iterator[List[Dict]]:
+        """逐块产生infos（内存中只保留当前块）"""
+        for index in range(len(self.chunks)):
+            yield self.read_chunk(index)
+
+    def __iter__(self) -> Iterator[Dict]:
+        for chunk in self.iter_chunks():
+            yield from chunk
+
+    def load(self) -> Dict:
+        """读取全部infos，组装为与标准格式相同的字典"""
+        return {'infos': list(self), 'metadata': self.metadata}
+
+    def close(self):
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # 仍有数组引用映射的内存，映射随这些数组释放
+                pass
+            self._map = None
+        self._file.close()
+
+    def __enter__(self) -> 'ChunkedInfoReader':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def load_infos(path: str) -> Dict:
+    """
+    读取info文件（标准格式或分块容器）
+
+    Returns:
+        {'infos': [...], 'metadata': ...}
+    """
+    if is_chunked_info(path):
+        with ChunkedInfoReader(path) as reader:
+            return reader.load()
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def main():
+    """命令行：在标准格式与分块容器之间转换info文件"""
+    parser = argparse.ArgumentParser(
+        description='在标准pkl与分块容器之间转换MapTR info文件'
+    )
+    parser.add_argument('input', type=str, help='输入info文件')
+    parser.add_argument('output', type=str, help='输出info文件')
+    parser.add_argument(
+        '--to',
+        type=str,
+        default='chunked',
+        choices=['chunked', 'pickle'],
+        help='输出格式：chunked(分块容器) / pickle(标准pkl)'
+    )
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help=f'每块的info数（默认{DEFAULT_CHUNK_SIZE}）'
+    )
+    args = parser.parse_args()
+
+    start = time.time()
+    if is_chunked_info(args.input):
+        reader = ChunkedInfoReader(args.input)
+        metadata, infos = reader.metadata, iter(reader)
+    else:
+        reader = None
+        print(f"加载info文件: {args.input}")
+        data = load_infos(args.input)
+        metadata, infos = data.get('metadata', {}), data['infos']
+
+    with InfoPickleWriter(args.output, metadata, chunked=args.to == 'chunked',
+                          chunk_size=args.chunk_size) as writer:
+        writer.write_many(infos)
+    if reader is not None:
+        reader.close()
+
+    print(f"已写出 {writer.count} 条info到: {args.output} ({time.time() - start:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件读写工具函数
+提供原子写入（临时文件+重命名）、流式的JSON/文本读写以及批量目录列举
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+# 流式写出时每次落盘的字符数
+WRITE_CHUNK_SIZE = 1 << 20
+
+# 进程umask（第一次使用时读取，见_process_umask）
+_umask = None
+
+
+def _process_umask() -> int:
+    """
+    读取进程umask（mkstemp创建的临时文件权限为0600，重命名前按umask恢复为普通文件权限）
+    Linux上从/proc/self/status读取，不修改umask；其他平台只能先设置再恢复，
+    仅在第一次写文件时执行一次
+    """
+    global _umask
+    if _umask is None:
+        try:
+            with open('/proc/self/status', 'r') as f:
+                for line in f:
+                    if line.startswith('Umask:'):
+                        _umask = int(line.split()[1], 8)
+                        break
+        except OSError:
+            pass
+        if _umask is None:
+            _umask = os.umask(0o022)
+            os.umask(_umask)
+    return _umask
+
+
+@contextmanager
+def atomic_open(path: str, mode: str = 'w', **kwargs):
+    """
+    原子写入文件：先写入同目录下的临时文件，成功后再重命名为目标文件
+    中途崩溃或抛出异常时不会留下写了一半的目标文件
+
+    Args:
+        path: 目标文件路径
+        mode: 打开模式（'w'或'wb'）
+        **kwargs: 传给open的其他参数（如encoding）
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp'
+    )
+    try:
+        try:
+            f = os.fdopen(fd, mode, **kwargs)
+        except BaseException:
+            os.close(fd)
+            raise
+        with f:
+            os.fchmod(f.fileno(), 0o666 & ~_process_umask())
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def write_json_stream(obj: Any, path: str, indent: Optional[int] = None,
+                      chunk_size: int = WRITE_CHUNK_SIZE) -> str:
+    """
+    流式编码并原子写出JSON文件
+    使用JSONEncoder.iterencode逐块编码，不在内存中构建完整的JSON字符串
+
+    Args:
+        obj: 待写出的对象
+        path: 输出路径
+        indent: 缩进（None表示紧凑格式）
+        chunk_size: 每次落盘的字符数
+
+    Returns:
+        写出内容的SHA-256
+    """
+    encoder = json.JSONEncoder(indent=indent)
+    digest = hashlib.sha256()
+    with atomic_open(path, 'wb') as f:
+        def flush(buffer):
+            data = ''.join(buffer).encode('utf-8')
+            digest.update(data)
+            f.write(data)
+
+        buffer = []
+        buffered = 0
+        for chunk in encoder.iterencode(obj):
+            buffer.append(chunk)
+            buffered += len(chunk)
+            if buffered >= chunk_size:
+                flush(buffer)
+                buffer = []
+                buffered = 0
+        flush(buffer)
+    return digest.hexdigest()
+
+
+def write_lines(lines: Iterable[str], path: str,
+                chunk_size: int = WRITE_CHUNK_SIZE) -> int:
+    """
+    流式原子写出文本文件，每个元素一行
+
+    Args:
+        lines: 行内容序列（不含换行符）
+        path: 输出路径
+        chunk_size: 每次落盘的字符数
+
+    Returns:
+        写出的行数
+    """
+    count = 0
+    with atomic_open(path, 'w', encoding='utf-8') as f:
+        buffer = []
+        buffered = 0
+        for line in lines:
+            buffer.append(line)
+            buffer.append('\n')
+            buffered += len(line) + 1
+            count += 1
+            if buffered >= chunk_size:
+                f.write(''.join(buffer))
+                buffer = []
+                buffered = 0
+        f.write(''.join(buffer))
+    return count
+
+
+_WHITESPACE = re.compile(r'\s*')
+
+
+def iter_json_array(path: str, chunk_size: int = WRITE_CHUNK_SIZE) -> Iterator[Any]:
+    """
+    流式读取顶层为数组的JSON文件，逐个产生数组元素
+    内存中只保留一个读取块和当前元素，适合逐条处理大型元数据表
+
+    Args:
+        path: JSON文件路径
+        chunk_size: 每次读取的字符数
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = ''
+        pos = 0
+        eof = False
+        started = False
+
+        def read_more():
+            nonlocal buffer, pos, eof
+            data = f.read(chunk_size)
+            if not data:
+                eof = True
+            buffer = buffer[pos:] + data
+            pos = 0
+
+        while True:
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos >= len(buffer):
+                if eof:
+                    raise ValueError(f"JSON数组不完整: {path}")
+                read_more()
+                continue
+
+            char = buffer[pos]
+            if not started:
+                if char != '[':
+                    raise ValueError(f"JSON文件顶层不是数组: {path}")
+                started = True
+                pos += 1
+                continue
+            if char == ']':
+                return
+            if char == ',':
+                pos += 1
+                continue
+
+            try:
+                obj, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # 元素跨越了读取块的边界
+                if eof:
+                    raise
+                read_more()
+                continue
+            if end >= len(buffer) and not eof:
+                # 元素恰好在块尾结束时（如数字）可能被截断，补充读取后重新解析
+                read_more()
+                continue
+
+            yield obj
+            pos = end
+
+
+def list_dir_names(path: str, files_only: bool = False) -> Set[str]:
+    """
+    用os.scandir一次性列出目录下的所有条目名（目录不存在时返回空集合）
+
+    Args:
+        path: 目录路径
+        files_only: 只返回普通文件（符号链接按其目标判断，悬空链接被排除）
+    """
+    try:
+        with os.scandir(path) as entries:
+            if files_only:
+                return {entry.name for entry in entries if entry.is_file()}
+            return {entry.name for entry in entries}
+    except FileNotFoundError:
+        return set()
+
+
+def list_dir_symlinks(path: str) -> Tuple[Set[str], Set[str]]:
+    """
+    用os.scandir一次性列出目录下的条目名，并区分其中的符号链接（目录不存在时返回空集合）
+
+    Returns:
+        (所有条目名, 其中为符号链接的条目名)
+    """
+    try:
+        with os.scandir(path) as entries:
+            names, symlinks = set(), set()
+            for entry in entries:
+                names.add(entry.name)
+                if entry.is_symlink():
+                    symlinks.add(entry.name)
+            return names, symlinks
+    except FileNotFoundError:
+        return set(), set()
+
+
+def iter_batches(iterable: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
+    """将序列按固定大小分批"""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class JsonArrayWriter:
+    """
+    流式、原子地写出顶层为数组的JSON文件
+    输出格式与 json.dump(list, f) 完全一致，写出的同时计算内容的SHA-256
+    """
+
+    def __init__(self, path: str, write_empty: bool = True):
+        """
+        初始化
+
+        Args:
+            path: 输出路径
+            write_empty: 没有写入任何元素时是否仍输出空数组文件
+        """
+        self.path = path
+        self.write_empty = write_empty
+        self.count = 0
+        self.sha256 = None
+        self._digest = hashlib.sha256()
+        self._context = None
+        self._file = None
+
+    def _open(self):
+        self._context = atomic_open(self.path, 'wb')
+        self._file = self._context.__enter__()
+        self._write('[')
+
+    def _write(self, text: str):
+        data = text.encode('utf-8')
+        self._digest.update(data)
+        self._file.write(data)
+
+    def write_many(self, objs: Iterable[Any]):
+        """写出一批元素"""
+        encoded = [json.dumps(obj) for obj in objs]
+        if not encoded:
+            return
+        if self._file is None:
+            self._open()
+        prefix = ', ' if self.count else ''
+        self._write(prefix + ', '.join(encoded))
+        self.count += len(encoded)
+
+    def write(self, obj: Any):
+        """写出单个元素"""
+        self.write_many([obj])
+
+    def close(self):
+        """结束数组并原子地替换目标文件（之后可通过sha256属性获取内容校验和）"""
+        if self._file is None:
+            if not self.write_empty:
+                return
+            self._open()
+        self._write(']')
+        context, self._context, self._file = self._context, None, None
+        context.__exit__(None, None, None)
+        self.sha256 = self._digest.hexdigest()
+
+    def abort(self, exc: BaseException):
+        """放弃写出，删除临时文件"""
+        if self._context is not None:
+            context, self._context, self._file = self._context, None, None
+            context.__exit__(type(exc), exc, exc.__traceback__)
+
+    def __enter__(self) -> 'JsonArrayWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is None:
+            self.close()
+        else:
+            self.abort(exc)
+        return False
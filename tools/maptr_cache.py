@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MapTR子集输出缓存
+以冗余度划分文件、原始info文件的内容（SHA-256）和模式参数计算键，保存生成的子集文件：
+  - 键相同的结果直接从缓存落地到输出目录（默认硬链接），跳过重新生成
+  - 缓存索引（cache_index.json）记录每个条目的大小和最近使用时间，按LRU淘汰，
+    同时受条目数和总大小上限约束
+  - 输入文件的校验和按路径记录，大小和修改时间均未变化时不重新计算
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from io_utils import atomic_open
+from version_manifest import file_sha256, compute_fingerprint
+from file_materializer import FileMaterializer
+
+try:
+    import fcntl
+except ImportError:  # 非Linux/Unix平台
+    fcntl = None
+
+
+CACHE_FORMAT = 1
+CACHE_INDEX_FILENAME = 'cache_index.json'
+CACHE_LOCK_FILENAME = '.lock'
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'nuscenes_newsplit', 'maptr')
+DEFAULT_MAX_ENTRIES = 32
+DEFAULT_MAX_BYTES = 64 << 30
+
+
+class OutputCache:
+    """
+    内容寻址的子集输出缓存
+    多个进程可以共享同一个缓存目录（索引的读写在文件锁内完成）
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 link_mode: str = 'hardlink'):
+        """
+        打开（或新建）缓存目录
+
+        Args:
+            cache_dir: 缓存目录
+            max_entries: 最多保留的条目数
+            max_bytes: 所有条目的总大小上限（字节）
+            link_mode: 缓存与输出目录之间的落地方式（hardlink/reflink/copy，按回退链降级）
+        """
+        if max_entries <= 0 or max_bytes <= 0:
+            raise ValueError("缓存的条目数和大小上限必须为正数")
+        if link_mode == 'symlink':
+            raise ValueError("缓存条目可能被淘汰，不能以符号链接方式落地")
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.materializer = FileMaterializer(link_mode)
+        self.index_path = os.path.join(cache_dir, CACHE_INDEX_FILENAME)
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @contextmanager
+    def _locked(self):
+        """在文件锁内读取索引，退出时写回"""
+        with open(os.path.join(self.cache_dir, CACHE_LOCK_FILENAME), 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            index = self._read_index()
+            yield index
+            with atomic_open(self.index_path, 'w', encoding='utf-8') as f:
+                json.dump(index, f, indent=2)
+
+    def _read_index(self) -> Dict:
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = None
+        if not index or index.get('format') != CACHE_FORMAT:
+            index = {'format': CACHE_FORMAT, 'entries': {}, 'digests': {}}
+        return index
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def file_digest(self, path: str) -> str:
+        """
+        计算输入文件的SHA-256
+        同一路径的大小和修改时间与上次记录一致时直接使用记录的校验和
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self._locked() as index:
+            record = index['digests'].get(path)
+        if record and record['size'] == stat.st_size and record['mtime_ns'] == stat.st_mtime_ns:
+            return record['sha256']
+
+        print(f"计算校验和: {path}")
+        digest = file_sha256(path)
+        with self._locked() as index:
+            index['digests'][path] = {
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'sha256': digest
+            }
+            # 顺便清理已不存在的文件的记录
+            for stale in [p for p in index['digests'] if not os.path.exists(p)]:
+                del index['digests'][stale]
+        return digest
+
+    def make_key(self, inputs: Dict) -> str:
+        """
+        计算缓存键
+
+        Args:
+            inputs: 决定输出内容的全部输入（文件以file_digest的结果表示），须可JSON序列化
+        """
+        return compute_fingerprint({'format': CACHE_FORMAT, 'inputs': inputs})
+
+    def _entry_intact(self, key: str, entry: Dict) -> bool:
+        """条目目录中的文件是否齐全且大小与记录一致"""
+        entry_dir = self._entry_dir(key)
+        for name, size in entry['files'].items():
+            path = os.path.join(entry_dir, name)
+            if not os.path.isfile(path) or os.path.getsize(path) != size:
+                return False
+        return True
+
+    def restore(self, key: str, output_dir: str) -> Optional[Dict]:
+        """
+        命中时将缓存的文件落地到输出目录
+
+        Returns:
+            生成时记录的结果（store时传入的result）；未命中为None
+        """
+        with self._locked() as index:
+            entry = index['entries'].get(key)
+            if entry is None:
+                return None
+            if not self._entry_intact(key, entry):
+                print(f"缓存条目已损坏，丢弃: {key[:12]}")
+                self._remove(index, key)
+                return None
+
+            os.makedirs(output_dir, exist_ok=True)
+            for name in entry['files']:
+                self._replace(os.path.join(self._entry_dir(key), name),
+                              os.path.join(output_dir, name))
+            entry['last_used'] = time.time()
+            entry['hits'] = entry.get('hits', 0) + 1
+            return dict(entry['result'])
+
+    def store(self, key: str, output_dir: str, files: List[str], result: Dict,
+              protect: Optional[List[str]] = None):
+        """
+        将输出目录中生成好的文件存入缓存，并按LRU淘汰超出上限的条目
+
+        Args:
+            key: 缓存键
+            output_dir: 输出目录
+            files: 要缓存的文件名（相对output_dir）
+            result: 与文件一起保存的结果（须可JSON序列化）
+            protect: 本次淘汰时不删除的键（如同一批次中刚命中的条目）
+        """
+        staging = tempfile.mkdtemp(dir=self.cache_dir, prefix=f'.{key[:12]}.', suffix='.tmp')
+        try:
+            sizes = {}
+            for name in files:
+                src = os.path.join(output_dir, name)
+                self.materializer.materialize(src, os.path.join(staging, name))
+                sizes[name] = os.path.getsize(src)
+
+            with self._locked() as index:
+                entry_dir = self._entry_dir(key)
+                if os.path.exists(entry_dir):
+                    shutil.rmtree(entry_dir)
+                os.rename(staging, entry_dir)
+                now = time.time()
+                index['entries'][key] = {
+                    'files': sizes,
+                    'size': sum(sizes.values()),
+                    'result': result,
+                    'created': now,
+                    'last_used': now,
+                    'hits': 0
+                }
+                self._evict(index, protect=set(protect or []) | {key})
+        finally:
+            if os.path.exists(staging):
+                shutil.rmtree(staging)
+
+    def _replace(self, src: str, dst: str):
+        """原子地用src替换dst（dst已是同一文件时跳过）"""
+        if os.path.exists(dst) and os.path.samefile(src, dst):
+            return
+        tmp = os.path.join(os.path.dirname(dst), f'.{os.path.basename(dst)}.cache.tmp')
+        if os.path.lexists(tmp):
+            os.unlink(tmp)
+        self.materializer.materialize(src, tmp)
+        os.replace(tmp, dst)
+
+    def _remove(self, index: Dict, key: str):
+        index['entries'].pop(key, None)
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def _evict(self, index: Dict, protect: set = frozenset()):
+        """按最近使用时间从旧到新淘汰条目，直到满足条目数和总大小上限"""
+        entries = index['entries']
+        total = sum(entry['size'] for entry in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k]['last_used']):
+            if len(entries) <= self.max_entries and total <= self.max_bytes:
+                break
+            if key in protect:
+                continue
+            total -= entries[key]['size']
+            print(f"淘汰缓存条目: {key[:12]} ({entries[key]['size'] / 2**20:.1f}MB)")
+            self._remove(index, key)
+
+    def clear(self):
+        """删除所有条目"""
+        with self._locked() as index:
+            for key in list(index['entries']):
+                self._remove(index, key)
+
+    def summary(self) -> Dict:
+        """条目数与总大小"""
+        with self._locked() as index:
+            entries = index['entries']
+            return {'entries': len(entries),
+                    'bytes': sum(entry['size'] for entry in entries.values())}
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MapTR仅索引子集
+子集只保存其在原始info文件中的行号（int32 .npy）和元数据（原始文件路径、大小、SHA-256），
+读取时由IndexedInfos按需加载原始infos并按行号返回，不再复制每个样本的info。
+原始文件为分块容器时只以mmap方式读取用到的块，并按LRU缓存有限个块
+"""
+
+import json
+import os
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from io_utils import atomic_open
+from version_manifest import file_sha256
+from info_pickle import ChunkedInfoReader, is_chunked_info, load_infos
+
+
+INDEX_FORMAT = 1
+INDEX_SUFFIX = '.index.npy'
+INDEX_META_SUFFIX = '.index.json'
+
+# 分块容器源默认缓存的块数
+DEFAULT_CACHE_CHUNKS = 8
+
+
+def index_paths(info_path: str) -> Tuple[str, str]:
+    """
+    由子集info文件路径（如 nuscenes_infos_temporal_train.pkl）得到索引文件和元数据文件路径
+
+    Returns:
+        (.index.npy路径, .index.json路径)
+    """
+    for suffix in (INDEX_SUFFIX, INDEX_META_SUFFIX, '.pkl'):
+        if info_path.endswith(suffix):
+            info_path = info_path[:-len(suffix)]
+            break
+    return info_path + INDEX_SUFFIX, info_path + INDEX_META_SUFFIX
+
+
+def source_signature(source_path: str) -> Dict:
+    """记录原始info文件的路径、大小、修改时间和SHA-256"""
+    stat = os.stat(source_path)
+    return {
+        'path': os.path.abspath(source_path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': file_sha256(source_path)
+    }
+
+
+def check_source(source_path: str, signature: Dict):
+    """
+    校验原始info文件与记录一致
+    大小和修改时间均一致时直接认可，只有修改时间变化时才重新计算校验和
+
+    Raises:
+        ValueError: 原始文件已变化
+    """
+    stat = os.stat(source_path)
+    if stat.st_size != signature['size']:
+        raise ValueError(f"原始info文件大小与索引记录不一致: {source_path}")
+    if stat.st_mtime_ns == signature['mtime_ns']:
+        return
+    if file_sha256(source_path) != signature['sha256']:
+        raise ValueError(f"原始info文件内容与索引记录不一致（SHA-256不同）: {source_path}")
+
+
+def write_index_subset(rows: np.ndarray, output_path: str, source: Dict,
+                       num_source_infos: int) -> str:
+    """
+    原子写出仅索引子集
+
+    Args:
+        rows: 子集在原始infos中的行号（按原始顺序）
+        output_path: 子集info文件路径（用于推导索引文件名）
+        source: 原始info文件的签名（source_signature的返回值）
+        num_source_infos: 原始infos的样本数
+
+    Returns:
+        索引文件路径
+    """
+    if num_source_infos > np.iinfo(np.int32).max:
+        raise ValueError(f"原始样本数超出int32范围: {num_source_infos}")
+    index_path, meta_path = index_paths(output_path)
+    os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+
+    with atomic_open(index_path, 'wb') as f:
+        np.save(f, np.asarray(rows, dtype=np.int32))
+    metadata = {
+        'format': INDEX_FORMAT,
+        'source': source,
+        'num_source_infos': num_source_infos,
+        'count': len(rows)
+    }
+    with atomic_open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, indent=2)
+
+    print(f"已保存索引到: {index_path}")
+    return index_path
+
+
+class IndexedInfos:
+    """
+    仅索引子集的惰性读取器
+    行号数组以mmap方式打开，原始infos在第一次取样本时才加载：
+      - 标准pkl整体加载（多个子集可通过source_data共享同一份已加载的原始数据）
+      - 分块容器以mmap方式打开，只读取行号落在其中的块，最近使用的cache_chunks个块保留在内存中
+    """
+
+    def __init__(self, index_path: str, source_path: Optional[str] = None,
+                 verify: bool = True, mmap: bool = True,
+                 source_data: Optional[Dict] = None,
+                 cache_chunks: int = DEFAULT_CACHE_CHUNKS):
+        """
+        打开仅索引子集
+
+        Args:
+            index_path: .index.npy / .index.json 路径，或对应的子集info文件路径
+            source_path: 原始info文件路径（默认使用元数据中记录的路径，原始文件移动后可在此指定）
+            verify: 加载原始infos前是否校验其与索引记录一致
+            mmap: 是否以mmap方式打开行号数组
+            source_data: 已加载的原始info数据（{'infos': ..., 'metadata': ...}）
+            cache_chunks: 原始文件为分块容器时缓存的块数
+        """
+        if cache_chunks <= 0:
+            raise ValueError("cache_chunks必须为正数")
+        self.index_path, self.metadata_path = index_paths(index_path)
+        with open(self.metadata_path, 'r', encoding='utf-8') as f:
+            self.index_metadata = json.load(f)
+        if self.index_metadata.get('format') != INDEX_FORMAT:
+            raise ValueError(f"不支持的索引格式: {self.metadata_path}")
+
+        self.rows = np.load(self.index_path, mmap_mode='r' if mmap else None)
+        if len(self.rows) != self.index_metadata['count']:
+            raise ValueError(f"索引文件与元数据记录的样本数不一致: {self.index_path}")
+
+        self.source_path = source_path or self.index_metadata['source']['path']
+        self.verify = verify
+        self.cache_chunks = cache_chunks
+        self._data = source_data
+        self._reader = None
+        self._chunk_starts = None
+        self._chunk_cache = OrderedDict()
+
+    def _check_count(self, count: int):
+        if count != self.index_metadata['num_source_infos']:
+            raise ValueError(f"原始infos样本数与索引记录不一致: {self.source_path}")
+
+    def _open_source(self) -> bool:
+        """
+        第一次访问时打开原始文件
+
+        Returns:
+            原始文件是否为分块容器（此时通过mmap读取器按块读取）
+        """
+        if self._data is not None:
+            return False
+        if self._reader is None:
+            if self.verify:
+                check_source(self.source_path, self.index_metadata['source'])
+            if not is_chunked_info(self.source_path):
+                self._data = load_infos(self.source_path)
+                self._check_count(len(self._data['infos']))
+                return False
+            self._reader = ChunkedInfoReader(self.source_path, use_mmap=True)
+            self._check_count(self._reader.count)
+            counts = [count for _, count in self._reader.chunks]
+            self._chunk_starts = np.concatenate([[0], np.cumsum(counts, dtype=np.int64)])
+        return True
+
+    @property
+    def chunked(self) -> bool:
+        """原始文件是否为分块容器"""
+        return self._open_source()
+
+    @property
+    def data(self) -> Dict:
+        """
+        完整的原始info数据（第一次访问时加载）
+        分块容器源也会读取全部块，只需要子集时应直接索引或迭代
+        """
+        if self._open_source():
+            return {'infos': list(self._reader), 'metadata': self._reader.metadata}
+        self._check_count(len(self._data['infos']))
+        return self._data
+
+    @property
+    def metadata(self) -> Dict:
+        """原始info文件的metadata"""
+        if self._open_source():
+            return self._reader.metadata
+        return self._data.get('metadata', {})
+
+    def _chunk(self, index: int) -> List[Dict]:
+        """读取（或从LRU缓存取出）第index块"""
+        chunk = self._chunk_cache.get(index)
+        if chunk is not None:
+            self._chunk_cache.move_to_end(index)
+            return chunk
+        chunk = self._reader.read_chunk(index)
+        self._chunk_cache[index] = chunk
+        if len(self._chunk_cache) > self.cache_chunks:
+            self._chunk_cache.popitem(last=False)
+        return chunk
+
+    def _infos(self, rows: np.ndarray):
+        """按行号依次产生原始infos"""
+        if not self._open_source():
+            infos = self._data['infos']
+            for i in rows.tolist():
+                yield infos[i]
+            return
+        starts = self._chunk_starts
+        chunk_ids = np.searchsorted(starts, rows, side='right') - 1
+        for chunk_id, row in zip(chunk_ids.tolist(), rows.tolist()):
+            yield self._chunk(chunk_id)[row - starts[chunk_id]]
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self._infos(np.asarray(self.rows[index])))
+        return next(self._infos(np.array([self.rows[index]])))
+
+    def __iter__(self):
+        return self._infos(np.asarray(self.rows))
+
+    def close(self):
+        """关闭分块容器源的mmap读取器（之后再访问会重新打开）"""
+        self._chunk_cache.clear()
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def __enter__(self) -> 'IndexedInfos':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def to_data(self) -> Dict:
+        """
+        组装成与子集info pkl相同结构的字典（{'infos': [...], 'metadata': ...}），
+        可直接替代mmcv.load(ann_file)的结果
+        """
+        return {'infos': list(self), 'metadata': self.metadata}
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NuScenes元数据表容器
+一次性加载版本目录下的所有JSON表，并按需构建可在多次过滤之间共享的向量化索引：
+  - 每张表的token列（定长字节数组）
+  - 排序token索引
+  - 外键列解析后的行号数组（找不到时为-1）
+  - prev/next链表的链头与链内位置（用于删除部分记录后重新连接链表）
+"""
+
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from token_utils import to_token_array, lookup_sorted
+
+
+# 必需的表
+REQUIRED_TABLES = ['sample', 'scene', 'sample_data', 'ego_pose',
+                   'calibrated_sensor', 'sensor', 'log']
+
+# 可选的表（不存在时视为空表）
+OPTIONAL_TABLES = ['category', 'attribute', 'visibility',
+                   'instance', 'sample_annotation']
+
+
+class NuScenesTables:
+    """
+    NuScenes元数据表容器
+    """
+
+    def __init__(self, version_path: str,
+                 table_names: Optional[List[str]] = None,
+                 verbose: bool = True):
+        """
+        加载元数据表
+
+        Args:
+            version_path: 版本目录（如 data/nuscenes/v1.0-trainval）
+            table_names: 要加载的表（默认加载全部必需表和可选表）
+            verbose: 是否打印加载进度
+        """
+        self.version_path = version_path
+        self.verbose = verbose
+        self.tables = {}
+
+        names = table_names or (REQUIRED_TABLES + OPTIONAL_TABLES)
+        for name in names:
+            self.tables[name] = self._load_table(name, required=name not in OPTIONAL_TABLES)
+
+        self._columns = {}
+        self._token_index = {}
+        self._foreign_keys = {}
+        self._chains = {}
+
+    def _load_table(self, name: str, required: bool = True) -> List[Dict]:
+        """加载单张表，可选表不存在时返回空列表"""
+        filepath = os.path.join(self.version_path, f'{name}.json')
+        if not os.path.exists(filepath):
+            if required:
+                raise FileNotFoundError(f"文件不存在: {filepath}")
+            return []
+
+        if self.verbose:
+            print(f"  加载 {name}.json...", end=' ', flush=True)
+        with open(filepath, 'r') as f:
+            data = json.load(f)
+        if self.verbose:
+            print(f"完成 ({len(data)} 条记录)")
+        return data
+
+    def __getitem__(self, name: str) -> List[Dict]:
+        return self.tables[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.tables
+
+    def __len__(self) -> int:
+        return len(self.tables)
+
+    def column(self, table: str, field: str) -> np.ndarray:
+        """
+        获取某张表中token类字段的定长字节数组（缓存）
+        字段缺失的行为空字节串
+        """
+        key = (table, field)
+        if key not in self._columns:
+            self._columns[key] = to_token_array(
+                [row.get(field) or '' for row in self.tables[table]]
+            )
+        return self._columns[key]
+
+    def token_index(self, table: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        获取某张表的排序token索引（缓存）
+
+        Returns:
+            (排序后的token数组, 对应的原始行号)
+        """
+        if table not in self._token_index:
+            tokens = self.column(table, 'token')
+            order = np.argsort(tokens, kind='stable')
+            self._token_index[table] = (tokens[order], order)
+        return self._token_index[table]
+
+    def lookup(self, table: str, tokens) -> np.ndarray:
+        """
+        将一组token解析为某张表中的行号
+
+        Returns:
+            int64行号数组，找不到为-1
+        """
+        sorted_tokens, order = self.token_index(table)
+        pos = lookup_sorted(sorted_tokens, tokens)
+        return np.where(pos >= 0, order[np.maximum(pos, 0)], -1)
+
+    def foreign_key(self, table: str, field: str, target: str) -> np.ndarray:
+        """
+        将table.field外键解析为target表中的行号（缓存）
+
+        Args:
+            table: 外键所在表
+            field: 外键字段名
+            target: 被引用的表
+
+        Returns:
+            与table行数相同的int64数组，引用不存在（或字段为空）时为-1
+        """
+        key = (table, field, target)
+        if key not in self._foreign_keys:
+            self._foreign_keys[key] = self.lookup(target, self.column(table, field))
+        return self._foreign_keys[key]
+
+    def chain_order(self, table: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        沿prev指针计算每行所在链表的链头和链内位置（缓存）
+        使用指针倍增，迭代次数为链长的对数
+
+        Returns:
+            (链头行号, 链内位置) 两个int64数组，链头的位置为0
+        """
+        if table not in self._chains:
+            prev = self.foreign_key(table, 'prev', table)
+            ancestor = np.where(prev >= 0, prev, np.arange(len(prev)))
+            position = (prev >= 0).astype(np.int64)
+            for _ in range(64):
+                jumped = ancestor[ancestor]
+                if np.array_equal(jumped, ancestor):
+                    break
+                position = position + position[ancestor]
+                ancestor = jumped
+            else:
+                raise ValueError(f"{table} 的prev链表存在环")
+            self._chains[table] = (ancestor, position)
+        return self._chains[table]
+
+    def rows(self, table: str, indices: np.ndarray) -> List[Dict]:
+        """按行号取出表中的记录"""
+        rows = self.tables[table]
+        return [rows[i] for i in indices]
+
+
+def mask_from_references(num_rows: int, references: np.ndarray,
+                         selected: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    根据外键行号标记被引用的行
+
+    Args:
+        num_rows: 被引用表的行数
+        references: 外键行号数组（-1表示无引用）
+        selected: 只考虑这些引用方的行（bool掩码，可选）
+
+    Returns:
+        被引用表的bool掩码
+    """
+    if selected is not None:
+        references = references[selected]
+    mask = np.zeros(num_rows, dtype=bool)
+    mask[references[references >= 0]] = True
+    return mask
+
+
+def gather_mask(mask: np.ndarray, references: np.ndarray) -> np.ndarray:
+    """
+    沿外键取出被引用行的掩码值，引用不存在时为False
+
+    Args:
+        mask: 被引用表的bool掩码
+        references: 外键行号数组（-1表示无引用）
+
+    Returns:
+        与references等长的bool数组
+    """
+    valid = references >= 0
+    out = np.zeros(len(references), dtype=bool)
+    out[valid] = mask[references[valid]]
+    return out
+
+
+def relink_chain(tables: NuScenesTables, table: str,
+                 mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    删除部分记录后重新连接prev/next链表：每条保留的记录指向同一链表中前/后最近的保留记录
+
+    Args:
+        tables: 元数据表容器
+        table: 带prev/next字段的表
+        mask: 保留行的bool掩码
+
+    Returns:
+        (保留的行号, 新的prev行号, 新的next行号)，后两者与保留的行号对齐，链表端点为-1
+    """
+    head, position = tables.chain_order(table)
+    kept = np.flatnonzero(mask)
+    order = np.lexsort((position[kept], head[kept]))
+    chained = kept[order]
+    same_chain = head[chained[1:]] == head[chained[:-1]]
+
+    prev = np.full(len(chained), -1, dtype=np.int64)
+    next_ = np.full(len(chained), -1, dtype=np.int64)
+    prev[1:][same_chain] = chained[:-1][same_chain]
+    next_[:-1][same_chain] = chained[1:][same_chain]
+
+    aligned = np.empty_like(order)
+    aligned[order] = np.arange(len(order))
+    return kept, prev[aligned], next_[aligned]
+
+
+def relinked_rows(tables: NuScenesTables, table: str, mask: np.ndarray) -> List[Dict]:
+    """
+    按掩码取出记录，并重新连接prev/next（只复制链接发生变化的记录）
+
+    Returns:
+        按原始顺序排列的保留记录
+    """
+    rows = tables[table]
+    kept, prev, next_ = relink_chain(tables, table, mask)
+    result = []
+    for i, p, n in zip(kept.tolist(), prev.tolist(), next_.tolist()):
+        row = rows[i]
+        prev_token = rows[p]['token'] if p >= 0 else ''
+        next_token = rows[n]['token'] if n >= 0 else ''
+        if row.get('prev', '') != prev_token or row.get('next', '') != next_token:
+            row = dict(row, prev=prev_token, next=next_token)
+        result.append(row)
+    return result
+
+
+def chain_summary(tables: NuScenesTables, table: str, mask: np.ndarray,
+                  owner_field: str, owner_table: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    统计重新连接后每个所属记录（如scene、instance）的链表首尾和长度
+    假设每个所属记录只对应一条链表（如一个scene的samples、一个instance的annotations）
+
+    Args:
+        tables: 元数据表容器
+        table: 带prev/next字段的表（如sample）
+        mask: 保留行的bool掩码
+        owner_field: 指向所属记录的外键字段（如scene_token）
+        owner_table: 所属记录的表（如scene）
+
+    Returns:
+        (首行号, 尾行号, 保留行数)，均与owner_table的行对齐，没有保留行时首尾为-1
+    """
+    kept, prev, next_ = relink_chain(tables, table, mask)
+    owner = tables.foreign_key(table, owner_field, owner_table)[kept]
+    num_owners = len(tables[owner_table])
+
+    first = np.full(num_owners, -1, dtype=np.int64)
+    last = np.full(num_owners, -1, dtype=np.int64)
+    heads = (prev < 0) & (owner >= 0)
+    tails = (next_ < 0) & (owner >= 0)
+    first[owner[heads]] = kept[heads]
+    last[owner[tails]] = kept[tails]
+    count = np.bincount(owner[owner >= 0], minlength=num_owners)
+    return first, last, count
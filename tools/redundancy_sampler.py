@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+冗余度加权采样器
+直接在完整的info文件上按冗余度和类别加权采样，每种混合比例都不需要重新生成pkl。
+与具体训练框架无关：按epoch产生样本下标序列，并支持按rank和DataLoader worker分片
+"""
+
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+import numpy as np
+from redundancy_utils import RedundancySplitLoader, REDUNDANCY_CATEGORIES
+from token_utils import lookup_sorted
+
+
+# 权重函数：输入(每个样本的冗余度, 类别编码)，返回非负权重；不在划分结果中的样本类别编码为-1、冗余度为NaN
+WeightFn = Callable[[np.ndarray, np.ndarray], np.ndarray]
+
+
+def align_to_dataset(loader: RedundancySplitLoader,
+                     tokens: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    将划分结果中的类别编码和sample冗余度对齐到数据集下标
+
+    Args:
+        loader: 冗余度划分结果加载器
+        tokens: 数据集中每个样本的sample token（按数据集下标顺序）
+
+    Returns:
+        (int8类别编码数组（不在划分结果中为-1）, float64冗余度数组（不在划分结果中为NaN）)
+    """
+    sorted_tokens, codes = loader.get_token_arrays('sample')
+    redundancy = loader.get_sample_redundancy()
+    pos = lookup_sorted(sorted_tokens, tokens)
+    found = pos >= 0
+    category = np.where(found, codes[np.maximum(pos, 0)], -1).astype(np.int8)
+    return category, np.where(found, redundancy[np.maximum(pos, 0)], np.nan)
+
+
+def build_alias_table(weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    构建Walker/Vose别名表，之后每次按权重抽样为O(1)
+
+    Args:
+        weights: 正权重数组
+
+    Returns:
+        (接受概率数组, 别名下标数组)
+    """
+    n = len(weights)
+    scaled = weights * (n / weights.sum())
+    prob = np.ones(n)
+    alias = np.arange(n)
+
+    small = np.flatnonzero(scaled < 1.0).tolist()
+    large = np.flatnonzero(scaled >= 1.0).tolist()
+    scaled = scaled.tolist()
+    while small and large:
+        s = small.pop()
+        l = large[-1]
+        prob[s] = scaled[s]
+        alias[s] = l
+        scaled[l] -= 1.0 - scaled[s]
+        if scaled[l] < 1.0:
+            large.pop()
+            small.append(l)
+    # 剩余项的概率因浮点误差可能略偏离1，直接视为1
+    return prob, alias
+
+
+def redundancy_power_weight(alpha: float = 1.0, floor: float = 0.05) -> WeightFn:
+    """
+    权重函数：(1 - 冗余度)^alpha，冗余度越低权重越高
+
+    Args:
+        alpha: 指数（0表示不按冗余度加权）
+        floor: 权重下限，避免完全冗余的样本永远不被抽到
+    """
+    def weight(redundancy: np.ndarray, category: np.ndarray) -> np.ndarray:
+        base = np.clip(1.0 - np.nan_to_num(redundancy, nan=1.0), 0.0, 1.0)
+        return np.maximum(base ** alpha, floor)
+    return weight
+
+
+class RedundancyWeightedSampler:
+    """
+    冗余度加权采样器
+    样本权重 = 类别权重 × weight_fn(冗余度, 类别)。权重的含义是"每个epoch期望被抽到的次数"：
+    例如类别权重 {'low_redundancy': 0.7, 'medium_redundancy': 0.3} 与
+    create_custom_split(low_ratio=0.7, medium_ratio=0.3) 的期望样本构成相同
+    """
+
+    def __init__(self, loader: RedundancySplitLoader, tokens: Iterable[str],
+                 category_weights: Optional[Dict[str, float]] = None,
+                 weight_fn: Optional[WeightFn] = None,
+                 sample_weights: Optional[np.ndarray] = None,
+                 num_samples: Optional[int] = None,
+                 replacement: bool = True,
+                 num_replicas: int = 1, rank: int = 0,
+                 seed: int = 0):
+        """
+        初始化采样器
+
+        Args:
+            loader: 冗余度划分结果加载器
+            tokens: 数据集中每个样本的sample token（按数据集下标顺序，如 [info['token'] for info in infos]）
+            category_weights: 各类别权重（缺省的类别为1.0；不在划分结果中的样本权重为0）
+            weight_fn: 按冗余度和类别计算权重的函数（与类别权重相乘）
+            sample_weights: 逐样本权重（按数据集下标顺序，如hard_example_mining输出的采样权重，与上述权重相乘）
+            num_samples: 每个epoch（所有rank合计）抽取的样本数，默认为权重之和（四舍五入）
+            replacement: 是否有放回抽样（有放回时使用别名表O(1)抽样）
+            num_replicas: 分布式训练的总进程数
+            rank: 当前进程的rank
+            seed: 随机种子（所有rank必须相同）
+        """
+        if not 0 <= rank < num_replicas:
+            raise ValueError(f"rank必须在[0, {num_replicas})内: {rank}")
+
+        self.category, self.redundancy = align_to_dataset(loader, tokens)
+
+        category_weights = dict(category_weights or {})
+        unknown = set(category_weights) - set(REDUNDANCY_CATEGORIES)
+        if unknown:
+            raise ValueError(f"未知的冗余度类别: {', '.join(sorted(unknown))}")
+        table = np.array([category_weights.get(c, 1.0) for c in REDUNDANCY_CATEGORIES] + [0.0])
+        weights = table[self.category]
+        if weight_fn is not None:
+            weights = weights * np.asarray(weight_fn(self.redundancy, self.category), dtype=np.float64)
+        if sample_weights is not None:
+            sample_weights = np.asarray(sample_weights, dtype=np.float64)
+            if sample_weights.shape != weights.shape:
+                raise ValueError(f"sample_weights的长度({len(sample_weights)})与数据集样本数({len(weights)})不一致")
+            weights = weights * sample_weights
+        if np.any(weights < 0) or not np.all(np.isfinite(weights)):
+            raise ValueError("样本权重必须为非负有限值")
+        if weights.sum() <= 0:
+            raise ValueError("所有样本的权重均为0")
+        self.weights = weights
+
+        self.support = np.flatnonzero(weights > 0)
+        if num_samples is None:
+            num_samples = max(int(round(weights.sum())), 1)
+        if not replacement and num_samples > len(self.support):
+            raise ValueError(f"无放回抽样的样本数({num_samples})超过权重为正的样本数({len(self.support)})")
+        self.num_samples = num_samples
+        self.replacement = replacement
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.seed = seed
+        self.epoch = 0
+        self.worker_id = 0
+        self.num_workers = 1
+
+        # 每个rank的样本数相同：总数向上补齐为num_replicas的整数倍
+        # （无放回时先抽num_samples个不同样本，再像DistributedSampler一样循环补齐）
+        self.num_samples_per_replica = -(-num_samples // num_replicas)
+        self.total_size = self.num_samples_per_replica * num_replicas
+        self._prob, self._alias = build_alias_table(weights[self.support])
+
+    @classmethod
+    def from_infos(cls, loader: RedundancySplitLoader, infos: Iterable[Dict],
+                   **kwargs) -> 'RedundancyWeightedSampler':
+        """由info列表（或IndexedInfos等可迭代对象）创建采样器"""
+        return cls(loader, [info.get('token') or '' for info in infos], **kwargs)
+
+    def set_epoch(self, epoch: int):
+        """设置当前epoch（每个epoch的抽样序列由seed和epoch唯一确定）"""
+        self.epoch = epoch
+
+    def set_worker(self, worker_id: int, num_workers: int):
+        """
+        在DataLoader worker中按worker进一步分片（用于IterableDataset等在worker内迭代采样器的场景）
+        """
+        if not 0 <= worker_id < num_workers:
+            raise ValueError(f"worker_id必须在[0, {num_workers})内: {worker_id}")
+        self.worker_id = worker_id
+        self.num_workers = num_workers
+
+    def epoch_indices(self, epoch: Optional[int] = None) -> np.ndarray:
+        """
+        生成某个epoch所有rank合计的抽样序列（各rank计算结果相同）
+
+        Returns:
+            长度为total_size的数据集下标数组（无放回时前num_samples个互不相同，其后循环补齐）
+        """
+        epoch = self.epoch if epoch is None else epoch
+        rng = np.random.default_rng([self.seed, epoch])
+        n = len(self.support)
+        if self.replacement:
+            slots = rng.integers(0, n, self.total_size)
+            accept = rng.random(self.total_size) < self._prob[slots]
+            picked = np.where(accept, slots, self._alias[slots])
+        else:
+            # Efraimidis-Spirakis：按 u^(1/w) 取最大的k个，等价于按权重逐个无放回抽取
+            keys = np.log(rng.random(n)) / self.weights[self.support]
+            picked = np.argpartition(-keys, self.num_samples - 1)[:self.num_samples]
+            picked = np.resize(picked[rng.permutation(self.num_samples)], self.total_size)
+        return self.support[picked]
+
+    def shard_indices(self, epoch: Optional[int] = None) -> np.ndarray:
+        """当前rank（及worker）在某个epoch的下标序列"""
+        indices = self.epoch_indices(epoch)[self.rank::self.num_replicas]
+        return indices[self.worker_id::self.num_workers]
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.shard_indices().tolist())
+
+    def __len__(self) -> int:
+        per_replica = len(range(self.rank, self.total_size, self.num_replicas))
+        return len(range(self.worker_id, per_replica, self.num_workers))
+
+    def inclusion_probabilities(self) -> np.ndarray:
+        """
+        无放回时每个样本在一个epoch的前num_samples个抽样中出现的概率
+        按权重逐个无放回抽取的入选概率没有闭式解，这里使用Rosén的近似：
+        π_i = 1 - exp(-w_i·t)，t由 Σπ_i = num_samples 二分求得
+        （权重相差不大或抽样比例较小时接近 num_samples·w_i/Σw，抽样比例接近1时趋于1）
+
+        Returns:
+            与数据集等长的概率数组
+        """
+        weights = self.weights[self.support]
+        k = self.num_samples
+        pi = np.zeros(len(self.weights))
+        if k >= len(weights):
+            pi[self.support] = 1.0
+            return pi
+
+        def total(t):
+            return float(-np.expm1(-weights * t).sum())
+
+        low, high = 0.0, 1.0 / weights.max()
+        while total(high) < k:
+            low, high = high, high * 2
+        for _ in range(100):
+            mid = (low + high) / 2
+            if total(mid) < k:
+                low = mid
+            else:
+                high = mid
+        pi[self.support] = -np.expm1(-weights * (low + high) / 2)
+        return pi
+
+    def expected_category_counts(self) -> Dict[str, float]:
+        """
+        每个epoch（所有rank合计）各类别的期望抽样数
+        有放回时与权重份额成正比；无放回时按近似入选概率计算（见inclusion_probabilities），
+        补齐部分从已抽到的样本中均匀重复，按相同比例计入
+        """
+        if self.replacement:
+            share = self.weights / self.weights.sum() * self.total_size
+        else:
+            share = self.inclusion_probabilities() * (self.total_size / self.num_samples)
+        return {category: float(share[self.category == code].sum())
+                for code, category in enumerate(REDUNDANCY_CATEGORIES)}
@@ -8,8 +8,215 @@
 import pickle
 import json
 import os
-from typing import List, Dict, Set, Optional
+from typing import List, Dict, Set, Optional, Tuple
 import numpy as np
+from token_utils import sort_tokens, lookup_sorted
+from io_utils import atomic_open
+
+
+# 冗余度类别（按固定顺序，类别编码即为其在列表中的下标）
+REDUNDANCY_CATEGORIES = ['high_redundancy', 'medium_redundancy', 'low_redundancy']
+
+# 统计块中直方图的默认分箱数
+NUM_VELOCITY_BINS = 30
+NUM_REDUNDANCY_BINS = 20
+
+# 箱线图须线范围（四分位距的倍数，与matplotlib boxplot默认值一致）及保存的离群点上限
+BOX_WHIS = 1.5
+MAX_BOX_FLIERS = 200
+
+
+def _summarize(values: np.ndarray) -> Dict:
+    """计算一组数值的均值、中位数、标准差和范围（空数组时全部为0）"""
+    if len(values) == 0:
+        return {'mean': 0.0, 'median': 0.0, 'std': 0.0, 'min': 0.0, 'max': 0.0}
+    return {
+        'mean': float(values.mean()),
+        'median': float(np.median(values)),
+        'std': float(values.std()),
+        'min': float(values.min()),
+        'max': float(values.max()),
+    }
+
+
+def _box_stats(values: np.ndarray, max_fliers: int = MAX_BOX_FLIERS) -> Dict:
+    """
+    计算箱线图统计量（键与matplotlib Axes.bxp的输入一致）
+    离群点超过max_fliers个时按排序均匀抽取，保证统计块大小与数据量无关
+    """
+    if len(values) == 0:
+        return {'med': 0.0, 'q1': 0.0, 'q3': 0.0, 'whislo': 0.0, 'whishi': 0.0,
+                'mean': 0.0, 'fliers': []}
+    q1, med, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    inside = values[(values >= q1 - BOX_WHIS * iqr) & (values <= q3 + BOX_WHIS * iqr)]
+    fliers = np.sort(values[(values < q1 - BOX_WHIS * iqr) | (values > q3 + BOX_WHIS * iqr)])
+    if len(fliers) > max_fliers:
+        fliers = fliers[np.linspace(0, len(fliers) - 1, max_fliers).astype(np.int64)]
+    return {
+        'med': float(med),
+        'q1': float(q1),
+        'q3': float(q3),
+        'whislo': float(inside.min()) if len(inside) else float(q1),
+        'whishi': float(inside.max()) if len(inside) else float(q3),
+        'mean': float(values.mean()),
+        'fliers': fliers.tolist(),
+    }
+
+
+def compute_split_statistics(split_result: Dict,
+                             num_velocity_bins: int = NUM_VELOCITY_BINS,
+                             num_redundancy_bins: int = NUM_REDUNDANCY_BINS) -> Dict:
+    """
+    计算划分结果的统计块
+    每个类别只遍历一次scene列表，之后全部为向量化计算；
+    所有类别共用同一组直方图分箱边界，便于叠加绘图
+    
+    Args:
+        split_result: 划分结果（包含三个类别的scene列表）
+        num_velocity_bins: 速率直方图分箱数
+        num_redundancy_bins: 冗余度直方图分箱数（范围固定为[0, 1]）
+        
+    Returns:
+        统计块字典，可直接保存在划分结果的'statistics'键中
+    """
+    arrays = {}
+    for category in REDUNDANCY_CATEGORIES:
+        scenes = split_result[category]
+        n = len(scenes)
+        arrays[category] = (
+            np.fromiter((s['avg_velocity'] for s in scenes), dtype=np.float64, count=n),
+            np.fromiter((s['avg_redundancy'] for s in scenes), dtype=np.float64, count=n),
+            np.fromiter((s['num_samples'] for s in scenes), dtype=np.int64, count=n),
+        )
+    
+    all_velocities = np.concatenate([a[0] for a in arrays.values()])
+    velocity_edges = np.histogram_bin_edges(all_velocities, bins=num_velocity_bins)
+    redundancy_edges = np.linspace(0.0, 1.0, num_redundancy_bins + 1)
+    
+    categories = {}
+    for category, (velocities, redundancies, num_samples) in arrays.items():
+        categories[category] = {
+            'num_scenes': int(len(num_samples)),
+            'num_samples': int(num_samples.sum()),
+            'velocity_stats': _summarize(velocities),
+            'redundancy_stats': _summarize(redundancies),
+            'velocity_box': _box_stats(velocities),
+            'redundancy_box': _box_stats(redundancies),
+            'velocity_hist': np.histogram(velocities, bins=velocity_edges)[0].tolist(),
+            'redundancy_hist': np.histogram(redundancies, bins=redundancy_edges)[0].tolist(),
+        }
+    
+    return {
+        'total_scenes': sum(c['num_scenes'] for c in categories.values()),
+        'total_samples': sum(c['num_samples'] for c in categories.values()),
+        'velocity_bin_edges': velocity_edges.tolist(),
+        'redundancy_bin_edges': redundancy_edges.tolist(),
+        'categories': categories
+    }
+
+
+# 逐帧对速率/冗余度序列文件名（与划分结果保存在同一目录）
+SERIES_FILENAME = 'redundancy_series.npz'
+
+
+def save_redundancy_series(analysis_results: List[Dict], output_path: str):
+    """
+    将每个scene逐帧对的速率和冗余度序列保存为紧凑的二进制文件
+    所有scene的序列拼接为float32数组，scene i的序列为 [offsets[i], offsets[i+1])，
+    其中第j个值对应 sample_tokens[j] 与 sample_tokens[j+1] 之间的帧对
+    
+    Args:
+        analysis_results: analyze_all_scenes的返回值
+        output_path: 输出文件路径（.npz）
+    """
+    lengths = np.fromiter((len(r['velocities']) for r in analysis_results),
+                          dtype=np.int64, count=len(analysis_results))
+    offsets = np.zeros(len(analysis_results) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    
+    velocities = np.fromiter(
+        (v for r in analysis_results for v in r['velocities']),
+        dtype=np.float32, count=int(offsets[-1])
+    )
+    redundancy_scores = np.fromiter(
+        (v for r in analysis_results for v in r['redundancy_scores']),
+        dtype=np.float32, count=int(offsets[-1])
+    )
+    scene_tokens = np.array([r['scene_token'] for r in analysis_results], dtype='S')
+    
+    with atomic_open(output_path, 'wb') as f:
+        np.savez(f,
+                 scene_tokens=scene_tokens,
+                 offsets=offsets,
+                 velocities=velocities,
+                 redundancy_scores=redundancy_scores)
+
+
+def get_split_statistics(split_result: Dict) -> Dict:
+    """
+    获取划分结果的统计块
+    新版划分结果中已保存统计块，直接返回；旧版结果（或缺少箱线图统计量的统计块）则现场计算
+    """
+    statistics = split_result.get('statistics')
+    if statistics is None or 'velocity_box' not in statistics['categories'][REDUNDANCY_CATEGORIES[0]]:
+        statistics = compute_split_statistics(split_result)
+    return statistics
+
+
+def compute_pair_statistics(split_result: Dict, series: Dict,
+                            num_velocity_bins: int = NUM_VELOCITY_BINS * 2,
+                            num_redundancy_bins: int = NUM_REDUNDANCY_BINS * 2) -> Dict:
+    """
+    在逐帧对序列上计算各类别的帧对级统计（直方图、箱线图统计量及速率-冗余度二维直方图）
+    帧对通过scene token连接到类别，全部为向量化计算，可直接处理数百万个帧对
+    
+    Args:
+        split_result: 划分结果
+        series: 逐帧对序列（scene_tokens/offsets/velocities/redundancy_scores数组）
+        num_velocity_bins: 速率分箱数
+        num_redundancy_bins: 冗余度分箱数（范围固定为[0, 1]）
+        
+    Returns:
+        帧对级统计块，结构与compute_split_statistics类似，另含'joint_hist'二维直方图
+    """
+    scene_tokens, scene_codes = sort_tokens(
+        [s['scene_token'] for c in REDUNDANCY_CATEGORIES for s in split_result[c]],
+        np.concatenate([np.full(len(split_result[c]), i, dtype=np.int8)
+                        for i, c in enumerate(REDUNDANCY_CATEGORIES)])
+    )
+    pos = lookup_sorted(scene_tokens, series['scene_tokens'])
+    codes = np.where(pos >= 0, scene_codes[np.maximum(pos, 0)], -1)
+    pair_codes = np.repeat(codes, np.diff(series['offsets']))
+    velocities = np.asarray(series['velocities'], dtype=np.float64)
+    redundancies = np.asarray(series['redundancy_scores'], dtype=np.float64)
+    
+    finite = np.isfinite(velocities) & np.isfinite(redundancies)
+    velocity_edges = np.histogram_bin_edges(velocities[finite & (pair_codes >= 0)],
+                                            bins=num_velocity_bins)
+    redundancy_edges = np.linspace(0.0, 1.0, num_redundancy_bins + 1)
+    
+    categories = {}
+    for code, category in enumerate(REDUNDANCY_CATEGORIES):
+        selected = finite & (pair_codes == code)
+        v, r = velocities[selected], redundancies[selected]
+        categories[category] = {
+            'num_pairs': int(selected.sum()),
+            'velocity_stats': _summarize(v),
+            'redundancy_stats': _summarize(r),
+            'velocity_box': _box_stats(v),
+            'redundancy_box': _box_stats(r),
+            'velocity_hist': np.histogram(v, bins=velocity_edges)[0].tolist(),
+            'redundancy_hist': np.histogram(r, bins=redundancy_edges)[0].tolist(),
+            'joint_hist': np.histogram2d(v, r, bins=(velocity_edges, redundancy_edges))[0].tolist(),
+        }
+    
+    return {
+        'total_pairs': sum(c['num_pairs'] for c in categories.values()),
+        'velocity_bin_edges': velocity_edges.tolist(),
+        'redundancy_bin_edges': redundancy_edges.tolist(),
+        'categories': categories
+    }
 
 
 class RedundancySplitLoader:
@@ -18,15 +225,23 @@ class RedundancySplitLoader:
     提供方便的API来访问和使用划分结果
     """
     
-    def __init__(self, split_path: str):
+    def __init__(self, split_path: str, series_path: Optional[str] = None):
         """
         初始化加载器
         
         Args:
             split_path: 划分结果文件路径（.pkl或.json）
+            series_path: 逐帧对序列文件路径（默认为划分结果同目录下的redundancy_series.npz）
         """
         self.split_path = split_path
+        self.series_path = series_path or os.path.join(
+            os.path.dirname(split_path), SERIES_FILENAME
+        )
         self.split_result = self._load_split()
+        self._token_arrays = {}
+        self._sample_redundancy = None
+        self._statistics = None
+        self._series = None
         self._build_indices()
     
     def _load_split(self) -> Dict:
@@ -51,7 +266,7 @@ class RedundancySplitLoader:
         # 场景token到场景信息的映射
         self.scene_info_dict = {}
         
-        for category in ['high_redundancy', 'medium_redundancy', 'low_redundancy']:
+        for category in REDUNDANCY_CATEGORIES:
             for scene_info in self.split_result[category]:
                 scene_token = scene_info['scene_token']
                 self.scene_to_category[scene_token] = category
@@ -112,6 +327,74 @@ class RedundancySplitLoader:
             sample_tokens.extend(scene_info['sample_tokens'])
         return sample_tokens
     
+    def get_token_arrays(self, level: str = 'sample') -> Tuple[np.ndarray, np.ndarray]:
+        """
+        获取排序后的定长token数组及对应的类别编码
+        类别编码为该类别在REDUNDANCY_CATEGORIES中的下标，结果会被缓存
+        
+        Args:
+            level: 'sample' 或 'scene'
+            
+        Returns:
+            (排序后的token数组, int8类别编码数组)
+        """
+        if level not in ('sample', 'scene'):
+            raise ValueError(f"不支持的level: {level}，请使用'sample'或'scene'")
+        
+        if level not in self._token_arrays:
+            mapping = self.sample_to_category if level == 'sample' else self.scene_to_category
+            codes = np.fromiter(
+                (REDUNDANCY_CATEGORIES.index(c) for c in mapping.values()),
+                dtype=np.int8, count=len(mapping)
+            )
+            self._token_arrays[level] = sort_tokens(list(mapping.keys()), codes)
+        
+        return self._token_arrays[level]
+    
+    def get_sample_redundancy(self) -> np.ndarray:
+        """
+        获取每个sample的冗余度分数，与get_token_arrays('sample')的排序token数组对齐（结果会被缓存）
+        sample的分数为其前后两个帧对冗余度的均值（首尾sample只有一个相邻帧对）；
+        没有逐帧对序列文件或scene不在序列中时，使用scene的平均冗余度
+        
+        Returns:
+            float64冗余度数组
+        """
+        if self._sample_redundancy is None:
+            sorted_tokens, _ = self.get_token_arrays('sample')
+            try:
+                series = self._load_series()
+            except FileNotFoundError:
+                series = None
+            
+            tokens = []
+            values = []
+            for scene_token, scene_info in self.scene_info_dict.items():
+                sample_tokens = scene_info['sample_tokens']
+                n = len(sample_tokens)
+                scores = np.full(n, scene_info['avg_redundancy'], dtype=np.float64)
+                i = series['scene_index'].get(scene_token) if series is not None else None
+                if i is not None and n > 1:
+                    start, end = series['offsets'][i], series['offsets'][i + 1]
+                    pairs = series['redundancy_scores'][start:end].astype(np.float64)
+                    if len(pairs) == n - 1:
+                        total = np.zeros(n)
+                        count = np.zeros(n)
+                        total[:-1] += pairs
+                        total[1:] += pairs
+                        count[:-1] += 1
+                        count[1:] += 1
+                        scores = total / count
+                tokens.extend(sample_tokens)
+                values.append(scores)
+            
+            redundancy = np.full(len(sorted_tokens), np.nan)
+            if tokens:
+                redundancy[lookup_sorted(sorted_tokens, tokens)] = np.concatenate(values)
+            self._sample_redundancy = redundancy
+        
+        return self._sample_redundancy
+    
     def get_scenes_by_category(self, category: str) -> List[Dict]:
         """
         获取指定类别的所有场景信息
@@ -174,7 +457,7 @@ class RedundancySplitLoader:
         val_samples = []
         test_samples = []
         
-        for category in ['high_redundancy', 'medium_redundancy', 'low_redundancy']:
+        for category in REDUNDANCY_CATEGORIES:
             if by_scene:
                 # 按场景划分
                 scenes = self.split_result[category]
@@ -251,42 +534,71 @@ class RedundancySplitLoader:
         
         return low_samples + selected_medium
     
-    def get_statistics(self) -> Dict:
+    def _load_series(self) -> Dict:
+        """按需加载逐帧对序列（只加载一次）"""
+        if self._series is None:
+            if not os.path.exists(self.series_path):
+                raise FileNotFoundError(
+                    f"找不到逐帧对序列文件: {self.series_path}，"
+                    f"请使用新版split_by_redundancy.py重新生成划分结果"
+                )
+            with np.load(self.series_path) as data:
+                series = {key: data[key] for key in data.files}
+            series['scene_index'] = {
+                token.decode(): i for i, token in enumerate(series['scene_tokens'])
+            }
+            self._series = series
+        return self._series
+    
+    def get_series(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
         """
-        获取统计信息
+        获取所有scene拼接后的逐帧对序列
         
         Returns:
-            包含各类别统计信息的字典
+            (offsets, velocities, redundancy_scores)，
+            scene i的序列为 [offsets[i], offsets[i+1])
         """
-        stats = {}
+        series = self._load_series()
+        return series['offsets'], series['velocities'], series['redundancy_scores']
+    
+    def get_scene_series(self, scene_token: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        获取某个scene逐帧对的速率和冗余度序列
+        返回的是拼接数组的视图，不会复制数据
         
-        for category in ['high_redundancy', 'medium_redundancy', 'low_redundancy']:
-            scenes = self.split_result[category]
-            sample_tokens = self.get_samples_by_category(category)
-            
-            velocities = [s['avg_velocity'] for s in scenes]
-            redundancies = [s['avg_redundancy'] for s in scenes]
+        Args:
+            scene_token: scene token
             
-            stats[category] = {
-                'num_scenes': len(scenes),
-                'num_samples': len(sample_tokens),
-                'velocity_stats': {
-                    'mean': float(np.mean(velocities)) if velocities else 0,
-                    'median': float(np.median(velocities)) if velocities else 0,
-                    'std': float(np.std(velocities)) if velocities else 0,
-                    'min': float(np.min(velocities)) if velocities else 0,
-                    'max': float(np.max(velocities)) if velocities else 0,
-                },
-                'redundancy_stats': {
-                    'mean': float(np.mean(redundancies)) if redundancies else 0,
-                    'median': float(np.median(redundancies)) if redundancies else 0,
-                    'std': float(np.std(redundancies)) if redundancies else 0,
-                    'min': float(np.min(redundancies)) if redundancies else 0,
-                    'max': float(np.max(redundancies)) if redundancies else 0,
-                }
-            }
+        Returns:
+            (velocities, redundancy_scores)，均为float32数组，
+            第j个值对应该scene第j与第j+1个sample之间的帧对
+        """
+        series = self._load_series()
+        i = series['scene_index'].get(scene_token)
+        if i is None:
+            raise KeyError(f"Scene token {scene_token} 不在逐帧对序列中")
+        start, end = series['offsets'][i], series['offsets'][i + 1]
+        return series['velocities'][start:end], series['redundancy_scores'][start:end]
+    
+    def get_split_statistics(self) -> Dict:
+        """
+        获取完整的统计块（包含总数和直方图分箱边界）
         
-        return stats
+        Returns:
+            统计块字典
+        """
+        if self._statistics is None:
+            self._statistics = get_split_statistics(self.split_result)
+        return self._statistics
+    
+    def get_statistics(self) -> Dict:
+        """
+        获取统计信息
+        
+        Returns:
+            包含各类别统计信息的字典
+        """
+        return self.get_split_statistics()['categories']
     
     def print_summary(self):
         """打印摘要信息"""
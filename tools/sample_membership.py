@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+样本成员结构的导出与加载
+为每个冗余度类别导出紧凑的成员测试结构，供dataloader在加载时判断sample是否属于子集：
+  - 排序的定长token数组（.npy，可mmap，精确测试）
+  - 可选的Bloom过滤器（.npz，可配置假阳性率，近似测试）
+"""
+
+import os
+import math
+from typing import Iterable, Optional, Dict
+import numpy as np
+from token_utils import to_token_array, isin_sorted
+from io_utils import atomic_open
+
+
+# FNV-1a 64位哈希参数，第二个哈希使用不同的初始值
+_FNV_PRIME = np.uint64(0x100000001b3)
+_FNV_OFFSETS = (np.uint64(0xcbf29ce484222325), np.uint64(0x84222325cbf29ce4))
+
+
+def _hash_tokens(tokens: np.ndarray):
+    """
+    对定长token数组做向量化的双重FNV-1a哈希
+    跳过补齐用的空字节，因此结果与数组宽度无关
+
+    Returns:
+        (h1, h2) 两个uint64数组
+    """
+    n = len(tokens)
+    if n == 0:
+        empty = np.empty(0, dtype=np.uint64)
+        return empty, empty
+    width = tokens.dtype.itemsize
+    data = np.frombuffer(np.ascontiguousarray(tokens).tobytes(), dtype=np.uint8)
+    data = data.reshape(n, width).astype(np.uint64)
+
+    hashes = []
+    with np.errstate(over='ignore'):
+        for offset in _FNV_OFFSETS:
+            h = np.full(n, offset, dtype=np.uint64)
+            for col in range(width):
+                byte = data[:, col]
+                h = np.where(byte != 0, (h ^ byte) * _FNV_PRIME, h)
+            hashes.append(h)
+    # 第二个哈希必须为奇数，保证双重哈希能遍历所有位
+    return hashes[0], hashes[1] | np.uint64(1)
+
+
+class BloomFilter:
+    """
+    基于numpy位数组的Bloom过滤器
+    """
+
+    def __init__(self, bits: np.ndarray, num_bits: int, num_hashes: int):
+        """
+        初始化
+
+        Args:
+            bits: packbits后的uint8位数组
+            num_bits: 位数组长度
+            num_hashes: 哈希函数个数
+        """
+        self.bits = bits
+        self.num_bits = int(num_bits)
+        self.num_hashes = int(num_hashes)
+
+    @classmethod
+    def from_tokens(cls, tokens: Iterable[str], fp_rate: float = 0.01) -> 'BloomFilter':
+        """
+        根据token集合和目标假阳性率构建Bloom过滤器
+
+        Args:
+            tokens: token序列
+            fp_rate: 目标假阳性率 (0, 1)
+        """
+        if not 0 < fp_rate < 1:
+            raise ValueError(f"假阳性率必须在(0, 1)之间: {fp_rate}")
+
+        tokens = to_token_array(tokens)
+        n = max(len(tokens), 1)
+        num_bits = max(8, int(math.ceil(-n * math.log(fp_rate) / (math.log(2) ** 2))))
+        num_hashes = max(1, int(round(num_bits / n * math.log(2))))
+
+        bloom = cls(np.zeros((num_bits + 7) // 8, dtype=np.uint8), num_bits, num_hashes)
+        unpacked = np.zeros(num_bits, dtype=bool)
+        for positions in bloom._positions(tokens):
+            unpacked[positions] = True
+        bloom.bits = np.packbits(unpacked)
+        return bloom
+
+    def _positions(self, tokens: np.ndarray):
+        """依次产生每个哈希函数对应的位位置"""
+        h1, h2 = _hash_tokens(tokens)
+        m = np.uint64(self.num_bits)
+        with np.errstate(over='ignore'):
+            for i in range(self.num_hashes):
+                yield ((h1 + np.uint64(i) * h2) % m).astype(np.int64)
+
+    def contains(self, tokens: Iterable[str]) -> np.ndarray:
+        """
+        批量成员测试（可能有假阳性，不会有假阴性）
+
+        Returns:
+            bool数组
+        """
+        tokens = to_token_array(tokens)
+        result = np.ones(len(tokens), dtype=bool)
+        for positions in self._positions(tokens):
+            byte = self.bits[positions >> 3]
+            result &= ((byte >> (7 - (positions & 7)).astype(np.uint8)) & 1).astype(bool)
+        return result
+
+    def save(self, path: str):
+        """保存为.npz文件（原子写入）"""
+        with atomic_open(path, 'wb') as f:
+            np.savez(f, bits=self.bits,
+                     num_bits=np.int64(self.num_bits),
+                     num_hashes=np.int64(self.num_hashes))
+
+    @classmethod
+    def load(cls, path: str) -> 'BloomFilter':
+        """从.npz文件加载"""
+        with np.load(path) as data:
+            return cls(data['bits'], int(data['num_bits']), int(data['num_hashes']))
+
+
+class SampleMembership:
+    """
+    样本成员测试结构
+    优先使用排序token数组做精确测试；只有Bloom过滤器时做近似测试
+    """
+
+    def __init__(self,
+                 sorted_tokens: Optional[np.ndarray] = None,
+                 bloom: Optional[BloomFilter] = None):
+        """
+        初始化
+
+        Args:
+            sorted_tokens: 排序的定长token数组
+            bloom: Bloom过滤器
+        """
+        if sorted_tokens is None and bloom is None:
+            raise ValueError("sorted_tokens和bloom至少需要提供一个")
+        self.sorted_tokens = sorted_tokens
+        self.bloom = bloom
+
+    @property
+    def exact(self) -> bool:
+        """是否为精确测试"""
+        return self.sorted_tokens is not None
+
+    def contains(self, tokens: Iterable[str]) -> np.ndarray:
+        """
+        批量成员测试
+
+        Args:
+            tokens: 待测试的sample token序列
+
+        Returns:
+            bool数组
+        """
+        if self.sorted_tokens is not None:
+            return isin_sorted(self.sorted_tokens, tokens)
+        return self.bloom.contains(tokens)
+
+    def __contains__(self, token: str) -> bool:
+        return bool(self.contains([token])[0])
+
+    def __len__(self) -> int:
+        if self.sorted_tokens is None:
+            raise TypeError("仅有Bloom过滤器时无法获取成员数量")
+        return len(self.sorted_tokens)
+
+
+def membership_paths(output_dir: str, category: str) -> Dict[str, str]:
+    """返回某个类别成员结构的文件路径"""
+    return {
+        'tokens': os.path.join(output_dir, f'{category}_sample_tokens.npy'),
+        'bloom': os.path.join(output_dir, f'{category}_sample_bloom.npz')
+    }
+
+
+def export_sample_membership(sample_tokens: Iterable[str],
+                             output_dir: str,
+                             category: str,
+                             bloom_fp_rate: Optional[float] = None) -> Dict[str, str]:
+    """
+    导出某个类别的成员结构
+
+    Args:
+        sample_tokens: 该类别的sample token序列
+        output_dir: 输出目录
+        category: 类别名称
+        bloom_fp_rate: Bloom过滤器假阳性率，为None时不导出Bloom过滤器
+
+    Returns:
+        实际写出的文件路径字典
+    """
+    paths = membership_paths(output_dir, category)
+    tokens = np.unique(to_token_array(sample_tokens))
+
+    written = {}
+    with atomic_open(paths['tokens'], 'wb') as f:
+        np.save(f, tokens)
+    written['tokens'] = paths['tokens']
+
+    if bloom_fp_rate is not None:
+        BloomFilter.from_tokens(tokens, bloom_fp_rate).save(paths['bloom'])
+        written['bloom'] = paths['bloom']
+
+    return written
+
+
+def load_sample_membership(split_dir: str,
+                           category: str,
+                           prefer_bloom: bool = False,
+                           mmap: bool = True) -> SampleMembership:
+    """
+    加载某个类别的成员结构
+
+    Args:
+        split_dir: 划分结果目录（save_split的输出目录）
+        category: 类别名称
+        prefer_bloom: 是否只加载Bloom过滤器（内存更小，但有假阳性）
+        mmap: 是否以mmap方式打开token数组（多个worker共享页缓存）
+
+    Returns:
+        SampleMembership实例
+    """
+    paths = membership_paths(split_dir, category)
+    has_tokens = os.path.exists(paths['tokens'])
+    has_bloom = os.path.exists(paths['bloom'])
+
+    if prefer_bloom and has_bloom:
+        return SampleMembership(bloom=BloomFilter.load(paths['bloom']))
+    if has_tokens:
+        return SampleMembership(sorted_tokens=np.load(paths['tokens'],
+                                                      mmap_mode='r' if mmap else None))
+    if has_bloom:
+        return SampleMembership(bloom=BloomFilter.load(paths['bloom']))
+
+    raise FileNotFoundError(f"找不到类别 {category} 的成员结构文件: {split_dir}")
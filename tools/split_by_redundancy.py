@@ -10,8 +10,15 @@ import os
 import numpy as np
 from collections import defaultdict
 import pickle
-from typing import Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+from typing import Dict, List, Tuple, Optional
 import argparse
+from sample_membership import export_sample_membership
+from redundancy_utils import (compute_split_statistics, get_split_statistics,
+                              save_redundancy_series, SERIES_FILENAME,
+                              REDUNDANCY_CATEGORIES)
+from io_utils import atomic_open, write_json_stream, write_lines
 
 
 class NuScenesRedundancySplitter:
@@ -19,6 +26,9 @@ class NuScenesRedundancySplitter:
     NuScenes数据集冗余度分析和划分器
     """
     
+    # save_split并发写出文件时使用的最大线程数
+    SAVE_WORKERS = 8
+    
     def __init__(self, dataroot: str, version: str = 'v1.0-trainval'):
         """
         初始化数据集划分器
@@ -309,68 +319,97 @@ class NuScenesRedundancySplitter:
             'low_redundancy': low_redundancy
         }
         
+        # 统计块只在这里计算一次，随划分结果一起保存，供报告/可视化直接读取
+        split_result['statistics'] = compute_split_statistics(split_result)
+        stats = split_result['statistics']['categories']
+        
         print(f"\n数据划分结果:")
         print(f"  高冗余度 (≥{high_redundancy_threshold}): {len(high_redundancy)} scenes, "
-              f"{sum(s['num_samples'] for s in high_redundancy)} samples")
+              f"{stats['high_redundancy']['num_samples']} samples")
         print(f"  中冗余度 ({low_redundancy_threshold}-{high_redundancy_threshold}): "
               f"{len(medium_redundancy)} scenes, "
-              f"{sum(s['num_samples'] for s in medium_redundancy)} samples")
+              f"{stats['medium_redundancy']['num_samples']} samples")
         print(f"  低冗余度 (≤{low_redundancy_threshold}): {len(low_redundancy)} scenes, "
-              f"{sum(s['num_samples'] for s in low_redundancy)} samples")
+              f"{stats['low_redundancy']['num_samples']} samples")
         
         return split_result
     
-    def save_split(self, split_result: Dict, output_dir: str):
+    def save_split(self, split_result: Dict, output_dir: str,
+                   bloom_fp_rate: Optional[float] = None,
+                   analysis_results: Optional[List[Dict]] = None):
         """
         保存划分结果
         
         Args:
             split_result: 划分结果
             output_dir: 输出目录
+            bloom_fp_rate: 成员结构中Bloom过滤器的假阳性率，为None时不导出Bloom过滤器
+            analysis_results: 场景分析结果，提供时额外保存逐帧对的速率/冗余度序列
         """
         os.makedirs(output_dir, exist_ok=True)
         
-        # 保存为pickle格式
         pkl_path = os.path.join(output_dir, 'redundancy_split.pkl')
-        with open(pkl_path, 'wb') as f:
-            pickle.dump(split_result, f)
-        print(f"\n已保存pickle格式: {pkl_path}")
-        
-        # 保存为JSON格式（可读性更好）
         json_path = os.path.join(output_dir, 'redundancy_split.json')
-        with open(json_path, 'w') as f:
-            json.dump(split_result, f, indent=2)
-        print(f"已保存JSON格式: {json_path}")
-        
-        # 保存每个类别的sample token列表
-        for category in ['high_redundancy', 'medium_redundancy', 'low_redundancy']:
-            sample_tokens = []
-            for scene_info in split_result[category]:
-                sample_tokens.extend(scene_info['sample_tokens'])
-            
-            token_path = os.path.join(output_dir, f'{category}_sample_tokens.txt')
-            with open(token_path, 'w') as f:
-                for token in sample_tokens:
-                    f.write(f"{token}\n")
-            print(f"已保存sample tokens: {token_path} ({len(sample_tokens)} samples)")
         
-        # 生成统计报告
-        self._generate_report(split_result, output_dir)
+        def write_pickle():
+            with atomic_open(pkl_path, 'wb') as f:
+                pickle.dump(split_result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            return f"已保存pickle格式: {pkl_path}"
+        
+        def write_json():
+            # 可读性更好，但也是最慢、最大的文件，使用流式编码写出
+            write_json_stream(split_result, json_path, indent=2)
+            return f"已保存JSON格式: {json_path}"
+        
+        def write_category(category):
+            sample_tokens = [
+                token
+                for scene_info in split_result[category]
+                for token in scene_info['sample_tokens']
+            ]
+            token_path = os.path.join(output_dir, f'{category}_sample_tokens.txt')
+            write_lines(sample_tokens, token_path)
+            
+            # 导出紧凑的成员结构，供dataloader做子集判断
+            membership_files = export_sample_membership(
+                sample_tokens, output_dir, category, bloom_fp_rate
+            )
+            return (f"已保存sample tokens: {token_path} ({len(sample_tokens)} samples)\n"
+                    f"已保存成员结构: {', '.join(membership_files.values())}")
+        
+        def write_series():
+            # 逐帧对序列，供后续逐样本加权/重新打分使用
+            series_path = os.path.join(output_dir, SERIES_FILENAME)
+            save_redundancy_series(analysis_results, series_path)
+            return f"已保存逐帧对序列: {series_path}"
+        
+        def write_report():
+            return f"已生成统计报告: {self._generate_report(split_result, output_dir)}"
+        
+        tasks = [write_pickle, write_json, write_report]
+        tasks += [partial(write_category, c) for c in REDUNDANCY_CATEGORIES]
+        if analysis_results is not None:
+            tasks.append(write_series)
+        
+        # 各输出文件互不依赖，在线程池中并发写出；每个文件都是原子写入
+        print()
+        with ThreadPoolExecutor(max_workers=min(len(tasks), self.SAVE_WORKERS)) as executor:
+            futures = [executor.submit(task) for task in tasks]
+            for future in as_completed(futures):
+                print(future.result())
     
-    def _generate_report(self, split_result: Dict, output_dir: str):
-        """生成统计报告"""
+    def _generate_report(self, split_result: Dict, output_dir: str) -> str:
+        """生成统计报告，返回报告路径"""
         report_path = os.path.join(output_dir, 'redundancy_report.txt')
         
-        with open(report_path, 'w', encoding='utf-8') as f:
+        with atomic_open(report_path, 'w', encoding='utf-8') as f:
             f.write("=" * 80 + "\n")
             f.write("NuScenes数据集冗余度分析报告\n")
             f.write("=" * 80 + "\n\n")
             
-            total_scenes = sum(len(split_result[k]) for k in split_result)
-            total_samples = sum(
-                sum(s['num_samples'] for s in split_result[k]) 
-                for k in split_result
-            )
+            statistics = get_split_statistics(split_result)
+            total_scenes = statistics['total_scenes']
+            total_samples = statistics['total_samples']
             
             f.write(f"总计: {total_scenes} scenes, {total_samples} samples\n\n")
             
@@ -382,10 +421,11 @@ class NuScenesRedundancySplitter:
             
             for key, name in categories.items():
                 scenes = split_result[key]
-                num_scenes = len(scenes)
-                num_samples = sum(s['num_samples'] for s in scenes)
-                avg_vel = np.mean([s['avg_velocity'] for s in scenes]) if scenes else 0
-                avg_red = np.mean([s['avg_redundancy'] for s in scenes]) if scenes else 0
+                stats = statistics['categories'][key]
+                num_scenes = stats['num_scenes']
+                num_samples = stats['num_samples']
+                avg_vel = stats['velocity_stats']['mean']
+                avg_red = stats['redundancy_stats']['mean']
                 
                 f.write(f"\n{name}:\n")
                 f.write(f"  Scenes数量: {num_scenes} ({num_scenes/total_scenes*100:.1f}%)\n")
@@ -401,7 +441,7 @@ class NuScenesRedundancySplitter:
                                f"冗余度={scene['avg_redundancy']:.3f}, "
                                f"samples={scene['num_samples']}\n")
         
-        print(f"已生成统计报告: {report_path}")
+        return report_path
 
 
 def main():
@@ -451,6 +491,12 @@ def main():
         default=0.3,
         help='低冗余度分类阈值'
     )
+    parser.add_argument(
+        '--bloom-fp-rate',
+        type=float,
+        default=None,
+        help='为每个类别额外导出Bloom过滤器，并指定其假阳性率（如0.001）'
+    )
     
     args = parser.parse_args()
     
@@ -475,7 +521,9 @@ def main():
     )
     
     # 保存结果
-    splitter.save_split(split_result, args.output_dir)
+    splitter.save_split(split_result, args.output_dir,
+                        bloom_fp_rate=args.bloom_fp_rate,
+                        analysis_results=analysis_results)
     
     print("\n" + "=" * 80)
     print("划分完成！")
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Token数组工具函数
+将NuScenes token转换为定长字节数组，基于排序数组做向量化的集合运算与连接
+"""
+
+from typing import Iterable, Optional, Tuple
+import numpy as np
+
+
+def to_token_array(tokens: Iterable[str]) -> np.ndarray:
+    """
+    将token序列转换为定长字节数组（dtype为'S<n>'）
+
+    Args:
+        tokens: token序列（str或bytes）
+
+    Returns:
+        定长字节数组，宽度为最长token的长度
+    """
+    if isinstance(tokens, np.ndarray) and tokens.dtype.kind == 'S':
+        return tokens
+    tokens = list(tokens)
+    if not tokens:
+        return np.empty(0, dtype='S32')
+    return np.array(tokens, dtype='S')
+
+
+def _common_dtype(a: np.ndarray, b: np.ndarray) -> np.dtype:
+    """返回能无截断容纳两个数组的定长字节类型"""
+    return np.dtype(f'S{max(a.dtype.itemsize, b.dtype.itemsize, 1)}')
+
+
+def sort_tokens(tokens: Iterable[str],
+                values: Optional[np.ndarray] = None) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    排序token数组，并按相同顺序重排附带的值数组
+
+    Args:
+        tokens: token序列
+        values: 与tokens一一对应的值数组（可选）
+
+    Returns:
+        (排序后的token数组, 重排后的值数组或None)
+    """
+    tokens = to_token_array(tokens)
+    order = np.argsort(tokens, kind='stable')
+    sorted_values = None if values is None else np.asarray(values)[order]
+    return tokens[order], sorted_values
+
+
+def lookup_sorted(sorted_tokens: np.ndarray, query: Iterable[str]) -> np.ndarray:
+    """
+    在排序token数组中批量查找query的位置
+
+    Args:
+        sorted_tokens: 已排序的定长token数组
+        query: 待查询的token序列
+
+    Returns:
+        int64数组，找到时为位置索引，找不到为-1
+    """
+    query = to_token_array(query)
+    if len(sorted_tokens) == 0 or len(query) == 0:
+        return np.full(len(query), -1, dtype=np.int64)
+
+    dtype = _common_dtype(sorted_tokens, query)
+    haystack = sorted_tokens.astype(dtype, copy=False)
+    needles = query.astype(dtype, copy=False)
+
+    pos = np.searchsorted(haystack, needles)
+    pos_clipped = np.minimum(pos, len(haystack) - 1)
+    found = haystack[pos_clipped] == needles
+    return np.where(found, pos_clipped, -1).astype(np.int64)
+
+
+def isin_sorted(sorted_tokens: np.ndarray, query: Iterable[str]) -> np.ndarray:
+    """
+    批量成员测试：query中每个token是否出现在排序token数组中
+
+    Returns:
+        bool数组
+    """
+    return lookup_sorted(sorted_tokens, query) >= 0
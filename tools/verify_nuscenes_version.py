@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+校验生成的NuScenes版本的引用完整性
+  - 每张表中每个外键字段（含prev/next链表和列表字段）能否在目标表中解析
+  - prev/next链表是否双向一致
+  - scene/instance记录的样本数、标注数与实际链表是否一致
+  - token是否重复
+  - sample_data引用的数据文件是否存在（按目录批量列举，符号链接按目标判断）
+"""
+
+import os
+import json
+import time
+import argparse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+import numpy as np
+from nuscenes_tables import NuScenesTables
+from token_utils import to_token_array
+from io_utils import list_dir_names, atomic_open
+
+
+# 引用定义：(表, 字段, 被引用的表, 是否允许为空)
+REFERENCES = [
+    ('sample', 'scene_token', 'scene', False),
+    ('sample', 'prev', 'sample', True),
+    ('sample', 'next', 'sample', True),
+    ('scene', 'log_token', 'log', False),
+    ('scene', 'first_sample_token', 'sample', False),
+    ('scene', 'last_sample_token', 'sample', False),
+    ('sample_data', 'sample_token', 'sample', False),
+    ('sample_data', 'ego_pose_token', 'ego_pose', False),
+    ('sample_data', 'calibrated_sensor_token', 'calibrated_sensor', False),
+    ('sample_data', 'prev', 'sample_data', True),
+    ('sample_data', 'next', 'sample_data', True),
+    ('calibrated_sensor', 'sensor_token', 'sensor', False),
+    ('sample_annotation', 'sample_token', 'sample', False),
+    ('sample_annotation', 'instance_token', 'instance', False),
+    ('sample_annotation', 'visibility_token', 'visibility', True),
+    ('sample_annotation', 'prev', 'sample_annotation', True),
+    ('sample_annotation', 'next', 'sample_annotation', True),
+    ('instance', 'category_token', 'category', False),
+    ('instance', 'first_annotation_token', 'sample_annotation', False),
+    ('instance', 'last_annotation_token', 'sample_annotation', False),
+]
+
+# 列表类型的引用字段：(表, 字段, 被引用的表)
+LIST_REFERENCES = [
+    ('sample_annotation', 'attribute_tokens', 'attribute'),
+]
+
+# 带prev/next链表的表
+CHAINED_TABLES = ['sample', 'sample_data', 'sample_annotation']
+
+# 链表数量字段：(所属表, 数量字段, 首记录字段, 成员表, 成员外键)
+COUNT_FIELDS = [
+    ('scene', 'nbr_samples', 'first_sample_token', 'sample', 'scene_token'),
+    ('instance', 'nbr_annotations', 'first_annotation_token',
+     'sample_annotation', 'instance_token'),
+]
+
+# 报告中每类问题最多列出的token数
+DEFAULT_MAX_EXAMPLES = 5
+
+
+def _examples(tokens: np.ndarray, limit: int) -> List[str]:
+    return [token.decode() for token in tokens[:limit]]
+
+
+class VersionVerifier:
+    """
+    NuScenes版本引用完整性校验器
+    """
+
+    def __init__(self, dataroot: str, version: str,
+                 max_examples: int = DEFAULT_MAX_EXAMPLES,
+                 workers: int = 16):
+        """
+        初始化
+
+        Args:
+            dataroot: 数据根目录（数据文件路径相对于它）
+            version: 版本名称（如v1.0-low-redundancy）
+            max_examples: 每类问题最多列出的token/文件数
+            workers: 并发列举数据文件目录的线程数
+        """
+        self.dataroot = dataroot
+        self.version = version
+        self.version_path = os.path.join(dataroot, version)
+        self.max_examples = max_examples
+        self.workers = max(1, workers)
+
+    def verify(self, check_files: bool = True,
+               tables: Optional[NuScenesTables] = None) -> Dict:
+        """
+        执行全部检查
+
+        Args:
+            check_files: 是否检查数据文件是否存在
+            tables: 已加载的版本表（可选，不提供时自动加载）
+
+        Returns:
+            校验结果字典，'ok'为True表示没有发现任何问题
+        """
+        start_time = time.time()
+        if tables is None:
+            print(f"\n加载版本: {self.version_path}")
+            tables = NuScenesTables(self.version_path)
+
+        result = {
+            'version_path': self.version_path,
+            'tables': {name: len(tables[name]) for name in tables.tables},
+            'duplicates': self._check_duplicates(tables),
+            'references': self._check_references(tables),
+            'chains': self._check_chains(tables),
+            'counts': self._check_counts(tables),
+        }
+        if check_files:
+            result['files'] = self._check_files(tables)
+
+        result['ok'] = not (
+            result['duplicates']
+            or any(ref['dangling'] for ref in result['references'])
+            or any(chain['asymmetric'] for chain in result['chains'])
+            or any(count['mismatched'] for count in result['counts'])
+            or (check_files and result['files']['missing'])
+        )
+        result['elapsed'] = time.time() - start_time
+        return result
+
+    def _check_duplicates(self, tables: NuScenesTables) -> Dict[str, Dict]:
+        """检查每张表的token是否唯一"""
+        duplicates = {}
+        for name in tables.tables:
+            sorted_tokens, _ = tables.token_index(name)
+            repeated = sorted_tokens[1:][sorted_tokens[1:] == sorted_tokens[:-1]]
+            if len(repeated):
+                repeated = np.unique(repeated)
+                duplicates[name] = {'count': len(repeated),
+                                    'examples': _examples(repeated, self.max_examples)}
+        return duplicates
+
+    def _check_references(self, tables: NuScenesTables) -> List[Dict]:
+        """用排序token数组连接检查每个外键字段"""
+        results = []
+        for table, field, target, nullable in REFERENCES:
+            if table not in tables or not tables[table]:
+                continue
+            values = tables.column(table, field)
+            rows = tables.foreign_key(table, field, target)
+            dangling = rows < 0
+            if nullable:
+                dangling &= values != b''
+            results.append({
+                'table': table, 'field': field, 'target': target,
+                'total': int(np.count_nonzero(values != b'') if nullable else len(values)),
+                'dangling': int(np.count_nonzero(dangling)),
+                'examples': _examples(values[dangling], self.max_examples)
+            })
+
+        for table, field, target in LIST_REFERENCES:
+            if table not in tables or not tables[table]:
+                continue
+            values = to_token_array([token for row in tables[table]
+                                     for token in row.get(field) or []])
+            dangling = tables.lookup(target, values) < 0
+            results.append({
+                'table': table, 'field': field, 'target': target,
+                'total': len(values),
+                'dangling': int(np.count_nonzero(dangling)),
+                'examples': _examples(np.unique(values[dangling]), self.max_examples)
+            })
+        return results
+
+    def _check_chains(self, tables: NuScenesTables) -> List[Dict]:
+        """检查prev/next链表是否双向一致（a.next == b 当且仅当 b.prev == a）"""
+        results = []
+        for table in CHAINED_TABLES:
+            if table not in tables or not tables[table]:
+                continue
+            rows = np.arange(len(tables[table]))
+            prev = tables.foreign_key(table, 'prev', table)
+            next_ = tables.foreign_key(table, 'next', table)
+
+            has_next = next_ >= 0
+            bad_next = np.zeros(len(rows), dtype=bool)
+            bad_next[has_next] = prev[next_[has_next]] != rows[has_next]
+            has_prev = prev >= 0
+            bad_prev = np.zeros(len(rows), dtype=bool)
+            bad_prev[has_prev] = next_[prev[has_prev]] != rows[has_prev]
+
+            asymmetric = bad_next | bad_prev
+            results.append({
+                'table': table,
+                'asymmetric': int(np.count_nonzero(asymmetric)),
+                'examples': _examples(tables.column(table, 'token')[asymmetric],
+                                      self.max_examples)
+            })
+        return results
+
+    def _check_counts(self, tables: NuScenesTables) -> List[Dict]:
+        """检查scene.nbr_samples、instance.nbr_annotations与实际记录数是否一致，首记录是否为链头"""
+        results = []
+        for owner, count_field, first_field, member, member_field in COUNT_FIELDS:
+            if owner not in tables or not tables[owner]:
+                continue
+            recorded = np.array([row.get(count_field, 0) for row in tables[owner]],
+                                dtype=np.int64)
+            references = tables.foreign_key(member, member_field, owner)
+            actual = np.bincount(references[references >= 0], minlength=len(recorded))
+
+            first = tables.foreign_key(owner, first_field, member)
+            not_head = np.zeros(len(recorded), dtype=bool)
+            valid = first >= 0
+            not_head[valid] = tables.foreign_key(member, 'prev', member)[first[valid]] >= 0
+
+            mismatched = (recorded != actual) | not_head
+            results.append({
+                'table': owner, 'field': count_field,
+                'mismatched': int(np.count_nonzero(mismatched)),
+                'examples': _examples(tables.column(owner, 'token')[mismatched],
+                                      self.max_examples)
+            })
+        return results
+
+    def _check_files(self, tables: NuScenesTables) -> Dict:
+        """按目录批量列举，检查sample_data引用的数据文件是否存在"""
+        filenames = tables.column('sample_data', 'filename') if 'sample_data' in tables \
+            else to_token_array([])
+        files_by_dir = defaultdict(list)
+        for filename in filenames:
+            if filename:
+                dir_path, name = os.path.split(filename.decode())
+                files_by_dir[dir_path].append(name)
+
+        def missing_in(dir_path):
+            present = list_dir_names(os.path.join(self.dataroot, dir_path), files_only=True)
+            return [os.path.join(dir_path, name)
+                    for name in files_by_dir[dir_path] if name not in present]
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            missing = [path for paths in executor.map(missing_in, files_by_dir)
+                       for path in paths]
+
+        return {
+            'total': sum(len(names) for names in files_by_dir.values()),
+            'directories': len(files_by_dir),
+            'missing': len(missing),
+            'examples': sorted(missing)[:self.max_examples],
+            'maps': os.path.isdir(os.path.join(self.dataroot, 'maps'))
+        }
+
+
+def print_verification(result: Dict):
+    """打印校验结果"""
+    print("\n" + "=" * 80)
+    print(f"引用完整性校验: {result['version_path']}")
+    print("=" * 80)
+
+    print("\n表记录数:")
+    for name, count in result['tables'].items():
+        print(f"  {name}: {count}")
+
+    if result['duplicates']:
+        print("\n重复token:")
+        for name, info in result['duplicates'].items():
+            print(f"  ✗ {name}: {info['count']} 个 (如 {', '.join(info['examples'])})")
+
+    print("\n外键引用:")
+    for ref in result['references']:
+        status = '✓' if not ref['dangling'] else '✗'
+        line = (f"  {status} {ref['table']}.{ref['field']} -> {ref['target']}: "
+                f"{ref['dangling']}/{ref['total']} 悬空")
+        if ref['dangling']:
+            line += f" (如 {', '.join(ref['examples'])})"
+        print(line)
+
+    print("\n链表一致性:")
+    for chain in result['chains']:
+        status = '✓' if not chain['asymmetric'] else '✗'
+        print(f"  {status} {chain['table']}.prev/next: {chain['asymmetric']} 条记录不一致")
+
+    print("\n记录数字段:")
+    for count in result['counts']:
+        status = '✓' if not count['mismatched'] else '✗'
+        print(f"  {status} {count['table']}.{count['field']}: {count['mismatched']} 条不一致")
+
+    if 'files' in result:
+        files = result['files']
+        status = '✓' if not files['missing'] else '✗'
+        print(f"\n数据文件:\n  {status} {files['missing']}/{files['total']} 缺失 "
+              f"({files['directories']} 个目录)")
+        for path in files['examples']:
+            print(f"      {path}")
+        if not files['maps']:
+            print("  ! 未找到 maps 目录")
+
+    print(f"\n结论: {'通过' if result['ok'] else '发现问题'} (耗时 {result['elapsed']:.1f}s)")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description='校验生成的NuScenes版本的引用完整性'
+    )
+
+    parser.add_argument(
+        '--dataroot',
+        type=str,
+        default='./nuscenes_versions',
+        help='数据根目录（create_nuscenes_version.py的--output-dataroot）'
+    )
+
+    parser.add_argument(
+        '--version',
+        type=str,
+        nargs='+',
+        default=['v1.0-low-redundancy'],
+        help='要校验的版本名称，可指定多个'
+    )
+
+    parser.add_argument(
+        '--skip-files',
+        action='store_true',
+        help='不检查数据文件是否存在'
+    )
+
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=16,
+        help='并发列举数据文件目录的线程数（默认16）'
+    )
+
+    parser.add_argument(
+        '--max-examples',
+        type=int,
+        default=DEFAULT_MAX_EXAMPLES,
+        help=f'每类问题最多列出的token数（默认{DEFAULT_MAX_EXAMPLES}）'
+    )
+
+    parser.add_argument(
+        '--output-json',
+        type=str,
+        default=None,
+        help='将校验结果保存为JSON文件（多个版本时保存为列表）'
+    )
+
+    args = parser.parse_args()
+
+    results = []
+    for version in args.version:
+        verifier = VersionVerifier(args.dataroot, version,
+                                   max_examples=args.max_examples,
+                                   workers=args.workers)
+        result = verifier.verify(check_files=not args.skip_files)
+        print_verification(result)
+        results.append(result)
+
+    if args.output_json:
+        with atomic_open(args.output_json, 'w', encoding='utf-8') as f:
+            json.dump(results if len(results) > 1 else results[0], f,
+                      indent=2, ensure_ascii=False)
+        print(f"\n校验结果已保存: {args.output_json}")
+
+    if not all(result['ok'] for result in results):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
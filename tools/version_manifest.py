@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+版本创建清单（manifest）
+记录在输出版本目录中，使中断后的重新运行可以跳过已完成的工作：
+  - 已完成的阶段（tables / links / maps / report）
+  - 每张表输出文件的记录数、大小、修改时间和SHA-256
+  - 已落地数据文件的追加式台账（每行一个相对路径）
+输入（原始版本、划分文件内容、类别）变化时清单自动失效并重新开始；
+数据文件落地方式单独记录，变化时只重新执行数据文件和maps阶段
+"""
+
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Iterable, Optional, Set
+from io_utils import atomic_open, write_lines
+
+
+MANIFEST_FILENAME = '.version_manifest.json'
+LEDGER_FILENAME = '.linked_files.txt'
+MANIFEST_FORMAT = 1
+
+# 版本创建的各阶段（按执行顺序）
+STAGES = ['tables', 'links', 'maps', 'report']
+
+# 结果取决于落地方式的阶段
+LINK_STAGES = ['links', 'maps']
+
+# 计算校验和时每次读取的字节数
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def file_sha256(path: str, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    """计算文件的SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def compute_fingerprint(inputs: Dict) -> str:
+    """根据版本的输入参数计算指纹"""
+    encoded = json.dumps(inputs, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class LinkLedger:
+    """
+    已落地数据文件的追加式台账
+    每批文件落地成功后追加写入并flush，崩溃时最多丢失最后一批（重新运行时会被目录扫描找回）
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def load(self) -> Set[str]:
+        """读取台账中的全部路径，忽略崩溃时可能写了一半的最后一行"""
+        if not os.path.exists(self.path):
+            return set()
+        with open(self.path, 'r', encoding='utf-8') as f:
+            lines = f.read().split('\n')
+        # 最后一个元素是换行符之后的内容：正常为空，崩溃时为不完整的行
+        return set(line for line in lines[:-1] if line)
+
+    def record(self, rel_paths: Iterable[str]):
+        """追加记录一批已落地的文件"""
+        data = ''.join(f'{path}\n' for path in rel_paths)
+        if not data:
+            return
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.write(data)
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def discard(self, rel_paths: Iterable[str]):
+        """从台账中移除一批文件（原子重写台账）"""
+        rel_paths = set(rel_paths)
+        if not rel_paths or not os.path.exists(self.path):
+            return
+        remaining = self.load() - rel_paths
+        self.close()
+        write_lines(sorted(remaining), self.path)
+
+    def reset(self):
+        """清空台账"""
+        self.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class VersionManifest:
+    """
+    单个输出版本目录的创建清单
+    """
+
+    def __init__(self, version_path: str, fingerprint: str,
+                 inputs: Optional[Dict] = None, resume: bool = True,
+                 adopt: bool = False, link_mode: Optional[str] = None):
+        """
+        打开（或新建）版本目录的清单
+
+        Args:
+            version_path: 输出版本目录
+            fingerprint: 本次运行输入的指纹
+            inputs: 指纹对应的输入参数（写入清单便于查看）
+            resume: 是否沿用已有清单；为False或指纹不一致时从头开始
+            adopt: 指纹不一致时是否仍沿用已有清单的表记录和台账（增量更新时使用，
+                   更新完成后调用commit_inputs切换到新指纹）
+            link_mode: 本次运行的数据文件落地方式；与清单记录的不一致（或旧清单未记录）时
+                       清除links/maps阶段和台账，使数据文件按新方式重新检查，其余阶段保留
+        """
+        self.version_path = version_path
+        self.path = os.path.join(version_path, MANIFEST_FILENAME)
+        self.ledger = LinkLedger(os.path.join(version_path, LEDGER_FILENAME))
+        self.fingerprint = fingerprint
+        self.inputs = inputs or {}
+
+        data = self._read() if resume else None
+        self.resumed = data is not None and data.get('fingerprint') == fingerprint
+        if self.resumed or (adopt and data is not None):
+            self.data = data
+        else:
+            if data is not None or not resume:
+                self.ledger.reset()
+            self.data = {
+                'format': MANIFEST_FORMAT,
+                'fingerprint': fingerprint,
+                'inputs': self.inputs,
+                'stages': {},
+                'tables': {}
+            }
+
+        self.previous_link_mode = self.data.get('link_mode')
+        self.link_mode_changed = False
+        if link_mode is not None and self.previous_link_mode != link_mode:
+            if (any(self.stage_done(stage) for stage in LINK_STAGES)
+                    or os.path.exists(self.ledger.path)):
+                for stage in LINK_STAGES:
+                    self.data['stages'].pop(stage, None)
+                self.ledger.reset()
+                self.link_mode_changed = True
+            self.data['link_mode'] = link_mode
+            if self.link_mode_changed:
+                self.save()
+
+    def _read(self) -> Optional[Dict]:
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('format') != MANIFEST_FORMAT:
+            return None
+        return data
+
+    def save(self):
+        """原子写出清单"""
+        os.makedirs(self.version_path, exist_ok=True)
+        with atomic_open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, indent=2)
+
+    def begin_update(self):
+        """
+        开始增量更新：清除指纹和除maps外的阶段记录
+        更新中途中断时，清单不会被误认为与任何输入一致
+        """
+        self.data['fingerprint'] = None
+        self.data['stages'] = {stage: when for stage, when in self.data['stages'].items()
+                               if stage == 'maps'}
+        self.save()
+
+    def commit_inputs(self):
+        """将清单切换到本次运行的输入指纹并保存"""
+        self.data['fingerprint'] = self.fingerprint
+        self.data['inputs'] = self.inputs
+        self.save()
+
+    def stage_done(self, stage: str) -> bool:
+        return stage in self.data['stages']
+
+    def mark_stage(self, stage: str):
+        """记录阶段完成并立即保存"""
+        self.data['stages'][stage] = time.strftime('%Y-%m-%d %H:%M:%S')
+        self.save()
+
+    def record_table(self, table: str, count: int, sha256: str):
+        """记录已写出的表并立即保存"""
+        stat = os.stat(os.path.join(self.version_path, f'{table}.json'))
+        self.data['tables'][table] = {
+            'count': count,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': sha256
+        }
+        self.save()
+
+    def table_done(self, table: str) -> bool:
+        """
+        表是否已按清单完整写出
+        大小和修改时间与记录一致时直接认可；只有修改时间变化时重新计算校验和
+        """
+        entry = self.data['tables'].get(table)
+        if entry is None:
+            return False
+        path = os.path.join(self.version_path, f'{table}.json')
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return False
+        if stat.st_size != entry['size']:
+            return False
+        if stat.st_mtime_ns == entry['mtime_ns']:
+            return True
+        if file_sha256(path) != entry['sha256']:
+            return False
+        entry['mtime_ns'] = stat.st_mtime_ns
+        return True
+
+    def is_complete(self) -> bool:
+        """所有阶段均已完成且记录的表全部校验通过"""
+        return (all(self.stage_done(stage) for stage in STAGES)
+                and all(self.table_done(table) for table in self.data['tables']))
+
+    def close(self):
+        self.ledger.close()
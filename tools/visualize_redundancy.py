@@ -2,20 +2,46 @@
 # -*- coding: utf-8 -*-
 """
 Visualize NuScenes dataset redundancy analysis results
+All figures are drawn from precomputed aggregates (histograms, box statistics) and
+rendered in parallel worker processes on the non-interactive Agg backend
 """
 
 import pickle
 import json
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import chain
 import numpy as np
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 from matplotlib import rcParams
+from matplotlib.colors import LogNorm, ListedColormap
 import argparse
+from redundancy_utils import get_split_statistics, compute_pair_statistics, SERIES_FILENAME
+from nuscenes_tables import NuScenesTables
+from token_utils import sort_tokens, isin_sorted
 
 # Set font
 rcParams['font.sans-serif'] = ['DejaVu Sans', 'Arial']
 rcParams['axes.unicode_minus'] = False
 
+KEYS = ['high_redundancy', 'medium_redundancy', 'low_redundancy']
+LABELS = ['High Redundancy', 'Medium Redundancy', 'Low Redundancy']
+COLORS = ['#ff6b6b', '#ffd93d', '#6bcf7f']
+
+# Output resolution: full quality and quick preview
+DEFAULT_DPI = 300
+PREVIEW_DPI = 72
+
+# Spatial coverage grid: default cell size (meters) and cap on cells per axis
+DEFAULT_CELL_SIZE = 10.0
+MAX_COVERAGE_BINS = 2000
+COVERAGE_TABLES = ['sample', 'scene', 'log', 'sample_data', 'ego_pose',
+                   'calibrated_sensor', 'sensor']
+
 
 def load_split_result(result_path: str):
     """
@@ -23,7 +49,7 @@ def load_split_result(result_path: str):
     
     Args:
         result_path: Result file path (pkl or json)
-        
+    
     Returns:
         Split result dictionary
     """
@@ -37,25 +63,199 @@ def load_split_result(result_path: str):
         raise ValueError("Unsupported file format, please use .pkl or .json file")
 
 
-def plot_redundancy_distribution(split_result: dict, output_dir: str):
+def load_series(series_path: str):
     """
-    Plot redundancy distribution
+    Load per-pair velocity/redundancy series (redundancy_series.npz)
+    
+    Returns:
+        Dictionary of arrays, or None if the file does not exist
+    """
+    if not os.path.exists(series_path):
+        return None
+    with np.load(series_path) as data:
+        return {key: data[key] for key in data.files}
+
+
+def _coverage_edges(values: np.ndarray, cell_size: float) -> np.ndarray:
+    """Grid edges covering values with the given cell size (coarsened if the grid gets too large)"""
+    low, high = float(values.min()), float(values.max())
+    cell_size = max(cell_size, (high - low) / MAX_COVERAGE_BINS)
+    start = np.floor(low / cell_size) * cell_size
+    num_bins = max(int(np.ceil((high - start) / cell_size)), 1)
+    if start + num_bins * cell_size <= high:
+        num_bins += 1
+    return start + cell_size * np.arange(num_bins + 1)
+
+
+def compute_coverage(tables: NuScenesTables, split_result: dict, keep_categories: list,
+                     channel: str = 'LIDAR_TOP', cell_size: float = DEFAULT_CELL_SIZE) -> dict:
+    """
+    Aggregate ego positions into per-location 2D histograms of kept and dropped samples
+    
+    Every sample_data record of the given channel contributes its ego pose; it is joined to
+    its map location through sample -> scene -> log and counted as kept when its sample
+    belongs to one of the kept categories (samples outside the split count as dropped).
+    Key frames and sweeps are aggregated separately.
+    
+    Args:
+        tables: Metadata tables of the original version
+        split_result: Split result
+        keep_categories: Categories whose samples are kept (e.g. ['low_redundancy'])
+        channel: Sensor channel whose ego poses are used
+        cell_size: Grid cell size in meters
+    
+    Returns:
+        {'channel', 'keep_categories', 'locations': {location: {'x_edges', 'y_edges',
+        'keyframe': {'kept', 'dropped'}, 'sweep': {'kept', 'dropped'}}}}
+    """
+    # sample_data -> sensor channel
+    sensor = tables.foreign_key('calibrated_sensor', 'sensor_token', 'sensor')
+    calibrated = tables.foreign_key('sample_data', 'calibrated_sensor_token', 'calibrated_sensor')
+    channels = tables.column('sensor', 'channel')
+    is_channel = channels == channel.encode()
+    if not is_channel.any():
+        raise ValueError(f"Channel {channel} not found, available: "
+                         f"{sorted(c.decode() for c in channels)}")
+    valid = (calibrated >= 0)
+    valid[valid] = sensor[calibrated[valid]] >= 0
+    selected = np.flatnonzero(valid)
+    selected = selected[is_channel[sensor[calibrated[selected]]]]
+    
+    # sample_data -> sample -> scene -> log -> location
+    sample = tables.foreign_key('sample_data', 'sample_token', 'sample')[selected]
+    pose = tables.foreign_key('sample_data', 'ego_pose_token', 'ego_pose')[selected]
+    keep = (sample >= 0) & (pose >= 0)
+    selected, sample, pose = selected[keep], sample[keep], pose[keep]
+    scene = tables.foreign_key('sample', 'scene_token', 'scene')[sample]
+    log = np.where(scene >= 0, tables.foreign_key('scene', 'log_token', 'log')[scene], -1)
+    keep = log >= 0
+    selected, sample, pose, log = selected[keep], sample[keep], pose[keep], log[keep]
+    locations, location = np.unique(tables.column('log', 'location')[log], return_inverse=True)
+    
+    sample_data = tables['sample_data']
+    is_key_frame = np.fromiter((sample_data[i]['is_key_frame'] for i in selected),
+                               dtype=bool, count=len(selected))
+    ego_pose = tables['ego_pose']
+    xy = np.fromiter(chain.from_iterable(ego_pose[i]['translation'] for i in pose),
+                     dtype=np.float64, count=3 * len(pose)).reshape(-1, 3)[:, :2]
+    
+    kept_tokens, _ = sort_tokens([token for key in keep_categories
+                                  for scene_info in split_result[key]
+                                  for token in scene_info['sample_tokens']])
+    kept_samples = isin_sorted(kept_tokens, tables.column('sample', 'token'))
+    kept = kept_samples[sample]
+    
+    result = {}
+    order = np.argsort(location, kind='stable')
+    bounds = np.searchsorted(location[order], np.arange(len(locations) + 1))
+    for i, name in enumerate(locations):
+        rows = order[bounds[i]:bounds[i + 1]]
+        x, y = xy[rows, 0], xy[rows, 1]
+        x_edges, y_edges = _coverage_edges(x, cell_size), _coverage_edges(y, cell_size)
+        entry = {'x_edges': x_edges, 'y_edges': y_edges}
+        for frames, mask in (('keyframe', is_key_frame[rows]), ('sweep', ~is_key_frame[rows])):
+            entry[frames] = {}
+            for group, group_mask in (('kept', mask & kept[rows]), ('dropped', mask & ~kept[rows])):
+                counts, _, _ = np.histogram2d(x[group_mask], y[group_mask], bins=[x_edges, y_edges])
+                entry[frames][group] = counts.astype(np.int64)
+        result[name.decode()] = entry
+    return {'channel': channel, 'keep_categories': list(keep_categories), 'locations': result}
+
+
+def coverage_summary(coverage: dict, frames: str = 'keyframe') -> dict:
+    """
+    Per-location coverage figures: occupied cells and cells visited only by dropped samples
+    
+    Returns:
+        {location: {'kept', 'dropped', 'occupied_cells', 'uncovered_cells'}}
+    """
+    summary = {}
+    for name, entry in coverage['locations'].items():
+        kept, dropped = entry[frames]['kept'], entry[frames]['dropped']
+        summary[name] = {
+            'kept': int(kept.sum()),
+            'dropped': int(dropped.sum()),
+            'occupied_cells': int(np.count_nonzero((kept > 0) | (dropped > 0))),
+            'uncovered_cells': int(np.count_nonzero((kept == 0) & (dropped > 0)))
+        }
+    return summary
+
+
+def prepare_plot_data(split_result: dict, series: dict = None, coverage: dict = None) -> dict:
+    """
+    Collect everything the figures need into one compact, picklable dictionary
+    (statistics block, per-scene arrays, optional per-pair and spatial coverage aggregates)
     
     Args:
         split_result: Split result
+        series: Per-pair series (optional, enables sample-level plots)
+        coverage: Spatial coverage aggregates (optional, see compute_coverage)
+    
+    Returns:
+        Plot data dictionary
+    """
+    scenes = {}
+    for key in KEYS:
+        items = split_result[key]
+        n = len(items)
+        scenes[key] = {
+            'avg_velocity': np.fromiter((s['avg_velocity'] for s in items), dtype=np.float64, count=n),
+            'avg_redundancy': np.fromiter((s['avg_redundancy'] for s in items), dtype=np.float64, count=n),
+            'num_samples': np.fromiter((s['num_samples'] for s in items), dtype=np.int64, count=n),
+        }
+    return {
+        'statistics': get_split_statistics(split_result),
+        'scenes': scenes,
+        'pairs': compute_pair_statistics(split_result, series) if series is not None else None,
+        'coverage': coverage
+    }
+
+
+def _boxes(stats: dict, box_key: str) -> list:
+    """Per-category box statistics in the form expected by Axes.bxp"""
+    return [dict(stats[key][box_key], label=label) for key, label in zip(KEYS, LABELS)]
+
+
+def _color_boxes(bp):
+    for patch, color in zip(bp['boxes'], COLORS):
+        patch.set_facecolor(color)
+        patch.set_alpha(0.7)
+
+
+def _plot_histograms(ax, statistics: dict, edges_key: str, hist_key: str):
+    """Draw precomputed per-category histograms (shared bin edges) as bars"""
+    edges = np.asarray(statistics[edges_key])
+    for key, label, color in zip(KEYS, LABELS, COLORS):
+        counts = statistics['categories'][key][hist_key]
+        ax.bar(edges[:-1], counts, width=np.diff(edges), align='edge', alpha=0.6,
+               label=label, color=color, edgecolor='black')
+
+
+def _save(fig, output_dir: str, filename: str, dpi: int) -> str:
+    output_path = os.path.join(output_dir, filename)
+    fig.savefig(output_path, dpi=dpi, bbox_inches='tight')
+    plt.close(fig)
+    return output_path
+
+
+def plot_redundancy_distribution(data: dict, output_dir: str, dpi: int = DEFAULT_DPI) -> str:
+    """
+    Plot redundancy distribution
+    
+    Args:
+        data: Plot data (see prepare_plot_data)
         output_dir: Output directory
+        dpi: Output resolution
     """
     fig, axes = plt.subplots(2, 2, figsize=(15, 12))
     fig.suptitle('NuScenes Dataset Redundancy Analysis', fontsize=16, fontweight='bold')
     
     # 1. Scene count distribution by category
     ax1 = axes[0, 0]
-    categories = ['High Redundancy', 'Medium Redundancy', 'Low Redundancy']
-    keys = ['high_redundancy', 'medium_redundancy', 'low_redundancy']
-    scene_counts = [len(split_result[k]) for k in keys]
-    colors = ['#ff6b6b', '#ffd93d', '#6bcf7f']
+    stats = data['statistics']['categories']
+    scene_counts = [stats[k]['num_scenes'] for k in KEYS]
     
-    bars = ax1.bar(categories, scene_counts, color=colors, alpha=0.7, edgecolor='black')
+    bars = ax1.bar(LABELS, scene_counts, color=COLORS, alpha=0.7, edgecolor='black')
     ax1.set_ylabel('Number of Scenes', fontsize=12)
     ax1.set_title('Scene Count Distribution by Category', fontsize=13, fontweight='bold')
     ax1.grid(axis='y', alpha=0.3)
@@ -69,9 +269,9 @@ def plot_redundancy_distribution(split_result: dict, output_dir: str):
     
     # 2. Sample count distribution by category
     ax2 = axes[0, 1]
-    sample_counts = [sum(s['num_samples'] for s in split_result[k]) for k in keys]
+    sample_counts = [stats[k]['num_samples'] for k in KEYS]
     
-    bars = ax2.bar(categories, sample_counts, color=colors, alpha=0.7, edgecolor='black')
+    bars = ax2.bar(LABELS, sample_counts, color=COLORS, alpha=0.7, edgecolor='black')
     ax2.set_ylabel('Number of Samples', fontsize=12)
     ax2.set_title('Sample Count Distribution by Category', fontsize=13, fontweight='bold')
     ax2.grid(axis='y', alpha=0.3)
@@ -82,17 +282,9 @@ def plot_redundancy_distribution(split_result: dict, output_dir: str):
                 f'{count}',
                 ha='center', va='bottom', fontsize=11, fontweight='bold')
     
-    # 3. Average velocity distribution
+    # 3. Average velocity distribution (precomputed box statistics)
     ax3 = axes[1, 0]
-    velocities_by_category = []
-    for key in keys:
-        velocities = [s['avg_velocity'] for s in split_result[key]]
-        velocities_by_category.append(velocities)
-    
-    bp = ax3.boxplot(velocities_by_category, tick_labels=categories, patch_artist=True)
-    for patch, color in zip(bp['boxes'], colors):
-        patch.set_facecolor(color)
-        patch.set_alpha(0.7)
+    _color_boxes(ax3.bxp(_boxes(stats, 'velocity_box'), patch_artist=True))
     
     ax3.set_ylabel('Average Velocity (m/s)', fontsize=12)
     ax3.set_title('Velocity Distribution by Category', fontsize=13, fontweight='bold')
@@ -100,46 +292,29 @@ def plot_redundancy_distribution(split_result: dict, output_dir: str):
     
     # 4. Redundancy score distribution
     ax4 = axes[1, 1]
-    redundancies_by_category = []
-    for key in keys:
-        redundancies = [s['avg_redundancy'] for s in split_result[key]]
-        redundancies_by_category.append(redundancies)
-    
-    bp = ax4.boxplot(redundancies_by_category, tick_labels=categories, patch_artist=True)
-    for patch, color in zip(bp['boxes'], colors):
-        patch.set_facecolor(color)
-        patch.set_alpha(0.7)
+    _color_boxes(ax4.bxp(_boxes(stats, 'redundancy_box'), patch_artist=True))
     
     ax4.set_ylabel('Redundancy Score', fontsize=12)
     ax4.set_title('Redundancy Distribution by Category', fontsize=13, fontweight='bold')
     ax4.grid(axis='y', alpha=0.3)
     
-    plt.tight_layout()
-    output_path = os.path.join(output_dir, 'redundancy_distribution.png')
-    plt.savefig(output_path, dpi=300, bbox_inches='tight')
-    print(f"Saved distribution plot: {output_path}")
-    plt.close()
+    fig.tight_layout()
+    return _save(fig, output_dir, 'redundancy_distribution.png', dpi)
 
 
-def plot_velocity_histogram(split_result: dict, output_dir: str):
+def plot_velocity_histogram(data: dict, output_dir: str, dpi: int = DEFAULT_DPI) -> str:
     """
     Plot velocity histogram
     
     Args:
-        split_result: Split result
+        data: Plot data (see prepare_plot_data)
         output_dir: Output directory
+        dpi: Output resolution
     """
     fig, ax = plt.subplots(figsize=(12, 6))
     
-    keys = ['high_redundancy', 'medium_redundancy', 'low_redundancy']
-    labels = ['High Redundancy', 'Medium Redundancy', 'Low Redundancy']
-    colors = ['#ff6b6b', '#ffd93d', '#6bcf7f']
-    
-    all_velocities = []
-    for key, label, color in zip(keys, labels, colors):
-        velocities = [s['avg_velocity'] for s in split_result[key]]
-        all_velocities.extend(velocities)
-        ax.hist(velocities, bins=30, alpha=0.6, label=label, color=color, edgecolor='black')
+    # Histograms are precomputed with shared bin edges in the statistics block
+    _plot_histograms(ax, data['statistics'], 'velocity_bin_edges', 'velocity_hist')
     
     ax.set_xlabel('Average Velocity (m/s)', fontsize=12)
     ax.set_ylabel('Number of Scenes', fontsize=12)
@@ -147,83 +322,244 @@ def plot_velocity_histogram(split_result: dict, output_dir: str):
     ax.legend(fontsize=11)
     ax.grid(axis='y', alpha=0.3)
     
-    plt.tight_layout()
-    output_path = os.path.join(output_dir, 'velocity_histogram.png')
-    plt.savefig(output_path, dpi=300, bbox_inches='tight')
-    print(f"Saved velocity histogram: {output_path}")
-    plt.close()
+    fig.tight_layout()
+    return _save(fig, output_dir, 'velocity_histogram.png', dpi)
 
 
-def plot_redundancy_scatter(split_result: dict, output_dir: str):
+def plot_redundancy_scatter(data: dict, output_dir: str, dpi: int = DEFAULT_DPI) -> str:
     """
     Plot velocity-redundancy scatter plot
     
     Args:
-        split_result: Split result
+        data: Plot data (see prepare_plot_data)
         output_dir: Output directory
+        dpi: Output resolution
     """
     fig, ax = plt.subplots(figsize=(12, 8))
     
-    keys = ['high_redundancy', 'medium_redundancy', 'low_redundancy']
-    labels = ['High Redundancy', 'Medium Redundancy', 'Low Redundancy']
-    colors = ['#ff6b6b', '#ffd93d', '#6bcf7f']
+    for key, label, color in zip(KEYS, LABELS, COLORS):
+        scenes = data['scenes'][key]
     
-    for key, label, color in zip(keys, labels, colors):
-        velocities = [s['avg_velocity'] for s in split_result[key]]
-        redundancies = [s['avg_redundancy'] for s in split_result[key]]
-        sizes = [s['num_samples'] for s in split_result[key]]
-        
         # Normalize size for visualization
-        sizes_normalized = [s * 2 for s in sizes]
-        
-        ax.scatter(velocities, redundancies, s=sizes_normalized, alpha=0.6,
+        sizes_normalized = scenes['num_samples'] * 2
+    
+        ax.scatter(scenes['avg_velocity'], scenes['avg_redundancy'], s=sizes_normalized, alpha=0.6,
                   label=label, color=color, edgecolors='black', linewidth=0.5)
     
     ax.set_xlabel('Average Velocity (m/s)', fontsize=12)
     ax.set_ylabel('Redundancy Score', fontsize=12)
-    ax.set_title('Velocity-Redundancy Relationship\n(Bubble size indicates sample count)', 
+    ax.set_title('Velocity-Redundancy Relationship\n(Bubble size indicates sample count)',
                 fontsize=14, fontweight='bold')
     ax.legend(fontsize=11)
     ax.grid(True, alpha=0.3)
     
-    plt.tight_layout()
-    output_path = os.path.join(output_dir, 'redundancy_scatter.png')
-    plt.savefig(output_path, dpi=300, bbox_inches='tight')
-    print(f"Saved scatter plot: {output_path}")
-    plt.close()
+    fig.tight_layout()
+    return _save(fig, output_dir, 'redundancy_scatter.png', dpi)
 
 
-def plot_pie_charts(split_result: dict, output_dir: str):
+def plot_pie_charts(data: dict, output_dir: str, dpi: int = DEFAULT_DPI) -> str:
     """
     Plot pie charts
     
     Args:
-        split_result: Split result
+        data: Plot data (see prepare_plot_data)
         output_dir: Output directory
+        dpi: Output resolution
     """
     fig, axes = plt.subplots(1, 2, figsize=(14, 6))
     
-    keys = ['high_redundancy', 'medium_redundancy', 'low_redundancy']
-    labels = ['High Redundancy', 'Medium Redundancy', 'Low Redundancy']
-    colors = ['#ff6b6b', '#ffd93d', '#6bcf7f']
+    stats = data['statistics']['categories']
     
     # Scene count pie chart
-    scene_counts = [len(split_result[k]) for k in keys]
-    axes[0].pie(scene_counts, labels=labels, colors=colors, autopct='%1.1f%%',
+    scene_counts = [stats[k]['num_scenes'] for k in KEYS]
+    axes[0].pie(scene_counts, labels=LABELS, colors=COLORS, autopct='%1.1f%%',
                startangle=90, textprops={'fontsize': 11})
     axes[0].set_title('Scene Count Distribution', fontsize=13, fontweight='bold')
     
     # Sample count pie chart
-    sample_counts = [sum(s['num_samples'] for s in split_result[k]) for k in keys]
-    axes[1].pie(sample_counts, labels=labels, colors=colors, autopct='%1.1f%%',
+    sample_counts = [stats[k]['num_samples'] for k in KEYS]
+    axes[1].pie(sample_counts, labels=LABELS, colors=COLORS, autopct='%1.1f%%',
                startangle=90, textprops={'fontsize': 11})
     axes[1].set_title('Sample Count Distribution', fontsize=13, fontweight='bold')
     
-    plt.tight_layout()
-    output_path = os.path.join(output_dir, 'redundancy_pie_charts.png')
-    plt.savefig(output_path, dpi=300, bbox_inches='tight')
-    print(f"Saved pie charts: {output_path}")
-    plt.close()
+    fig.tight_layout()
+    return _save(fig, output_dir, 'redundancy_pie_charts.png', dpi)
+
+
+def plot_pair_distribution(data: dict, output_dir: str, dpi: int = DEFAULT_DPI) -> str:
+    """
+    Plot sample-level (per frame pair) velocity and redundancy distributions
+    
+    Args:
+        data: Plot data (see prepare_plot_data, requires per-pair aggregates)
+        output_dir: Output directory
+        dpi: Output resolution
+    """
+    pairs = data['pairs']
+    stats = pairs['categories']
+    fig, axes = plt.subplots(2, 2, figsize=(15, 12))
+    fig.suptitle(f"Frame Pair Statistics ({pairs['total_pairs']:,} pairs)",
+                 fontsize=16, fontweight='bold')
+    
+    # 1-2. Histograms over all frame pairs (log scale: categories differ by orders of magnitude)
+    panels = [
+        (axes[0, 0], 'velocity', 'Velocity', 'Velocity (m/s)'),
+        (axes[0, 1], 'redundancy', 'Redundancy', 'Redundancy Score'),
+    ]
+    for ax, name, title, xlabel in panels:
+        _plot_histograms(ax, pairs, f'{name}_bin_edges', f'{name}_hist')
+        ax.set_yscale('log')
+        ax.set_xlabel(xlabel, fontsize=12)
+        ax.set_ylabel('Number of Frame Pairs', fontsize=12)
+        ax.set_title(f'Frame Pair {title} Histogram by Category', fontsize=13, fontweight='bold')
+        ax.legend(fontsize=10)
+        ax.grid(axis='y', alpha=0.3)
+    
+    # 3-4. Box plots from precomputed statistics
+    panels = [
+        (axes[1, 0], 'velocity', 'Velocity', 'Velocity (m/s)'),
+        (axes[1, 1], 'redundancy', 'Redundancy', 'Redundancy Score'),
+    ]
+    for ax, name, title, ylabel in panels:
+        _color_boxes(ax.bxp(_boxes(stats, f'{name}_box'), patch_artist=True, showmeans=True))
+        ax.set_ylabel(ylabel, fontsize=12)
+        ax.set_title(f'Frame Pair {title} Distribution by Category', fontsize=13, fontweight='bold')
+        ax.grid(axis='y', alpha=0.3)
+    
+    fig.tight_layout()
+    return _save(fig, output_dir, 'pair_distribution.png', dpi)
+
+
+def plot_pair_density(data: dict, output_dir: str, dpi: int = DEFAULT_DPI) -> str:
+    """
+    Plot per-category velocity-redundancy density of frame pairs (precomputed 2D histograms)
+    
+    Args:
+        data: Plot data (see prepare_plot_data, requires per-pair aggregates)
+        output_dir: Output directory
+        dpi: Output resolution
+    """
+    pairs = data['pairs']
+    velocity_edges = np.asarray(pairs['velocity_bin_edges'])
+    redundancy_edges = np.asarray(pairs['redundancy_bin_edges'])
+    fig, axes = plt.subplots(1, 3, figsize=(18, 5.5), sharey=True)
+    
+    for ax, key, label in zip(axes, KEYS, LABELS):
+        stats = pairs['categories'][key]
+        counts = np.asarray(stats['joint_hist'])
+        mesh = ax.pcolormesh(velocity_edges, redundancy_edges, np.ma.masked_equal(counts.T, 0),
+                             cmap='viridis', norm=LogNorm(vmin=1, vmax=max(counts.max(), 1)))
+        fig.colorbar(mesh, ax=ax, label='Number of Frame Pairs')
+        ax.set_xlabel('Velocity (m/s)', fontsize=12)
+        ax.set_title(f"{label} ({stats['num_pairs']:,} pairs)", fontsize=13, fontweight='bold')
+        ax.grid(True, alpha=0.3)
+    axes[0].set_ylabel('Redundancy Score', fontsize=12)
+    
+    fig.tight_layout()
+    return _save(fig, output_dir, 'pair_density.png', dpi)
+
+
+def plot_coverage(data: dict, output_dir: str, dpi: int = DEFAULT_DPI, frames: str = 'keyframe') -> str:
+    """
+    Plot per-location ego position heatmaps of kept and dropped samples, and the cells
+    that are visited only by dropped samples (neighborhoods the kept subset leaves uncovered)
+    
+    Args:
+        data: Plot data (see prepare_plot_data, requires spatial coverage aggregates)
+        output_dir: Output directory
+        dpi: Output resolution
+        frames: 'keyframe' or 'sweep'
+    """
+    coverage = data['coverage']
+    locations = coverage['locations']
+    summary = coverage_summary(coverage, frames)
+    title = 'Key Frame' if frames == 'keyframe' else 'Sweep'
+    kept_label = ' + '.join(LABELS[KEYS.index(key)] for key in coverage['keep_categories'])
+    
+    fig, axes = plt.subplots(len(locations), 3, figsize=(18, 5.5 * len(locations)), squeeze=False)
+    fig.suptitle(f"{title} Ego Position Coverage ({coverage['channel']}, kept: {kept_label})",
+                 fontsize=16, fontweight='bold')
+    gap_cmap = ListedColormap(['#6bcf7f', '#ff6b6b'])
+    
+    for row, (name, entry) in zip(axes, locations.items()):
+        extent = [entry['x_edges'][0], entry['x_edges'][-1], entry['y_edges'][0], entry['y_edges'][-1]]
+        kept, dropped = entry[frames]['kept'], entry[frames]['dropped']
+        vmax = max(kept.max(), dropped.max(), 1)
+        stats = summary[name]
+    
+        # Counts are indexed [x, y]; imshow expects rows along y
+        for ax, counts, label in ((row[0], kept, 'Kept'), (row[1], dropped, 'Dropped')):
+            image = ax.imshow(np.ma.masked_equal(counts.T, 0), origin='lower', extent=extent,
+                              cmap='viridis', norm=LogNorm(vmin=1, vmax=vmax),
+                              interpolation='nearest', aspect='equal')
+            fig.colorbar(image, ax=ax, label=f'Number of {title}s', shrink=0.8)
+            ax.set_title(f"{name}: {label} ({stats[label.lower()]:,})", fontsize=13, fontweight='bold')
+    
+        # 0 = covered by kept samples, 1 = visited only by dropped samples
+        gaps = np.where(kept > 0, 0, np.where(dropped > 0, 1, -1))
+        row[2].imshow(np.ma.masked_less(gaps.T, 0), origin='lower', extent=extent, cmap=gap_cmap,
+                      vmin=0, vmax=1, interpolation='nearest', aspect='equal')
+        ratio = stats['uncovered_cells'] / max(stats['occupied_cells'], 1)
+        row[2].set_title(f"{name}: Uncovered Cells ({stats['uncovered_cells']:,}/"
+                         f"{stats['occupied_cells']:,}, {ratio*100:.1f}%)", fontsize=13, fontweight='bold')
+    
+        for ax in row:
+            ax.set_xlabel('x (m)', fontsize=11)
+            ax.set_ylabel('y (m)', fontsize=11)
+    
+    fig.tight_layout()
+    return _save(fig, output_dir, f'coverage_{frames}s.png', dpi)
+
+
+# Figure name -> (plot function, required optional aggregate: 'pairs' / 'coverage' / None)
+PLOTS = {
+    'distribution': (plot_redundancy_distribution, None),
+    'velocity_histogram': (plot_velocity_histogram, None),
+    'scatter': (plot_redundancy_scatter, None),
+    'pie': (plot_pie_charts, None),
+    'pair_distribution': (plot_pair_distribution, 'pairs'),
+    'pair_density': (plot_pair_density, 'pairs'),
+    'coverage_keyframes': (partial(plot_coverage, frames='keyframe'), 'coverage'),
+    'coverage_sweeps': (partial(plot_coverage, frames='sweep'), 'coverage'),
+}
+
+# Where each optional aggregate comes from (for error messages)
+AGGREGATE_SOURCES = {
+    'pairs': f'the per-pair series ({SERIES_FILENAME})',
+    'coverage': 'the NuScenes metadata (--dataroot)',
+}
+
+
+def render_plots(data: dict, output_dir: str, dpi: int = DEFAULT_DPI,
+                 workers: int = None, names: list = None) -> list:
+    """
+    Render figures in parallel, one task per figure
+    
+    Args:
+        data: Plot data (see prepare_plot_data)
+        output_dir: Output directory
+        dpi: Output resolution
+        workers: Number of worker processes (default: one per figure; <=1 renders in this process)
+        names: Figures to render (default: every figure whose data is available)
+    
+    Returns:
+        Saved file paths
+    """
+    if names is None:
+        names = [name for name, (_, requires) in PLOTS.items()
+                 if requires is None or data[requires] is not None]
+    for name in names:
+        requires = PLOTS[name][1]
+        if requires is not None and data[requires] is None:
+            raise ValueError(f"Figure '{name}' requires {AGGREGATE_SOURCES[requires]}")
+    functions = [PLOTS[name][0] for name in names]
+    workers = len(functions) if workers is None else min(workers, len(functions))
+    
+    if workers <= 1:
+        return [function(data, output_dir, dpi) for function in functions]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(function, data, output_dir, dpi) for function in functions]
+        return [future.result() for future in futures]
 
 
 def print_statistics(split_result: dict):
@@ -237,39 +573,36 @@ def print_statistics(split_result: dict):
     print("Dataset Split Statistics")
     print("=" * 80)
     
-    keys = ['high_redundancy', 'medium_redundancy', 'low_redundancy']
-    labels = ['High Redundancy', 'Medium Redundancy', 'Low Redundancy']
-    
-    total_scenes = sum(len(split_result[k]) for k in keys)
-    total_samples = sum(sum(s['num_samples'] for s in split_result[k]) for k in keys)
+    statistics = get_split_statistics(split_result)
+    total_scenes = statistics['total_scenes']
+    total_samples = statistics['total_samples']
     
     print(f"\nTotal: {total_scenes} scenes, {total_samples} samples\n")
     
-    for key, label in zip(keys, labels):
-        scenes = split_result[key]
-        num_scenes = len(scenes)
-        num_samples = sum(s['num_samples'] for s in scenes)
-        
-        velocities = [s['avg_velocity'] for s in scenes]
-        redundancies = [s['avg_redundancy'] for s in scenes]
-        
+    for key, label in zip(KEYS, LABELS):
+        stats = statistics['categories'][key]
+        num_scenes = stats['num_scenes']
+        num_samples = stats['num_samples']
+    
+        velocity = stats['velocity_stats']
+        redundancy = stats['redundancy_stats']
+    
         print(f"{label}:")
         print(f"  Scenes: {num_scenes} ({num_scenes/total_scenes*100:.1f}%)")
         print(f"  Samples: {num_samples} ({num_samples/total_samples*100:.1f}%)")
-        
-        if velocities:
+    
+        if num_scenes:
             print(f"  Velocity Stats:")
-            print(f"    Mean: {np.mean(velocities):.2f} m/s")
-            print(f"    Median: {np.median(velocities):.2f} m/s")
-            print(f"    Std: {np.std(velocities):.2f} m/s")
-            print(f"    Range: [{np.min(velocities):.2f}, {np.max(velocities):.2f}] m/s")
-        
-        if redundancies:
+            print(f"    Mean: {velocity['mean']:.2f} m/s")
+            print(f"    Median: {velocity['median']:.2f} m/s")
+            print(f"    Std: {velocity['std']:.2f} m/s")
+            print(f"    Range: [{velocity['min']:.2f}, {velocity['max']:.2f}] m/s")
+    
             print(f"  Redundancy Stats:")
-            print(f"    Mean: {np.mean(redundancies):.3f}")
-            print(f"    Median: {np.median(redundancies):.3f}")
-            print(f"    Std: {np.std(redundancies):.3f}")
-            print(f"    Range: [{np.min(redundancies):.3f}, {np.max(redundancies):.3f}]")
+            print(f"    Mean: {redundancy['mean']:.3f}")
+            print(f"    Median: {redundancy['median']:.3f}")
+            print(f"    Std: {redundancy['std']:.3f}")
+            print(f"    Range: [{redundancy['min']:.3f}, {redundancy['max']:.3f}]")
         print()
 
 
@@ -290,6 +623,69 @@ def main():
         default='/data2/file_swap/sh_space/nuscenes_NewSplit/redundancy_split',
         help='Visualization output directory'
     )
+    parser.add_argument(
+        '--series-path',
+        type=str,
+        default=None,
+        help=f'Per-pair series file for sample-level plots (default: {SERIES_FILENAME} next to the result file)'
+    )
+    parser.add_argument(
+        '--dataroot',
+        type=str,
+        default=None,
+        help='NuScenes data root for spatial coverage plots (skipped if not given)'
+    )
+    parser.add_argument(
+        '--version',
+        type=str,
+        default='v1.0-trainval',
+        help='Dataset version the split was computed on'
+    )
+    parser.add_argument(
+        '--keep-categories',
+        type=str,
+        nargs='+',
+        default=['low_redundancy'],
+        choices=KEYS,
+        help='Categories counted as kept in coverage plots (default: low_redundancy)'
+    )
+    parser.add_argument(
+        '--coverage-channel',
+        type=str,
+        default='LIDAR_TOP',
+        help='Sensor channel whose ego poses are used for coverage plots'
+    )
+    parser.add_argument(
+        '--cell-size',
+        type=float,
+        default=DEFAULT_CELL_SIZE,
+        help=f'Coverage grid cell size in meters (default: {DEFAULT_CELL_SIZE})'
+    )
+    parser.add_argument(
+        '--plots',
+        type=str,
+        nargs='+',
+        default=None,
+        choices=list(PLOTS),
+        help='Figures to render (default: all available)'
+    )
+    parser.add_argument(
+        '--dpi',
+        type=int,
+        default=DEFAULT_DPI,
+        help=f'Output resolution (default: {DEFAULT_DPI})'
+    )
+    parser.add_argument(
+        '--preview',
+        action='store_true',
+        help=f'Quick low-resolution preview (dpi={PREVIEW_DPI})'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='Number of rendering processes (default: one per figure)'
+    )
     
     args = parser.parse_args()
     
@@ -304,14 +700,40 @@ def main():
     # Print statistics
     print_statistics(split_result)
     
+    # Aggregate once; figures are rendered from the aggregates only
+    series_path = args.series_path or os.path.join(
+        os.path.dirname(os.path.abspath(args.result_path)), SERIES_FILENAME)
+    series = load_series(series_path)
+    if series is None:
+        print(f"\nPer-pair series not found ({series_path}), skipping sample-level plots")
+    start = time.time()
+    data = prepare_plot_data(split_result, series)
+    if data['pairs'] is not None:
+        print(f"\nAggregated {data['pairs']['total_pairs']:,} frame pairs ({time.time() - start:.2f}s)")
+    
+    if args.dataroot:
+        print(f"\nLoading metadata: {os.path.join(args.dataroot, args.version)}")
+        tables = NuScenesTables(os.path.join(args.dataroot, args.version), table_names=COVERAGE_TABLES)
+        start = time.time()
+        data['coverage'] = compute_coverage(tables, split_result, args.keep_categories,
+                                            channel=args.coverage_channel, cell_size=args.cell_size)
+        print(f"Aggregated ego position coverage ({time.time() - start:.2f}s)")
+        for name, stats in coverage_summary(data['coverage']).items():
+            print(f"  {name}: {stats['kept']:,} kept / {stats['dropped']:,} dropped key frames, "
+                  f"{stats['uncovered_cells']:,} of {stats['occupied_cells']:,} cells uncovered")
+    else:
+        print("\nNo --dataroot given, skipping spatial coverage plots")
+    
     # Generate visualizations
-    print("\nGenerating visualization plots...")
+    dpi = PREVIEW_DPI if args.preview else args.dpi
+    print(f"\nGenerating visualization plots (dpi={dpi})...")
     os.makedirs(args.output_dir, exist_ok=True)
     
-    plot_redundancy_distribution(split_result, args.output_dir)
-    plot_velocity_histogram(split_result, args.output_dir)
-    plot_redundancy_scatter(split_result, args.output_dir)
-    plot_pie_charts(split_result, args.output_dir)
+    start = time.time()
+    for output_path in render_plots(data, args.output_dir, dpi=dpi,
+                                    workers=args.workers, names=args.plots):
+        print(f"Saved: {output_path}")
+    print(f"Rendering took {time.time() - start:.1f}s")
     
     print("\n" + "=" * 80)
     print("Visualization completed!")
@@ -320,4 +742,3 @@ def main():
 
 if __name__ == '__main__':
     main()
-